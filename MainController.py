@@ -1,65 +1,424 @@
+import time
+_IMPORT_START = time.perf_counter()
+import argparse
+import logging
+import threading
+from datetime import datetime
 import flet as ft
-import flet_charts as fch 
 from models import Stock
-from database import PortfolioDB
+from database import PortfolioDB, PNL_METHODS
 from views import PortfolioView
+from components import HistoryPanel, TradePanel
+from alerts import AlertIndex, AlertRule, ALERT_KINDS, ALERT_DIRECTIONS
 from ai_service import SentimentAnalyzer
-from services.market_service import MarketService
+from services.market_service import CachedMarketService
+from services.history_store import PriceHistoryStore
+from services.price_streamer import PriceStreamer
+from services.news_pipeline import NewsPipeline
+from task_runner import PanelTaskRunner
+from chart_series import ChartSeriesBuilder
+from instrumentation import metrics, timed
+
+COLD_START_BUDGET_S = 1.0  # מהטעינה ועד שהמעטפת של הדשבורד מוצגת
+
+HISTORY_PAGE_SIZE = HistoryPanel.PAGE_SIZE
+log = logging.getLogger(__name__)
 
 class MainController:
-    def __init__(self):
-        self.db = PortfolioDB()
-        self.ai = SentimentAnalyzer()
-        self.market = MarketService()
+    def __init__(self, db=None, market=None, ai=None):
+        self.db = db or PortfolioDB()
+        self.ai = ai or SentimentAnalyzer()
+        self.market = market or CachedMarketService()
+        # במצב replay השוק מגיע עם שעון מדומה, וכל התקופות נמדדות לפיו
+        clock = getattr(self.market, "clock", None)
+        # replay: המחירים היסטוריים, אז לא סוחרים ולא צורכים את ההתראות השמורות של המשתמש
+        self.replay = clock is not None
+        self.prices = PriceHistoryStore(self.db, self.market, now=clock.datetime if clock else None)
+        self.news = NewsPipeline(self.market, self.db)
+        self.charts = ChartSeriesBuilder(self.prices)
+        self.tasks = PanelTaskRunner()
+        if hasattr(self.market, "make_streamer"):
+            self.streamer = self.market.make_streamer(self._push_quotes)
+        else:
+            self.streamer = PriceStreamer(self.market, self._push_quotes)
+        self.alerts = AlertIndex()
+        self._held = []  # הסימבולים של התצוגה הנוכחית; ההתראות נצפות בנוסף אליהם
+        self._view_lock = threading.Lock()
         self.view = None
         self.pid = None
 
     def start(self, page: ft.Page):
         self.view = PortfolioView(page, self)
         self.view.build()
+        page.on_close = self.handle_close
+        # רשימת המעקב וחוקי ההתראה נטענים ברקע, לא על חשבון עליית המסך
+        self.handle_watchlist_select(TradePanel.DEFAULT_WATCHLIST)
+        self.tasks.run(self.db.get_alerts, self._alerts_loaded, self._task_error)
+        elapsed = time.perf_counter() - _IMPORT_START
+        metrics.record("startup.shell", elapsed)
+        if elapsed > COLD_START_BUDGET_S:
+            metrics.count("startup.over_budget")
+            log.info("Cold start took %.2fs (budget %.1fs)", elapsed, COLD_START_BUDGET_S)
+
+    def handle_close(self, e):
+        self.streamer.stop()
+        self.tasks.shutdown()
+        self.news.shutdown()
+        self.prices.close()
+        if hasattr(self.market, "close"):
+            self.market.close()
+        self.db.close()
 
     def handle_load(self, e):
-        self.pid = self.view.pid_input.value
+        value = (self.view.pid_input.value or "").strip()
+        if value == "*" or "," in value:
+            # מצב מאוחד: "*" לכל התיקים או רשימת מזהים מופרדת בפסיקים
+            self.pid = None
+            ids = None if value == "*" else [p.strip() for p in value.split(",") if p.strip()]
+            self.refresh_aggregate(ids)
+            return
+        self.pid = value
         if self.pid:
             self.refresh()
         else:
             self.msg("Enter Portfolio ID first.")
 
+    def refresh_aggregate(self, portfolio_ids=None):
+        self.msg("Fetching consolidated data...")
+        self.tasks.submit("portfolio", lambda is_current: self._load_aggregate(portfolio_ids),
+                          self._show_aggregate, self._task_error)
+
+    @timed("controller.refresh_aggregate")
+    def _load_aggregate(self, portfolio_ids):
+        consolidated = self.db.get_consolidated_positions(portfolio_ids)
+        stocks = [stock for stock, _ in consolidated]
+        # כל סימבול מתומחר פעם אחת בלבד, לא פעם לכל תיק
+        quotes = self.market.fetch_live_prices([s.symbol for s in stocks] + ["SPY"])
+        live_prices, flags = self._split_quotes(stocks, quotes)
+        breakdown = self.db.get_portfolio_valuations(live_prices, portfolio_ids)
+        spy_change = quotes["SPY"][1] if quotes.get("SPY") else 0.0
+        key = "*" if portfolio_ids is None else ",".join(sorted(portfolio_ids))
+        return key, stocks, live_prices, spy_change, breakdown, flags, quotes
+
+    def _show_aggregate(self, result):
+        key, stocks, live_prices, spy_change, breakdown, flags, quotes = result
+        # התראות נורות רק לטעינה שמוצגת; טעינה שהוחלפה לא צורכת אותן
+        alerts = self._check_alerts(quotes)
+        with self._view_lock:
+            self.view.update_table(stocks, live_prices, spy_change, f"aggregate:{key}", flags)
+            self.view.apply("portfolio_panel", "update_breakdown", breakdown, self.view.page)
+        self._watch([s.symbol for s in stocks] + ["SPY"])
+        self.msg(f"Consolidated {len(breakdown)} portfolios, {len(stocks)} symbols." + self._quote_warning(flags) + alerts)
+
+    @staticmethod
+    def _split_quotes(stocks, quotes):
+        """Live prices for the held symbols, and {symbol: "stale" | "no quote"} for the rest.
+
+        Symbols without any quote are left out of the prices, so they show at cost, flagged.
+        """
+        live_prices, flags = {}, {}
+        for s in stocks:
+            quote = quotes.get(s.symbol)
+            if quote is None:
+                flags[s.symbol] = "no quote"
+                continue
+            live_prices[s.symbol] = quote[0]
+            if getattr(quote, "stale", False):
+                flags[s.symbol] = "stale"
+        return live_prices, flags
+
+    @staticmethod
+    def _quote_warning(flags):
+        stale = [sym for sym, flag in flags.items() if flag == "stale"]
+        missing = [sym for sym, flag in flags.items() if flag == "no quote"]
+        text = ""
+        if stale:
+            text += f" Stale prices for: {', '.join(stale)}."
+        if missing:
+            text += f" No price for: {', '.join(missing)} (shown at cost)."
+        return text
+
     def refresh(self):
         if self.pid:
             self.msg("Fetching data...")
-            stocks = self.db.get_all_stocks(self.pid)
-            transactions = self.db.get_transactions(self.pid)
-            
-            live_prices = {}
-            for s in stocks:
+            self.tasks.submit("portfolio", lambda is_current, pid=self.pid: self._load_portfolio(pid),
+                              self._show_portfolio, self._task_error)
+            self.refresh_history()
+
+    @timed("controller.refresh")
+    def _load_portfolio(self, pid):
+        stocks = self.db.get_all_stocks(pid)
+
+        quotes = self.market.fetch_live_prices([s.symbol for s in stocks] + ["SPY"])
+        live_prices, flags = self._split_quotes(stocks, quotes)
+
+        if flags:
+            metrics.count("controller.refresh.price_fallback", len(flags))
+        spy_change = quotes["SPY"][1] if quotes.get("SPY") else 0.0
+        return pid, stocks, live_prices, spy_change, flags, quotes
+
+    def _show_portfolio(self, result):
+        pid, stocks, live_prices, spy_change, flags, quotes = result
+        alerts = self._check_alerts(quotes)
+        with self._view_lock:
+            self.view.update_table(stocks, live_prices, spy_change, pid, flags)
+            self.view.apply("portfolio_panel", "update_breakdown", None, self.view.page)
+        self._watch([s.symbol for s in stocks] + ["SPY"])
+        self.msg(f"Portfolio {pid} loaded." + self._quote_warning(flags) + alerts)
+        if stocks:
+            self.tasks.submit("analytics", lambda is_current: self._compute_analytics(stocks, live_prices),
+                              lambda result: self.view.apply("portfolio_panel", "update_analytics", *result, self.view.page),
+                              self._task_error)
+
+    @timed("controller.analytics")
+    def _compute_analytics(self, stocks, live_prices):
+        from analytics import align_closes, risk_metrics
+        held = {s.symbol: s for s in stocks}
+        bars, failed = self.prices.get_bars_many(list(held) + ["SPY"], "1y")
+        series = {sym: [(b[0], b[4]) for b in rows] for sym, rows in bars.items()}
+        # SPY הוא גם מדד הייחוס; אם הוא מוחזק הוא נשאר גם בתיק
+        benchmark = series.get("SPY")
+        if "SPY" not in held:
+            series.pop("SPY", None)
+        symbols, _, closes, bench, excluded = align_closes(series, benchmark)
+        excluded = excluded + [sym for sym in held if sym in failed]
+        weights = [live_prices.get(sym, held[sym].price) * held[sym].quantity for sym in symbols]
+        return symbols, risk_metrics(closes, weights, bench), excluded
+
+    def handle_toggle_live(self, e):
+        if self.view.portfolio_panel.live_switch.value:
+            self.streamer.start()
+            self.msg("Live prices on.")
+        else:
+            self.streamer.stop()
+            self.msg("Live prices off.")
+
+    def _push_quotes(self, quotes):
+        """Called from the streamer thread with the quotes that changed."""
+        alerts = self._check_alerts(quotes)
+        if alerts:
+            self.msg(alerts.strip())
+        panel = self.view.built("portfolio_panel")
+        if panel is None: return
+        with self._view_lock:
+            if "SPY" in quotes:
+                panel.set_benchmark(quotes["SPY"][1])
+            panel.apply_prices({sym: q[0] for sym, q in quotes.items()}, None,
+                               {sym for sym, q in quotes.items() if getattr(q, "stale", False)})
+            self.view.page.update()
+
+    def _watch(self, held=None):
+        """Streams the displayed symbols plus every symbol with an active alert."""
+        if held is not None:
+            self._held = held
+        self.streamer.watch(self._held + self.alerts.symbols())
+
+    def _check_alerts(self, quotes):
+        """Fires the alert rules crossed by `quotes`; returns the notification text ("" if none).
+
+        In replay the rules fire for this session only and stay active in the database.
+        """
+        fired = self.alerts.check(quotes)
+        if not fired:
+            return ""
+        metrics.count("alerts.fired", len(fired))
+        if not self.replay:
+            self.db.mark_alerts_triggered([(rule.id, value) for rule, value in fired])
+        self.view.apply("trade_panel", "set_alerts", self.alerts.rules(), None)
+        return " Alert: " + "; ".join(rule.describe(value) for rule, value in fired) + "."
+
+    def _alerts_loaded(self, rows):
+        self.alerts.load(AlertRule(*row) for row in rows)
+        self.view.apply("trade_panel", "set_alerts", self.alerts.rules(), self.view.page)
+        self._watch()
+
+    # --- רשימות מעקב והתראות ---
+    def handle_watchlist_select(self, name):
+        name = (name or "").strip()
+        if not name: return
+
+        def load():
+            return self.db.get_watchlists(), name, self.db.get_watchlist(name)
+
+        self.tasks.submit("watchlist", lambda is_current: load(),
+                          lambda result: self.view.apply("trade_panel", "set_watchlists", *result, self.view.page),
+                          self._task_error)
+
+    def handle_watch_add(self, e):
+        panel = self.view.trade_panel
+        symbols, name = panel.parse_symbols(), panel.watchlist
+        if not symbols:
+            return self.msg("Enter one or more symbols.")
+
+        def added(_):
+            panel.watch_input.value = ""
+            self.msg(f"Added {', '.join(symbols)} to {name}.")
+            self.handle_watchlist_select(name)
+
+        self.tasks.run(lambda: self.db.add_to_watchlist(name, symbols), added, self._task_error)
+
+    def handle_watch_remove(self, e):
+        panel = self.view.trade_panel
+        sym, name = panel.symbol_dd.value, panel.watchlist
+        if not sym:
+            return self.msg("Select a stock first.")
+
+        def removed(_):
+            self.msg(f"Removed {sym} from {name}.")
+            self.handle_watchlist_select(name)
+
+        self.tasks.run(lambda: self.db.remove_from_watchlist(name, sym), removed, self._task_error)
+
+    def handle_alert_add(self, e):
+        panel = self.view.trade_panel
+        sym, kind, direction = panel.symbol_dd.value, panel.alert_kind_dd.value, panel.alert_dir_dd.value
+        if not sym:
+            return self.msg("Select a stock first.")
+        if kind not in ALERT_KINDS or direction not in ALERT_DIRECTIONS:
+            return self.msg("Choose what to alert on and when.")
+        try:
+            threshold = float((panel.alert_threshold.value or "").strip().rstrip("%").lstrip("$"))
+        except ValueError:
+            return self.msg(f"Threshold must be a number, got {panel.alert_threshold.value!r}")
+
+        def add():
+            rule = AlertRule(self.db.add_alert(sym, kind, direction, threshold), sym.upper(), kind, direction, threshold)
+            self.alerts.add(rule)
+            # חוק שכבר נחצה נורה מיד, לא רק בשינוי המחיר הבא
+            return rule, self._check_alerts(self.market.fetch_live_prices([rule.symbol]))
+
+        def added(result):
+            rule, alerts = result
+            panel.alert_threshold.value = ""
+            panel.set_alerts(self.alerts.rules())
+            self._watch()
+            self.msg(f"Alert set: {rule.describe()}." + alerts)
+
+        self.tasks.run(add, added, self._task_error)
+
+    def handle_alert_delete(self, rule_id):
+        self.alerts.remove(rule_id)
+        self.view.trade_panel.set_alerts(self.alerts.rules(), self.view.page)
+        self._watch()
+        self.tasks.run(lambda: self.db.delete_alert(rule_id), lambda _: None, self._task_error)
+
+    def handle_diagnostics_refresh(self, e):
+        self.view.diagnostics_panel.update_data(metrics.snapshot(), self.view.page)
+
+    def handle_toggle_metrics(self, e):
+        metrics.enabled = bool(self.view.diagnostics_panel.enabled_switch.value)
+        self.handle_diagnostics_refresh(e)
+
+    def handle_metrics_reset(self, e):
+        metrics.reset()
+        self.handle_diagnostics_refresh(e)
+
+    def handle_metrics_export(self, path):
+        try:
+            self.msg(f"Metrics written to {metrics.write(path)}")
+        except OSError as err:
+            self.msg(f"Error: {err}")
+
+    def refresh_history(self, reset=False):
+        """Loads the ledger window only if the History tab exists; new rows are prepended."""
+        history = self.view.built("history_panel")
+        if history is None or not self.pid: return
+        pid, filters = self.pid, history.filters()
+        if reset or history.pid != pid:
+            return self._load_history_page(pid, filters, 0, None)
+        since_id = history.last_id if history.page_index == 0 else None
+
+        def load(is_current):
+            rows = self.db.get_transactions_since(pid, since_id or 0, **filters) if history.page_index == 0 else []
+            return rows, self.db.get_transaction_totals(pid, **filters), self._load_pnl(pid, filters)
+
+        def loaded(result):
+            rows, totals, pnl = result
+            history.prepend(rows)
+            history.set_pnl(*pnl)
+            history.set_totals(totals, self.view.page)
+
+        self.tasks.submit("history", load, loaded, self._task_error)
+
+    def _load_history_page(self, pid, filters, page_index, after):
+        history = self.view.history_panel
+
+        def load(is_current):
+            rows = self.db.get_transactions(pid, after=after, limit=HISTORY_PAGE_SIZE + 1, **filters)
+            totals = self.db.get_transaction_totals(pid, **filters) if page_index == 0 else None
+            pnl = self._load_pnl(pid, filters) if page_index == 0 else None
+            symbols = self.db.get_transaction_symbols(pid) if history.pid != pid else None
+            return rows, totals, pnl, symbols
+
+        def loaded(result):
+            rows, totals, pnl, symbols = result
+            if symbols is not None:
+                history.set_symbols(symbols)
+            history.show_page(pid, rows[:HISTORY_PAGE_SIZE], len(rows) > HISTORY_PAGE_SIZE, page_index)
+            if page_index > 0:
+                history.cursors[page_index:] = [after]
+            if totals is not None:
+                history.set_totals(totals)
+            if pnl is not None:
+                history.set_pnl(*pnl)
+            self.view.page.update()
+
+        self.tasks.submit("history", load, loaded, self._task_error)
+
+    def _load_pnl(self, pid, filters):
+        return tuple(self.db.get_pnl_summary(pid, filters["symbol"], method) for method in PNL_METHODS)
+
+    def handle_history_filter(self, e):
+        history = self.view.history_panel
+        filters = history.filters()
+        for key in ("start", "end"):
+            if filters[key]:
                 try:
-                    live_prices[s.symbol] = self.market.fetch_live_price(s.symbol)
-                except:
-                    live_prices[s.symbol] = s.price
-            
-            _, spy_change = self.market.get_daily_change("SPY")
-            self.view.update_table(stocks, live_prices, spy_change, transactions)
-            self.msg(f"Portfolio {self.pid} loaded.")
-
-    def handle_show_chart(self, symbol):
+                    datetime.strptime(filters[key], "%Y-%m-%d")
+                except ValueError:
+                    return self.msg(f"Dates must be YYYY-MM-DD, got {filters[key]!r}")
+        if self.pid:
+            self._load_history_page(self.pid, filters, 0, None)
+
+    def handle_history_page(self, delta):
+        history = self.view.history_panel
+        if not history.pid: return
+        page_index = history.page_index + delta
+        if page_index < 0 or (delta > 0 and not history.has_more): return
+        after = history.oldest if delta > 0 else history.cursors[page_index]
+        self._load_history_page(history.pid, history.filters(), page_index, after)
+
+    def _task_error(self, err):
+        self.msg(f"Error: {err}")
+
+    def handle_show_chart(self, symbol, chart_range=None):
         panel = self.view.portfolio_panel
-        panel.trend_chart_title.value = f"Loading 30-Day Trend for {symbol}..."
+        chart_range = chart_range or panel.chart_range
+        panel.trend_chart_title.value = f"Loading {chart_range} trend for {symbol}..."
         panel.trend_chart_container.visible = True
         self.view.page.update()
-        
-        data_points = self.market.fetch_history_chart_data(symbol)
-        
-        if not data_points:
+
+        self.tasks.submit("chart", lambda is_current: self.charts.get(symbol, chart_range),
+                          lambda series: self._show_chart(symbol, series), self._task_error)
+
+    def handle_chart_range(self, chart_range):
+        panel = self.view.portfolio_panel
+        panel.set_chart_range(chart_range)
+        if panel.selected_sym:
+            self.handle_show_chart(panel.selected_sym, chart_range)
+        else:
+            self.view.page.update()
+
+    def _show_chart(self, symbol, series):
+        import flet_charts as fch
+        panel = self.view.portfolio_panel
+        if series is None:
             panel.trend_chart_title.value = f"No chart data available for {symbol}"
             self.view.page.update()
             return
 
-        chart_points = [fch.LineChartDataPoint(x, y) for x, y in data_points]
-        
-        prices = [y for x, y in data_points]
-        min_price = min(prices) * 0.98 
-        max_price = max(prices) * 1.02 
+        chart_points = [fch.LineChartDataPoint(x, y) for x, y in series.points]
+        min_price, max_price = series.min_price, series.max_price
         
         price_step = (max_price - min_price) / 4
         y_labels = [
@@ -69,25 +428,17 @@ class MainController:
             ) for i in range(5)
         ]
         
-        x_labels = []
-        total_days = len(data_points)
-        for x, y in data_points:
-            if x % 5 == 0 or x == total_days - 1:
-                days_ago = total_days - 1 - x
-                label_str = "Today" if days_ago == 0 else f"-{days_ago}d"
-                x_labels.append(
-                    fch.ChartAxisLabel(
-                        value=x,
-                        label=ft.Text(label_str, size=12, color="grey700")
-                    )
-                )
+        x_labels = [
+            fch.ChartAxisLabel(value=x, label=ft.Text(label_str, size=12, color="grey700"))
+            for x, label_str in series.x_labels
+        ]
 
         panel.trend_chart.data_series = [
             fch.LineChartData(
                 points=chart_points,
-                stroke_width=3,
+                stroke_width=3 if len(chart_points) <= 60 else 2,
                 color="blue900",
-                curved=True, 
+                curved=len(chart_points) <= 60,
                 rounded_stroke_cap=True
             )
         ]
@@ -97,10 +448,12 @@ class MainController:
         panel.trend_chart.bottom_axis = fch.ChartAxis(labels=x_labels, label_size=30)
         panel.trend_chart.horizontal_grid_lines = fch.ChartGridLines(color="grey300", width=1, dash_pattern=[3, 3])
         
+        panel.trend_chart.min_x = 0
+        panel.trend_chart.max_x = series.raw_count - 1
         panel.trend_chart.min_y = min_price
         panel.trend_chart.max_y = max_price
         
-        panel.trend_chart_title.value = f"{symbol} - 30 Day Price Trend"
+        panel.trend_chart_title.value = f"{symbol} - {series.range} Price Trend"
         self.view.page.update()
 
     def handle_selection(self, e):
@@ -109,36 +462,59 @@ class MainController:
         self.view.trade_panel.name_display.value = self.market.get_company_name(sym)
         self.view.trade_panel.price_display.value = "Fetching..."
         self.view.page.update()
-        try:
-            price = self.market.fetch_live_price(sym)
-            self.view.trade_panel.price_display.value = f"{price:.2f}"
-        except:
-            self.view.trade_panel.price_display.value = "Error"
+        self.tasks.submit("trade", lambda is_current: self.market.fetch_live_price(sym),
+                          self._show_selection_price, self._selection_error)
+
+    def _show_selection_price(self, price):
+        self.view.trade_panel.price_display.value = f"{price:.2f}"
+        self.view.page.update()
+
+    def _selection_error(self, err):
+        self.view.trade_panel.price_display.value = "Error"
         self.view.page.update()
 
     def handle_add(self, e):
+        if self.replay:
+            return self.msg("Trading is off while replaying market data.")
         sym = self.view.trade_panel.symbol_dd.value
         qty = self.view.trade_panel.qty_input.value
         if not self.pid or not sym: return self.msg("Missing ID or Symbol")
-        try:
+        pid = self.pid
+
+        def buy():
             price = self.market.fetch_live_price(sym)
             new_stock = Stock(sym, self.market.get_company_name(sym), price, int(qty))
-            self.db.add_or_update_stock(new_stock, self.pid)
-            self.refresh()
+            self.db.add_or_update_stock(new_stock, pid)
+
+        def bought(_):
             self.msg(f"Bought {qty} {sym}")
-        except Exception as err:
-            self.msg(f"Error: {err}")
+            self.refresh()
+
+        self.tasks.run(buy, bought, self._task_error)
 
     def handle_delete(self, e):
+        if self.replay:
+            return self.msg("Trading is off while replaying market data.")
         selected = self.view.portfolio_panel.selected_sym
         qty_str = self.view.portfolio_panel.delete_qty_input.value
-        if selected and self.pid:
-            qty = int(qty_str) if qty_str.isdigit() else None
-            self.db.delete_stock(selected, self.pid, qty)
+        if not (selected and self.pid):
+            return self.msg("Select a stock first.")
+        qty = int(qty_str) if qty_str.isdigit() else None
+        pid = self.pid
+
+        def sell():
+            # המכירה נרשמת במחיר השוק; בלי ציטוט חי היא נדחית
+            return self.db.delete_stock(selected, pid, qty, self.market.fetch_live_price(selected))
+
+        def sold(result):
+            if result is None:
+                self.msg(f"{selected} is not held.")
+            else:
+                quantity, price, realized, _ = result
+                self.msg(f"Sold {quantity} {selected} @ ${price:.2f} · realized {'+' if realized >= 0 else '-'}${abs(realized):,.2f} (FIFO)")
             self.refresh()
-            self.msg("Transaction recorded.")
-        else:
-            self.msg("Select a stock first.")
+
+        self.tasks.run(sell, sold, self._task_error)
 
     def handle_ai(self, e):
         selected = self.view.ai_panel.symbol_dd.value
@@ -148,41 +524,114 @@ class MainController:
         self.view.ai_panel.ai_result_display.value = f"Fetching live news for {selected}..."
         self.view.ai_panel.ai_result_display.color = "orange700"
         self.view.page.update()
-        
-        try:
-            headlines, sources = self.market.fetch_stock_news(selected)
-            if not headlines:
-                self.view.ai_panel.ai_result_display.value = f"No recent news found for {selected}."
-                self.view.ai_panel.ai_result_display.color = "red700"
+        self.tasks.submit("ai", lambda is_current: self._analyze(selected, is_current),
+                          self._show_ai_result, self._ai_error)
+
+    @timed("controller.handle_ai")
+    def _analyze(self, selected, is_current):
+        headlines, sources = self.news.fetch([selected])[selected.upper()]
+        if not headlines:
+            return None, f"No recent news found for {selected}."
+        if not is_current():
+            return None, None
+
+        sources_text = ", ".join(sources)
+        self.view.ai_panel.ai_result_display.value = f"Analyzing {len(headlines)} headlines from: {sources_text}..."
+        self.view.page.update()
+
+        last_update = [0.0]
+
+        def on_token(text):
+            # מציגים את התשובה תוך כדי הזרמה, לכל היותר עשר פעמים בשנייה
+            now = time.monotonic()
+            if is_current() and now - last_update[0] >= 0.1:
+                last_update[0] = now
+                self.view.ai_panel.ai_result_display.value = text
+                self.view.ai_panel.ai_result_display.color = "grey800"
                 self.view.page.update()
-                return
-            
-            sources_text = ", ".join(sources)
-            self.view.ai_panel.ai_result_display.value = f"Analyzing {len(headlines)} headlines from: {sources_text}..."
-            self.view.page.update()
-            
-            advice = self.ai.analyze_portfolio_stock(selected, headlines)
-            final_output = f"{advice}\n\n(מקורות המידע שנותחו: {sources_text})"
-            
-            if "POSITIVE" in advice.upper():
-                self.view.ai_panel.ai_result_display.color = "green700"
-            elif "NEGATIVE" in advice.upper():
-                self.view.ai_panel.ai_result_display.color = "red700"
-            else:
-                self.view.ai_panel.ai_result_display.color = "blue700"
 
-            self.view.ai_panel.ai_result_display.value = final_output
-            self.view.page.update()
-            
-        except Exception as err:
-            self.view.ai_panel.ai_result_display.value = f"Error: {str(err)}"
-            self.view.ai_panel.ai_result_display.color = "red700"
-            self.view.page.update()
+        advice = self.ai.analyze_portfolio_stock(selected, headlines, on_token=on_token)
+        return advice, f"{advice}\n\n(מקורות המידע שנותחו: {sources_text})"
+
+    def handle_ai_all(self, e):
+        symbols = [o.key or o.text for o in self.view.ai_panel.symbol_dd.options or []]
+        if not symbols:
+            return self.msg("Load a portfolio first.")
+        display = self.view.ai_panel.ai_result_display
+        display.value = f"Fetching news for {len(symbols)} holdings..."
+        display.color = "orange700"
+        self.view.page.update()
+        self.tasks.submit("ai", lambda is_current: self._analyze_all(symbols, is_current),
+                          self._show_ai_result, self._ai_error)
+
+    @timed("controller.handle_ai_all")
+    def _analyze_all(self, symbols, is_current):
+        news = self.news.fetch(symbols)
+        headlines = {sym: news[sym.upper()][0] for sym in symbols if news[sym.upper()][0]}
+        results = {}
+        lock = threading.Lock()
+
+        def on_result(symbol, answer):
+            with lock:
+                results[symbol] = answer
+                text = "\n\n".join(f"{sym}: {results[sym]}" for sym in symbols if sym in results)
+            if is_current():
+                self.view.ai_panel.ai_result_display.value = text
+                self.view.page.update()
+
+        self.ai.analyze_many(headlines, on_result=on_result)
+        missing = [sym for sym in symbols if sym not in headlines]
+        lines = [f"{sym}: {results[sym]}" for sym in symbols if sym in results]
+        if missing:
+            lines.append(f"No recent news: {', '.join(missing)}")
+        return "MIXED", "\n\n".join(lines)
+
+    def _show_ai_result(self, result):
+        advice, final_output = result
+        display = self.view.ai_panel.ai_result_display
+        if advice is None:
+            display.color = "red700"
+        elif "POSITIVE" in advice.upper():
+            display.color = "green700"
+        elif "NEGATIVE" in advice.upper():
+            display.color = "red700"
+        else:
+            display.color = "blue700"
+
+        display.value = final_output
+        self.view.page.update()
+
+    def _ai_error(self, err):
+        self.view.ai_panel.ai_result_display.value = f"Error: {str(err)}"
+        self.view.ai_panel.ai_result_display.color = "red700"
+        self.view.page.update()
 
     def msg(self, text):
         self.view.page.snack_bar = ft.SnackBar(ft.Text(text))
         self.view.page.snack_bar.open = True
         self.view.page.update()
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Real-time stock manager.")
+    parser.add_argument("--record", metavar="LOG", help="append every market data response to LOG (.jsonl.gz)")
+    parser.add_argument("--replay", metavar="LOG", help="serve market data from a recorded LOG, without network")
+    parser.add_argument("--replay-from", metavar="YYYY-MM-DD", help="replay the daily bars stored in portfolio.db from this date")
+    parser.add_argument("--speed", type=float, default=5.0,
+                        help="replay speed: times real time for --replay, trading days per second for --replay-from")
+    args = parser.parse_args(argv)
+
+    db = PortfolioDB()
+    market = None
+    if args.replay or args.replay_from:
+        from services.replay import HistoricalMarket, RecordedMarket
+        if args.replay:
+            market = RecordedMarket(args.replay, speed=args.speed)
+        else:
+            market = HistoricalMarket(db, args.replay_from, days_per_second=args.speed)
+    if args.record:
+        from services.replay import MarketRecorder
+        market = MarketRecorder(market or CachedMarketService(), args.record)
+    ft.app(target=MainController(db=db, market=market).start)
+
 if __name__ == "__main__":
-    ft.app(target=MainController().start)
\ No newline at end of file
+    main()
\ No newline at end of file
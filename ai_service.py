@@ -1,14 +1,52 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import metrics, timed
 
 class SentimentAnalyzer:
-    def __init__(self, model_name="llama3.2"):
+    def __init__(self, model_name="llama3.2", cache_path="ai_cache.db", max_concurrency=4):
         self.api_url = "http://localhost:11434/api/generate"
         self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        # סשן אחד משותף - חיבורי keep-alive לאולמה במקום חיבור חדש בכל לחיצה
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency))
+        self._cache_lock = threading.Lock()
+        self._cache = sqlite3.connect(cache_path, check_same_thread=False)
+        self._cache.execute("CREATE TABLE IF NOT EXISTS sentiment_cache (key TEXT PRIMARY KEY, response TEXT)")
+        self._cache.commit()
 
-    def analyze_portfolio_stock(self, symbol: str, headlines: list) -> str:
+    def _cache_key(self, symbol, headlines):
+        digest = hashlib.sha256("\n".join(sorted(headlines)).encode("utf-8")).hexdigest()
+        return f"{self.model_name}|{symbol.upper()}|{digest}"
+
+    def _cached(self, key):
+        with self._cache_lock:
+            row = self._cache.execute("SELECT response FROM sentiment_cache WHERE key=?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _store(self, key, response):
+        with self._cache_lock:
+            self._cache.execute("INSERT OR REPLACE INTO sentiment_cache VALUES (?, ?)", (key, response))
+            self._cache.commit()
+
+    @timed("ai.analyze_portfolio_stock")
+    def analyze_portfolio_stock(self, symbol: str, headlines: list, on_token=None) -> str:
+        """`on_token(text_so_far)` is called as the answer streams in, if given."""
         if not headlines:
             return "No recent news found to analyze."
 
+        key = self._cache_key(symbol, headlines)
+        cached = self._cached(key)
+        if cached is not None:
+            metrics.count("ai.cache_hit")
+            if on_token: on_token(cached)
+            return cached
+
         news_text = "\n- ".join(headlines)
         
         # הפרומפט החדש: מבקשים ניתוח סנטימנט במקום ייעוץ פיננסי
@@ -24,13 +62,49 @@ class SentimentAnalyzer:
         payload = {
             "model": self.model_name,
             "prompt": prompt,
-            "stream": False,
+            "stream": on_token is not None,
             "options": {"temperature": 0.1} # טמפרטורה נמוכה כדי שיהיה ממוקד ולא יקשקש
         }
         
         try:
-            response = requests.post(self.api_url, json=payload, timeout=45)
-            response.raise_for_status()
-            return response.json().get("response", "").strip()
+            if on_token is None:
+                response = self.session.post(self.api_url, json=payload, timeout=45)
+                response.raise_for_status()
+                result = response.json().get("response", "").strip()
+            else:
+                result = self._stream(payload, on_token)
         except Exception as e:
-            return f"Error connecting to AI: {str(e)}"
\ No newline at end of file
+            metrics.count("ai.error")
+            return f"Error connecting to AI: {str(e)}"
+        if result:
+            self._store(key, result)
+        return result
+
+    def _stream(self, payload, on_token):
+        parts = []
+        with self.session.post(self.api_url, json=payload, timeout=45, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line: continue
+                chunk = json.loads(line)
+                token = chunk.get("response", "")
+                if token:
+                    parts.append(token)
+                    on_token("".join(parts))
+                if chunk.get("done"): break
+        return "".join(parts).strip()
+
+    @timed("ai.analyze_many")
+    def analyze_many(self, news_by_symbol: dict, on_result=None) -> dict:
+        """ניתוח מקבילי של כמה מניות: {symbol: headlines} -> {symbol: answer}.
+
+        At most `max_concurrency` requests run at once; `on_result(symbol, answer)`
+        fires as each one finishes.
+        """
+        def run(symbol):
+            answer = self.analyze_portfolio_stock(symbol, news_by_symbol[symbol])
+            if on_result: on_result(symbol, answer)
+            return symbol, answer
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return dict(pool.map(run, news_by_symbol))
\ No newline at end of file
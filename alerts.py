@@ -0,0 +1,106 @@
+import bisect
+import threading
+
+ALERT_KINDS = ("price", "change")      # מחיר, או שינוי יומי באחוזים
+ALERT_DIRECTIONS = ("above", "below")
+
+
+class AlertRule:
+    __slots__ = ("id", "symbol", "kind", "direction", "threshold")
+
+    def __init__(self, rule_id, symbol, kind, direction, threshold):
+        self.id = rule_id
+        self.symbol = symbol
+        self.kind = kind
+        self.direction = direction
+        self.threshold = threshold
+
+    def describe(self, value=None):
+        unit = "%" if self.kind == "change" else ""
+        text = f"{self.symbol} {'daily change' if self.kind == 'change' else 'price'} {self.direction} {self.threshold:,.2f}{unit}"
+        return text if value is None else f"{text} (now {value:,.2f}{unit})"
+
+
+class AlertIndex:
+    """Active alert rules, indexed so a quote only touches the rules it crosses.
+
+    Per (symbol, kind) the "above" and "below" thresholds are kept sorted;
+    a new value bisects each side and the crossed rules are a prefix (above)
+    or a suffix (below) of it. Rules are one-shot: `check` removes what it fires.
+    """
+    def __init__(self):
+        self._sides = {}  # (symbol, kind, direction) -> ([threshold], [AlertRule]), ממוין לפי סף
+        self._rules = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rules)
+
+    def load(self, rules):
+        with self._lock:
+            self._sides.clear()
+            self._rules.clear()
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        with self._lock:
+            thresholds, rules = self._sides.setdefault((rule.symbol, rule.kind, rule.direction), ([], []))
+            i = bisect.bisect_right(thresholds, rule.threshold)
+            thresholds.insert(i, rule.threshold)
+            rules.insert(i, rule)
+            self._rules[rule.id] = rule
+
+    def remove(self, rule_id):
+        with self._lock:
+            rule = self._rules.pop(rule_id, None)
+            if rule is not None:
+                self._drop(rule)
+        return rule
+
+    def _drop(self, rule):
+        key = (rule.symbol, rule.kind, rule.direction)
+        thresholds, rules = self._sides[key]
+        i = rules.index(rule, bisect.bisect_left(thresholds, rule.threshold))
+        del thresholds[i], rules[i]
+        if not rules:
+            del self._sides[key]
+
+    def symbols(self):
+        with self._lock:
+            return sorted({rule.symbol for rule in self._rules.values()})
+
+    def rules(self):
+        with self._lock:
+            return sorted(self._rules.values(), key=lambda r: (r.symbol, r.kind, r.direction, r.threshold))
+
+    def check(self, quotes):
+        """Fires the rules crossed by {symbol: (price, change_pct)}; returns [(AlertRule, value)].
+
+        Stale quotes (recorded, not live) never fire a rule.
+        """
+        fired = []
+        with self._lock:
+            if not self._sides:
+                return fired
+            for symbol, quote in quotes.items():
+                if quote is None or getattr(quote, "stale", False):
+                    continue
+                for kind, value in zip(ALERT_KINDS, quote):
+                    for direction in ALERT_DIRECTIONS:
+                        side = self._sides.get((symbol, kind, direction))
+                        if side is None:
+                            continue
+                        thresholds, rules = side
+                        # above: הספים שעד הערך נחצו; below: הספים שמהערך והלאה
+                        if direction == "above":
+                            crossed = slice(0, bisect.bisect_right(thresholds, value))
+                        else:
+                            crossed = slice(bisect.bisect_left(thresholds, value), None)
+                        fired.extend((rule, value) for rule in rules[crossed])
+                        del thresholds[crossed], rules[crossed]
+                        if not rules:
+                            del self._sides[(symbol, kind, direction)]
+            for rule, _ in fired:
+                del self._rules[rule.id]
+        return fired
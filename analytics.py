@@ -0,0 +1,86 @@
+import numpy as np
+
+TRADING_DAYS = 252
+
+
+def align_closes(series_by_symbol, benchmark=None, min_coverage=0.8):
+    """Aligns {symbol: [(date, close), ...]} on the benchmark's dates (or the union of all dates).
+
+    Gaps (holidays, missing bars) are forward-filled per column. A series with
+    no bars, or one starting after the first `1 - min_coverage` of the window
+    (e.g. a recent listing), is left out rather than cutting every other
+    series short; the matrix starts where all kept series have data.
+    Returns (symbols, dates, closes[T x N], benchmark_closes[T] or None, excluded).
+    """
+    bench_lookup = dict(benchmark) if benchmark else None
+    if bench_lookup is not None:
+        dates = sorted(bench_lookup)
+    else:
+        dates = sorted({d for series in series_by_symbol.values() for d, _ in series})
+    candidates = list(series_by_symbol)
+    if not dates or not candidates:
+        return [], [], np.empty((0, 0)), None, candidates
+    row = {d: i for i, d in enumerate(dates)}
+    closes = np.full((len(dates), len(candidates)), np.nan)
+    for j, symbol in enumerate(candidates):
+        for d, close in series_by_symbol[symbol]:
+            i = row.get(d)
+            if i is not None:
+                closes[i, j] = close
+
+    valid = ~np.isnan(closes)
+    if closes.size:
+        last = np.maximum.accumulate(np.where(valid, np.arange(len(dates))[:, None], 0), axis=0)
+        closes = closes[last, np.arange(len(candidates))]
+    first = valid.argmax(axis=0)
+    keep = valid.any(axis=0) & (first <= (1.0 - min_coverage) * len(dates))
+    excluded = [s for s, k in zip(candidates, keep) if not k]
+    symbols = [s for s, k in zip(candidates, keep) if k]
+    start = int(first[keep].max()) if keep.any() else len(dates)
+    bench = np.array([bench_lookup[d] for d in dates[start:]], dtype=float) if bench_lookup is not None else None
+    return symbols, dates[start:], closes[start:, keep], bench, excluded
+
+
+def risk_metrics(closes, weights, benchmark=None, risk_free_rate=0.0, var_level=0.95):
+    """Portfolio risk figures from a T x N close matrix, computed in one vectorized pass.
+
+    `weights` are position weights (normalized here); `benchmark` is a length-T
+    close series (e.g. SPY) used for beta. Returns None with fewer than 3 rows.
+    """
+    closes = np.asarray(closes, dtype=float)
+    if closes.ndim != 2 or closes.shape[0] < 3 or closes.shape[1] == 0:
+        return None
+    weights = np.asarray(weights, dtype=float)
+    weights = weights / weights.sum() if weights.sum() else np.full(closes.shape[1], 1.0 / closes.shape[1])
+
+    returns = closes[1:] / closes[:-1] - 1.0
+    port = returns @ weights
+    daily_std = port.std(ddof=1)
+    excess = port.mean() - risk_free_rate / TRADING_DAYS
+
+    wealth = np.cumprod(1.0 + port)
+    drawdowns = wealth / np.maximum.accumulate(wealth) - 1.0
+
+    beta = None
+    if benchmark is not None:
+        bench = np.asarray(benchmark, dtype=float)
+        bench_ret = bench[1:] / bench[:-1] - 1.0
+        bench_var = bench_ret.var(ddof=1)
+        if bench_var > 0:
+            beta = float(np.cov(port, bench_ret, ddof=1)[0, 1] / bench_var)
+
+    if returns.shape[1] > 1:
+        correlation = np.corrcoef(returns, rowvar=False)
+    else:
+        correlation = np.ones((1, 1))
+
+    return {
+        "volatility": float(daily_std * np.sqrt(TRADING_DAYS)),
+        "beta": beta,
+        "sharpe": float(excess / daily_std * np.sqrt(TRADING_DAYS)) if daily_std > 0 else None,
+        "max_drawdown": float(drawdowns.min()),
+        "var": float(-np.percentile(port, (1.0 - var_level) * 100)),
+        "var_level": var_level,
+        "correlation": correlation,
+        "observations": int(port.shape[0]),
+    }
@@ -0,0 +1,296 @@
+"""Headless JSON API over PortfolioDB, MarketService and SentimentAnalyzer.
+
+    python api_server.py [--host 127.0.0.1] [--port 8080] [--db portfolio.db] [--workers 16]
+
+GET endpoints:
+    /health
+    /portfolios
+    /portfolios/<id>/positions
+    /portfolios/<id>/valuation
+    /portfolios/<id>/transactions?symbol=&kind=&start=&end=&limit=&before=<timestamp>,<id>
+    /portfolios/<id>/pnl?symbol=&method=fifo|average
+    /quotes?symbols=AAPL,MSFT
+    /news/<symbol>?only_new=1
+    /sentiment/<symbol>
+
+Every response carries an ETag; send it back as If-None-Match to get a 304
+when nothing changed. Ledger-backed endpoints derive the ETag from the
+portfolio's last transaction id, so an unchanged portfolio is not even read.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+from database import PortfolioDB, PNL_METHODS
+from services.providers import ProviderError
+from instrumentation import metrics
+
+STATUS_TEXT = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 502: "Bad Gateway", 500: "Internal Server Error"}
+MAX_SYMBOLS = 200
+MAX_PAGE = 1000
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _quote_json(quote):
+    if quote is None:
+        return None
+    return {"price": quote[0], "change_pct": quote[1], "source": getattr(quote, "source", None),
+            "as_of": getattr(quote, "as_of", None), "stale": getattr(quote, "stale", False)}
+
+
+class PortfolioAPI:
+    """Routes GET requests to JSON payloads; the HTTP side is in start_server().
+
+    Blocking work runs on one bounded thread pool, so the worker threads are
+    also the SQLite connection pool (PortfolioDB keeps one per thread), and all
+    requests share the market service's quote cache. Identical requests in
+    flight at the same time share a single computation.
+    """
+    def __init__(self, db, market, ai=None, news=None, workers=16):
+        self.db = db
+        self.market = market
+        self._ai = ai
+        self._news = news
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._inflight = {}
+        # (pattern, handler, version) - version(**params) זול ומחליף את ה-ETag לפני שמחשבים תשובה
+        self.routes = [
+            (re.compile(r"/health"), self.health, None),
+            (re.compile(r"/portfolios"), self.portfolios, None),
+            (re.compile(r"/portfolios/(?P<pid>[^/]+)/positions"), self.positions, self._ledger_version),
+            (re.compile(r"/portfolios/(?P<pid>[^/]+)/valuation"), self.valuation, None),
+            (re.compile(r"/portfolios/(?P<pid>[^/]+)/transactions"), self.transactions, self._ledger_version),
+            (re.compile(r"/portfolios/(?P<pid>[^/]+)/pnl"), self.pnl, self._ledger_version),
+            (re.compile(r"/quotes"), self.quotes, None),
+            (re.compile(r"/news/(?P<symbol>[^/]+)"), self.news_items, None),
+            (re.compile(r"/sentiment/(?P<symbol>[^/]+)"), self.sentiment, None),
+        ]
+
+    @property
+    def ai(self):
+        if self._ai is None:
+            from ai_service import SentimentAnalyzer
+            self._ai = SentimentAnalyzer()
+        return self._ai
+
+    @property
+    def news(self):
+        if self._news is None:
+            from services.news_pipeline import NewsPipeline
+            self._news = NewsPipeline(self.market, self.db)
+        return self._news
+
+    # --- handlers (run on the worker pool) ---
+    def health(self, query):
+        return {"status": "ok"}
+
+    def portfolios(self, query):
+        return {"portfolios": self.db.get_portfolio_ids()}
+
+    def _ledger_version(self, pid, query):
+        return f"{pid}:{self.db.get_portfolio_version(pid)}:{sorted(query.items())}"
+
+    def positions(self, query, pid):
+        return {"portfolio_id": pid, "positions": [
+            {"symbol": s.symbol, "name": s.name, "avg_cost": s.price, "quantity": s.quantity}
+            for s in self.db.get_all_stocks(pid)]}
+
+    def valuation(self, query, pid):
+        stocks = self.db.get_all_stocks(pid)
+        quotes = self.market.fetch_live_prices([s.symbol for s in stocks])
+        rows, total, cost = [], 0.0, 0.0
+        for s in stocks:
+            quote = quotes.get(s.symbol)
+            # בלי ציטוט אין שווי שוק - לא מציבים את מחיר העלות במקומו
+            value = quote[0] * s.quantity if quote else None
+            total += value or 0.0
+            cost += s.calculate_value()
+            rows.append({"symbol": s.symbol, "quantity": s.quantity, "avg_cost": s.price,
+                         "quote": _quote_json(quote), "value": value})
+        return {"portfolio_id": pid, "positions": rows, "market_value": total, "cost_basis": cost,
+                "unpriced": [r["symbol"] for r in rows if r["quote"] is None],
+                "stale": [r["symbol"] for r in rows if r["quote"] and r["quote"]["stale"]]}
+
+    def transactions(self, query, pid):
+        filters = {key: query.get(key) or None for key in ("symbol", "kind", "start", "end")}
+        try:
+            limit = max(1, min(int(query.get("limit", 200)), MAX_PAGE))
+            after = None
+            if query.get("before"):
+                ts, _, txn_id = query["before"].rpartition(",")
+                after = (ts, int(txn_id))
+        except ValueError:
+            raise HTTPError(400, "limit must be an integer and before must be <timestamp>,<id>")
+        rows = self.db.get_transactions(pid, after=after, limit=limit + 1, **filters)
+        page = rows[:limit]
+        return {"portfolio_id": pid, "transactions": [
+                    {"symbol": r[0], "type": r[1], "quantity": r[2], "price": r[3], "timestamp": r[4], "id": r[5]}
+                    for r in page],
+                "next": f"{page[-1][4]},{page[-1][5]}" if len(rows) > limit else None}
+
+    def pnl(self, query, pid):
+        method = query.get("method", "fifo")
+        if method not in PNL_METHODS:
+            raise HTTPError(400, f"method must be one of {', '.join(PNL_METHODS)}")
+        sold_qty, proceeds, cost, realized, open_qty, open_cost = self.db.get_pnl_summary(pid, query.get("symbol"), method)
+        return {"portfolio_id": pid, "method": method, "sold_quantity": sold_qty, "proceeds": proceeds,
+                "cost": cost, "realized": realized, "open_quantity": open_qty, "open_cost": open_cost}
+
+    def quotes(self, query):
+        symbols = [s.strip().upper() for s in query.get("symbols", "").split(",") if s.strip()]
+        if not symbols or len(symbols) > MAX_SYMBOLS:
+            raise HTTPError(400, f"symbols must list 1 to {MAX_SYMBOLS} comma-separated tickers")
+        return {"quotes": {s: _quote_json(q) for s, q in self.market.fetch_live_prices(symbols).items()}}
+
+    def news_items(self, query, symbol):
+        symbol = symbol.upper()
+        only_new = query.get("only_new", "0") not in ("0", "", "false")
+        headlines, sources = self.news.fetch([symbol], only_new=only_new)[symbol]
+        return {"symbol": symbol, "only_new": only_new, "headlines": headlines, "sources": sources}
+
+    def sentiment(self, query, symbol):
+        symbol = symbol.upper()
+        headlines, sources = self.news.fetch([symbol])[symbol]
+        if not headlines:
+            return {"symbol": symbol, "sentiment": None, "summary": None, "headlines": 0, "sources": []}
+        answer = self.ai.analyze_portfolio_stock(symbol, headlines)
+        label = answer.split(None, 1)[0].strip(".:,").upper() if answer else ""
+        return {"symbol": symbol, "sentiment": label if label in ("POSITIVE", "NEGATIVE", "MIXED") else None,
+                "summary": answer, "headlines": len(headlines), "sources": sources}
+
+    # --- dispatch ---
+    def _run(self, handler, version, params, query, if_none_match):
+        """Returns (status, etag, body) on a worker thread."""
+        if version is not None:
+            etag = 'W/"' + hashlib.sha1(version(query=query, **params).encode("utf-8")).hexdigest()[:20] + '"'
+            if etag == if_none_match:
+                return 304, etag, b""
+            body = json.dumps(handler(query, **params), separators=(",", ":")).encode("utf-8")
+            return 200, etag, body
+        body = json.dumps(handler(query, **params), separators=(",", ":")).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        return (304, etag, b"") if etag == if_none_match else (200, etag, body)
+
+    def _route(self, path):
+        for pattern, handler, version in self.routes:
+            match = pattern.fullmatch(path)
+            if match:
+                return handler, version, {k: unquote(v) for k, v in match.groupdict().items()}
+        raise HTTPError(404, f"No route for {path}")
+
+    async def handle(self, method, target, headers):
+        """Returns (status, extra_headers, body)."""
+        metrics.count("api.requests")
+        try:
+            if method not in ("GET", "HEAD"):
+                raise HTTPError(405, "Only GET is supported")
+            url = urlsplit(target)
+            handler, version, params = self._route(url.path.rstrip("/") or "/")
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if_none_match = headers.get("if-none-match")
+            key = (url.path, url.query, if_none_match)
+            task = self._inflight.get(key)
+            if task is None:
+                loop = asyncio.get_running_loop()
+                task = loop.run_in_executor(self.executor, self._run, handler, version, params, query, if_none_match)
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                metrics.count("api.coalesced")
+            status, etag, body = await asyncio.shield(task)
+        except HTTPError as e:
+            status, etag, body = e.status, None, json.dumps({"error": str(e)}).encode("utf-8")
+        except ProviderError as e:
+            status, etag, body = 502, None, json.dumps({"error": str(e)}).encode("utf-8")
+        except Exception as e:
+            metrics.count("api.error")
+            status, etag, body = 500, None, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8")
+        if status == 304:
+            metrics.count("api.not_modified")
+        extra = {"Cache-Control": "no-cache"}
+        if etag:
+            extra["ETag"] = etag
+        return status, extra, b"" if method == "HEAD" else body
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self._news is not None:
+            self._news.shutdown()
+
+
+async def _serve_client(api, reader, writer):
+    """HTTP/1.1 with keep-alive; one request at a time per connection."""
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                break
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split(" ", 2)
+            except ValueError:
+                break
+            headers = {}
+            for line in lines[1:]:
+                name, sep, value = line.partition(":")
+                if sep:
+                    headers[name.strip().lower()] = value.strip()
+            if headers.get("content-length"):
+                await reader.readexactly(int(headers["content-length"]))
+            status, extra, body = await api.handle(method, target, headers)
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            out = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", "Content-Type: application/json",
+                   f"Content-Length: {len(body)}", "Connection: " + ("keep-alive" if keep_alive else "close")]
+            out += [f"{k}: {v}" for k, v in extra.items()]
+            writer.write(("\r\n".join(out) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def start_server(api, host="127.0.0.1", port=8080):
+    """Starts listening and returns the asyncio Server (port 0 picks a free port)."""
+    return await asyncio.start_server(lambda r, w: _serve_client(api, r, w), host, port, backlog=1024)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless JSON API over the portfolio database.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default="portfolio.db")
+    parser.add_argument("--workers", type=int, default=16, help="worker threads (and SQLite connections)")
+    args = parser.parse_args(argv)
+
+    from services.market_service import CachedMarketService
+    api = PortfolioAPI(PortfolioDB(args.db), CachedMarketService(), workers=args.workers)
+
+    async def run():
+        server = await start_server(api, args.host, args.port)
+        print(f"Serving on http://{args.host}:{server.sockets[0].getsockname()[1]}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+        api.market.close()
+        api.db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Vectorized backtest: how portfolio ledgers would have been valued over historical closes.
+
+    python backtest.py [--db portfolio.db] [--portfolio 1,2 | "*"] [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--log LOG]
+
+Closes come from the daily bars stored in the database, or from a recorded
+market log (--log); nothing is fetched from the network.
+"""
+import argparse
+import time
+import numpy as np
+
+
+def close_matrix(bars_by_symbol, start=None, end=None):
+    """Aligns {symbol: [(date, open, high, low, close, volume)]} on the union of their dates.
+
+    Returns (dates[T], symbols[N], closes[T x N]). Gaps are forward-filled and
+    dates before a symbol's first bar take that first close.
+    """
+    series = {}
+    for symbol, bars in bars_by_symbol.items():
+        rows = [(bar[0], bar[4]) for bar in bars if (not start or bar[0] >= start) and (not end or bar[0] <= end)]
+        if rows:
+            series[symbol] = rows
+    symbols = sorted(series)
+    dates = np.array(sorted({d for rows in series.values() for d, _ in rows}), dtype="U10")
+    closes = np.full((len(dates), len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        days, values = zip(*series[symbol])
+        closes[np.searchsorted(dates, np.array(days, dtype="U10")), j] = values
+    if closes.size:
+        valid = ~np.isnan(closes)
+        last = np.maximum.accumulate(np.where(valid, np.arange(len(dates))[:, None], 0), axis=0)
+        closes = closes[last, np.arange(len(symbols))]
+        first = closes[valid.argmax(axis=0), np.arange(len(symbols))]
+        closes = np.where(np.isnan(closes), first, closes)
+    return dates, symbols, closes
+
+
+class BacktestResult:
+    """Daily market value and net cash invested per portfolio (T x P arrays)."""
+    __slots__ = ("dates", "portfolio_ids", "values", "invested", "missing_symbols")
+
+    def __init__(self, dates, portfolio_ids, values, invested, missing_symbols):
+        self.dates = dates
+        self.portfolio_ids = portfolio_ids
+        self.values = values
+        self.invested = invested
+        self.missing_symbols = missing_symbols
+
+    @property
+    def pnl(self): return self.values - self.invested
+
+    def series(self, portfolio_id):
+        """[(date, value, pnl)] for one portfolio."""
+        p = self.portfolio_ids.index(str(portfolio_id))
+        return list(zip(self.dates.tolist(), self.values[:, p].tolist(), self.pnl[:, p].tolist()))
+
+    def summary(self):
+        """Per portfolio: (portfolio_id, final_value, net_invested, pnl, max_drawdown)."""
+        if not len(self.dates):
+            return []
+        peak = np.maximum.accumulate(self.pnl, axis=0)
+        drawdown = (self.pnl - peak).min(axis=0)
+        return [(pid, float(self.values[-1, p]), float(self.invested[-1, p]), float(self.pnl[-1, p]), float(drawdown[p]))
+                for p, pid in enumerate(self.portfolio_ids)]
+
+
+def backtest(ledger, dates, symbols, closes, chunk=1024):
+    """Values every portfolio in `ledger` on every date of the close matrix.
+
+    `ledger` rows are (portfolio_id, symbol, type, quantity, price, timestamp),
+    as from PortfolioDB.get_ledger. A trade counts from the close of its day;
+    trades before the first date count from the first. Holdings are built for
+    `chunk` (portfolio, symbol) pairs at a time to bound memory.
+    """
+    T, N = closes.shape
+    portfolio_ids = sorted({str(row[0]) for row in ledger})
+    column = {s: j for j, s in enumerate(symbols)}
+    missing = sorted({row[1] for row in ledger if row[1] not in column})
+    rows = [row for row in ledger if row[1] in column]
+    values = np.zeros((T, len(portfolio_ids)))
+    invested = np.zeros((T + 1, len(portfolio_ids)))
+    if not rows or T == 0:
+        return BacktestResult(dates, portfolio_ids, values, invested[:-1], missing)
+
+    pid_index = {pid: p for p, pid in enumerate(portfolio_ids)}
+    p_idx = np.fromiter((pid_index[str(r[0])] for r in rows), dtype=np.int64, count=len(rows))
+    s_idx = np.fromiter((column[r[1]] for r in rows), dtype=np.int64, count=len(rows))
+    sign = np.fromiter((1 if r[2] == "BUY" else -1 for r in rows), dtype=np.int64, count=len(rows))
+    qty = sign * np.fromiter((r[3] for r in rows), dtype=np.int64, count=len(rows))
+    cash = qty * np.fromiter((r[4] for r in rows), dtype=float, count=len(rows))
+    t_idx = np.searchsorted(dates, np.array([r[5][:10] for r in rows], dtype="U10"))  # T = אחרי סוף הטווח
+
+    np.add.at(invested, (t_idx, p_idx), cash)
+    invested = np.cumsum(invested[:-1], axis=0)
+
+    # זוגות (תיק, סימבול) ממוינים לפי תיק, כך שכל תיק הוא רצף עמודות
+    pairs, pair_idx = np.unique(p_idx * N + s_idx, return_inverse=True)
+    pair_pid, pair_sym = pairs // N, pairs % N
+    order = np.argsort(pair_idx, kind="stable")
+    sorted_pairs = pair_idx[order]
+    for lo in range(0, len(pairs), chunk):
+        hi = min(lo + chunk, len(pairs))
+        a, b = np.searchsorted(sorted_pairs, [lo, hi])
+        sel = order[a:b]
+        deltas = np.zeros((T + 1, hi - lo))
+        np.add.at(deltas, (t_idx[sel], pair_idx[sel] - lo), qty[sel])
+        worth = np.cumsum(deltas[:-1], axis=0) * closes[:, pair_sym[lo:hi]]
+        pids = pair_pid[lo:hi]
+        starts = np.flatnonzero(np.r_[True, pids[1:] != pids[:-1]])
+        values[:, pids[starts]] += np.add.reduceat(worth, starts, axis=1)
+    return BacktestResult(dates, portfolio_ids, values, invested, missing)
+
+
+def run(db, portfolio_ids=None, start=None, end=None, market=None):
+    """Backtests portfolios from `db`; bars come from `market.fetch_daily_bars` if given, else from the db."""
+    ledger = db.get_ledger(portfolio_ids)
+    symbols = sorted({row[1] for row in ledger})
+    load = market.fetch_daily_bars if market is not None else db.get_price_bars
+    dates, symbols, closes = close_matrix({s: load(s) for s in symbols}, start, end)
+    return backtest(ledger, dates, symbols, closes)
+
+
+def main(argv=None):
+    from database import PortfolioDB
+
+    parser = argparse.ArgumentParser(description="Backtest portfolio ledgers over stored daily closes.")
+    parser.add_argument("--db", default="portfolio.db")
+    parser.add_argument("--portfolio", default="*", help='comma-separated IDs, or "*" for all')
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--log", help="take bars from a recorded market log instead of the database")
+    args = parser.parse_args(argv)
+
+    db = PortfolioDB(args.db)
+    market = None
+    if args.log:
+        from services.replay import RecordedMarket
+        market = RecordedMarket(args.log, speed=None)
+        market.clock.set(float("inf"))
+    ids = None if args.portfolio == "*" else [p.strip() for p in args.portfolio.split(",") if p.strip()]
+    try:
+        started = time.perf_counter()
+        result = run(db, ids, args.start, args.end, market)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    if not len(result.dates):
+        print("No price history for these portfolios.")
+        return
+    print(f"{len(result.portfolio_ids)} portfolios x {len(result.dates)} days ({result.dates[0]} - {result.dates[-1]}) in {elapsed:.3f}s")
+    if result.missing_symbols:
+        print(f"No bars for: {', '.join(result.missing_symbols)} (left out)")
+    print(f"{'Portfolio':>12} {'Value':>14} {'Invested':>14} {'P/L':>14} {'Max DD':>14}")
+    for pid, value, invested, pnl, drawdown in result.summary():
+        print(f"{pid:>12} {value:>14,.2f} {invested:>14,.2f} {pnl:>+14,.2f} {drawdown:>14,.2f}")
+
+
+if __name__ == "__main__":
+    main()
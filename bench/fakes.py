@@ -0,0 +1,145 @@
+"""Deterministic offline stand-ins for MarketService and the Ollama HTTP API."""
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _rng(*parts):
+    return random.Random(zlib.crc32("|".join(map(str, parts)).encode("utf-8")))
+
+
+class FakeMarketService:
+    """Same interface as MarketService, with synthetic data and configurable latency.
+
+    Prices are a seeded random walk per symbol, so runs are reproducible.
+    `latency` is the simulated round trip in seconds for every network call.
+    """
+    def __init__(self, latency=0.0, history_days=5 * 365):
+        self.latency = latency
+        self.history_days = history_days
+        self.calls = 0
+        self.company_names = {s: f"{s} Corp." for s in ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "NVDA", "META", "NFLX", "V", "JNJ"]}
+        self._closes = {}
+        self._lock = threading.Lock()
+
+    def _network(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _series(self, symbol):
+        with self._lock:
+            closes = self._closes.get(symbol)
+            if closes is None:
+                rng = _rng("walk", symbol)
+                price = rng.uniform(20, 500)
+                closes = []
+                for _ in range(self.history_days):
+                    price *= 1 + rng.gauss(0.0003, 0.018)
+                    closes.append(round(price, 2))
+                self._closes[symbol] = closes
+            return closes
+
+    def get_company_name(self, symbol):
+        return self.company_names.get(symbol.upper(), symbol.upper())
+
+    def fetch_live_prices(self, symbols):
+        self._network()
+        quotes = {}
+        for s in dict.fromkeys(x.upper() for x in symbols):
+            closes = self._series(s)
+            quotes[s] = (closes[-1], (closes[-1] / closes[-2] - 1) * 100)
+        return quotes
+
+    def fetch_live_price(self, symbol):
+        return self.fetch_live_prices([symbol])[symbol.upper()][0]
+
+    def get_daily_change(self, symbol):
+        return self.fetch_live_prices([symbol])[symbol.upper()]
+
+    def fetch_daily_bars(self, symbol, start=None):
+        self._network()
+        closes = self._series(symbol.upper())
+        today = datetime.now().date()
+        bars = []
+        for i, close in enumerate(closes):
+            day = (today - timedelta(days=len(closes) - 1 - i)).strftime("%Y-%m-%d")
+            if start and day < start:
+                continue
+            bars.append((day, close, close * 1.01, close * 0.99, close, 1_000_000))
+        return bars
+
+    def fetch_yahoo_news(self, symbol, limit=5):
+        self._network()
+        return [(f"{symbol} headline {i}", "Fake Wire") for i in range(limit)]
+
+    def fetch_rss_news(self, symbol, limit=5, timeout=10):
+        self._network()
+        return [(f"{symbol} Headline {i}!", "Yahoo Finance RSS") for i in range(2, 2 + limit)]
+
+    def fetch_news_items(self, symbol):
+        return self.fetch_yahoo_news(symbol)
+
+    def fetch_stock_news(self, symbol):
+        items = self.fetch_yahoo_news(symbol)
+        return [t for t, _ in items], sorted({p for _, p in items})
+
+
+class FakeOllama:
+    """Minimal /api/generate server on localhost, streaming and non-streaming.
+
+    Use `url` as SentimentAnalyzer.api_url. `latency` is the delay before the
+    first token; `token_delay` the delay between streamed tokens.
+    """
+    ANSWER = "MIXED המידע מעורב ואין מגמה ברורה בכותרות."
+
+    def __init__(self, latency=0.0, token_delay=0.0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake.requests += 1
+                time.sleep(fake.latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                if not payload.get("stream"):
+                    body = json.dumps({"response": fake.ANSWER, "done": True}).encode("utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self.end_headers()
+                for word in fake.ANSWER.split(" "):
+                    self.wfile.write(json.dumps({"response": word + " ", "done": False}).encode("utf-8") + b"\n")
+                    self.wfile.flush()
+                    time.sleep(fake.token_delay)
+                self.wfile.write(json.dumps({"response": "", "done": True}).encode("utf-8") + b"\n")
+
+        self.latency = latency
+        self.token_delay = token_delay
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/generate"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
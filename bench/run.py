@@ -0,0 +1,312 @@
+"""Offline benchmarks for the hot paths, with no Yahoo or Ollama access.
+
+    python -m bench.run [--portfolios 10 --positions 60 --transactions 100000]
+                        [--latency 0.05] [--repeat 5] [--compare bench/results/<file>.json]
+
+Results are written to bench/results/<timestamp>.json and compared with the
+previous run (or --compare) so regressions show up as percentage deltas.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench.fakes import FakeMarketService, FakeOllama
+from bench.synthetic import make_portfolio_db
+from models import Stock
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+class _StubPage:
+    """Stands in for ft.Page: accepts attributes, update() and add() do nothing."""
+    def update(self, *controls): pass
+    def add(self, *controls): pass
+
+
+def measure(fn, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        fn(arg) if setup else fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"min_ms": min(timings), "median_ms": statistics.median(timings), "max_ms": max(timings), "runs": repeat}
+
+
+def bench_db(db, pid, symbols, repeat):
+    results = {}
+    counter = iter(range(10 ** 9))
+    results["db.add_or_update_stock"] = measure(
+        lambda: db.add_or_update_stock(Stock(symbols[next(counter) % len(symbols)], "x", 100.0, 1), pid), repeat * 20)
+    results["db.get_transactions.full"] = measure(lambda: db.get_transactions(pid), repeat)
+    results["db.get_transactions.page"] = measure(lambda: db.get_transactions(pid, limit=200), repeat)
+    last_id = db.get_transactions(pid, limit=1)[0][5]
+    results["db.get_transactions_since"] = measure(lambda: db.get_transactions_since(pid, last_id - 10), repeat)
+    results["db.get_transactions.filtered_page"] = measure(
+        lambda: db.get_transactions(pid, limit=200, symbol=symbols[0], kind="BUY", start="2020-01-01"), repeat)
+    results["db.get_transaction_totals"] = measure(lambda: db.get_transaction_totals(pid), repeat)
+    results["db.get_pnl_summary"] = measure(lambda: db.get_pnl_summary(pid), repeat)
+    results["db.delete_stock.partial"] = measure(
+        lambda: db.delete_stock(symbols[next(counter) % len(symbols)], pid, 1, 120.0), repeat * 20)
+    results["db.get_all_stocks"] = measure(lambda: db.get_all_stocks(pid), repeat)
+    return results
+
+
+def bench_ui(db, market, pid, repeat):
+    """Controller refresh, panel rendering and chart building (needs flet installed)."""
+    from MainController import MainController
+    from views import PortfolioView
+
+    results = {}
+    controller = MainController(db=db, market=market)
+    controller.view = PortfolioView(_StubPage(), controller)
+    try:
+        results["controller.refresh.load"] = measure(lambda: controller._load_portfolio(pid), repeat)
+        loaded = controller._load_portfolio(pid)
+        panel = controller.view.portfolio_panel
+        stocks, live_prices = loaded[1], loaded[2]
+
+        def cold():
+            panel.pid = None
+            panel.update_data(stocks, None, live_prices, 0.0, pid)
+        results["portfolio_panel.update_data.cold"] = measure(cold, repeat)
+
+        ticks = iter(range(10 ** 9))
+        def one_tick():
+            n = next(ticks)
+            sym = stocks[n % len(stocks)].symbol
+            panel.apply_prices({sym: live_prices[sym] * (1 + 0.001 * (n % 7 + 1))}, None)
+        results["portfolio_panel.apply_prices.one_symbol"] = measure(one_tick, repeat * 20)
+        results["controller.refresh.full"] = measure(lambda: controller._show_portfolio(controller._load_portfolio(pid)), repeat)
+
+        symbol = stocks[0].symbol
+        controller.prices.get_bars(symbol, "5y")
+
+        def cold_series():
+            controller.charts.cache.invalidate()
+            controller.charts.get(symbol, "5Y")
+        results["chart.series.5y.cold"] = measure(cold_series, repeat)
+        results["chart.series.5y.cached"] = measure(lambda: controller.charts.get(symbol, "5Y"), repeat)
+        series = controller.charts.get(symbol, "5Y")
+        results["chart.render.5y"] = measure(lambda: controller._show_chart(symbol, series), repeat)
+    finally:
+        controller.streamer.stop()
+        # המשימות ברקע (למשל analytics) עדיין משתמשות ב-DB שייסגר מיד אחר כך
+        controller.tasks.shutdown(wait=True)
+    return results
+
+
+def bench_backtest(db, market, symbols, repeat, days=10 * 252):
+    """Vectorized ledger backtest of every portfolio over `days` synthetic trading days."""
+    from backtest import backtest, close_matrix
+
+    market.history_days = days
+    bars = {s: market.fetch_daily_bars(s) for s in symbols}
+    ledger = db.get_ledger()
+    dates, symbols, closes = close_matrix(bars)
+    results = {"backtest.close_matrix": measure(lambda: close_matrix(bars), repeat),
+               "backtest.run": measure(lambda: backtest(ledger, dates, symbols, closes), repeat)}
+    results["backtest.run"]["portfolio_days"] = len({row[0] for row in ledger}) * len(dates)
+    return results
+
+
+def bench_api(db, market, pids, symbols, clients=64, per_client=50):
+    """Load test of the headless API: `clients` keep-alive connections, `per_client` requests each."""
+    import asyncio
+    from api_server import PortfolioAPI, start_server
+
+    async def client(port, paths, etags, latencies, statuses, learn=False):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for path in paths:
+                conditional = f"If-None-Match: {etags[path]}\r\n" if path in etags else ""
+                start = time.perf_counter()
+                writer.write(f"GET {path} HTTP/1.1\r\nHost: bench\r\n{conditional}\r\n".encode("latin-1"))
+                await writer.drain()
+                head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+                headers = {k.lower(): v.strip() for k, _, v in (line.partition(":") for line in head[1:] if line)}
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[head[0].split(" ")[1]] = statuses.get(head[0].split(" ")[1], 0) + 1
+                if learn:
+                    etags.setdefault(path, headers.get("etag"))
+        finally:
+            writer.close()
+
+    async def scenario(paths_for, conditional):
+        server = await start_server(api, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        etags, latencies, statuses = {}, [], {}
+        if conditional:
+            # מעבר ראשון אוסף את ה-ETag של כל נתיב, והעומס עצמו שולח If-None-Match
+            await client(port, sorted({p for i in range(clients) for p in paths_for(i)}), etags, [], {}, learn=True)
+        started = time.perf_counter()
+        await asyncio.gather(*(client(port, paths_for(i), etags, latencies, statuses)
+                               for i in range(clients)))
+        elapsed = time.perf_counter() - started
+        server.close()
+        await server.wait_closed()
+        return {"min_ms": min(latencies), "median_ms": statistics.median(latencies), "max_ms": max(latencies),
+                "runs": len(latencies), "rps": len(latencies) / elapsed, "statuses": statuses}
+
+    batch = ",".join(symbols[:20])
+    scenarios = {
+        "api.positions": (lambda i: [f"/portfolios/{pids[i % len(pids)]}/positions"] * per_client, False),
+        "api.positions.if_none_match": (lambda i: [f"/portfolios/{pids[i % len(pids)]}/positions"] * per_client, True),
+        "api.transactions.page": (lambda i: [f"/portfolios/{pids[i % len(pids)]}/transactions?limit=100"] * per_client, False),
+        "api.quotes.20": (lambda i: [f"/quotes?symbols={batch}"] * per_client, False),
+        "api.valuation": (lambda i: [f"/portfolios/{pids[i % len(pids)]}/valuation"] * per_client, False),
+    }
+    api = PortfolioAPI(db, market)
+    results = {}
+    try:
+        for name, (paths_for, conditional) in scenarios.items():
+            results[name] = asyncio.run(scenario(paths_for, conditional))
+            print(f"{name:45s} {results[name]['rps']:10,.0f} req/s  ({clients} clients, {results[name]['statuses']})")
+    finally:
+        api.close()
+    return results
+
+
+def bench_sweep(repeat, latency, universe=2000, workers=(1, None)):
+    """Multi-process quote sweep of `universe` fresh synthetic symbols, per worker count (None = CPU count)."""
+    from functools import partial
+    from services.sweep import QuoteSweeper
+
+    results = {}
+    for count in workers:
+        sweeper = QuoteSweeper(count, shard_size=250, batch_size=50,
+                               market_factory=partial(FakeMarketService, latency=latency))
+        try:
+            sweeper.sweep(["WARM"])  # הפעלת התהליכים לא נמדדת
+            runs = iter(range(repeat))
+            # כל ריצה מתמחרת סימבולים חדשים, כדי שה-FakeMarketService של העובדים לא יחזיר מהזיכרון
+            stats = measure(sweeper.sweep, repeat, setup=lambda: [f"S{run}X{i}" for run in [next(runs)] for i in range(universe)])
+        finally:
+            sweeper.close()
+        stats["workers"] = sweeper.workers
+        stats["symbols_per_s"] = universe / (stats["median_ms"] / 1000)
+        results[f"sweep.{universe}.workers_{'cpu' if count is None else count}"] = stats
+    return results
+
+
+_STARTUP_SNIPPET = """
+import time
+start = time.perf_counter()
+import MainController
+from bench.run import _StubPage
+controller = MainController.MainController()
+controller.start(_StubPage())
+print(time.perf_counter() - start)
+controller.handle_close(None)
+"""
+
+
+def bench_startup(repeat, tmpdir):
+    """Cold start in a fresh interpreter: imports, controller and dashboard shell."""
+    from MainController import COLD_START_BUDGET_S
+
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=repo + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_SNIPPET], cwd=tmpdir, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        timings.append(float(out.strip().splitlines()[-1]) * 1000)
+    result = {"min_ms": min(timings), "median_ms": statistics.median(timings), "max_ms": max(timings),
+              "runs": repeat, "budget_ms": COLD_START_BUDGET_S * 1000}
+    if result["median_ms"] > result["budget_ms"]:
+        print(f"startup.shell median {result['median_ms']:.0f} ms is over the {result['budget_ms']:.0f} ms budget")
+    return {"startup.shell": result}
+
+
+def bench_ai(repeat, tmpdir):
+    from ai_service import SentimentAnalyzer
+
+    results = {}
+    with FakeOllama(latency=0.02) as ollama:
+        ai = SentimentAnalyzer(cache_path=os.path.join(tmpdir, "ai_cache.db"))
+        ai.api_url = ollama.url
+        n = iter(range(10 ** 9))
+        results["ai.analyze.miss"] = measure(lambda: ai.analyze_portfolio_stock("AAPL", [f"headline {next(n)}"]), repeat)
+        ai.analyze_portfolio_stock("AAPL", ["cached headline"])
+        results["ai.analyze.hit"] = measure(lambda: ai.analyze_portfolio_stock("AAPL", ["cached headline"]), repeat)
+        batch = {f"S{i}": [f"batch {i} {time.time()}"] for i in range(8)}
+        results["ai.analyze_many.8"] = measure(lambda: ai.analyze_many({k: v + [str(next(n))] for k, v in batch.items()}), repeat)
+    return results
+
+
+def compare(current, previous):
+    lines = []
+    for name, stats in sorted(current["results"].items()):
+        before = previous["results"].get(name)
+        if not before or not before.get("median_ms"):
+            lines.append(f"{name:45s} {stats['median_ms']:10.2f} ms   (new)")
+            continue
+        delta = (stats["median_ms"] / before["median_ms"] - 1) * 100
+        flag = "  REGRESSION" if delta > 20 else ""
+        lines.append(f"{name:45s} {stats['median_ms']:10.2f} ms   {delta:+7.1f}%{flag}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--portfolios", type=int, default=10)
+    parser.add_argument("--positions", type=int, default=60)
+    parser.add_argument("--transactions", type=int, default=100_000)
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated market round trip in seconds")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--compare", help="results file to compare against (default: latest run)")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["db", "ui", "ai", "startup", "backtest", "api", "sweep"])
+    args = parser.parse_args(argv)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    previous_path = args.compare or max(glob.glob(os.path.join(RESULTS_DIR, "*.json")), default=None)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db, pids, symbols = make_portfolio_db(os.path.join(tmpdir, "portfolio.db"), args.portfolios,
+                                              args.positions, args.transactions)
+        market = FakeMarketService(latency=args.latency)
+        try:
+            if "db" not in args.skip:
+                results.update(bench_db(db, pids[0], symbols, args.repeat))
+            if "ui" not in args.skip:
+                results.update(bench_ui(db, market, pids[0], args.repeat))
+            if "backtest" not in args.skip:
+                results.update(bench_backtest(db, FakeMarketService(), symbols, args.repeat))
+            if "api" not in args.skip:
+                results.update(bench_api(db, market, pids, symbols))
+            if "sweep" not in args.skip:
+                results.update(bench_sweep(args.repeat, args.latency))
+            if "startup" not in args.skip:
+                results.update(bench_startup(args.repeat, tmpdir))
+            if "ai" not in args.skip:
+                results.update(bench_ai(args.repeat, tmpdir))
+        finally:
+            db.close()
+
+    report = {"timestamp": datetime.now().isoformat(timespec="seconds"), "params": vars(args), "results": results}
+    out = os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S-%f") + ".json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    if previous_path:
+        with open(previous_path, encoding="utf-8") as f:
+            print(f"Compared with {os.path.basename(previous_path)}:")
+            print(compare(report, json.load(f)))
+    else:
+        for name, stats in sorted(results.items()):
+            print(f"{name:45s} {stats['median_ms']:10.2f} ms")
+    print(f"Saved {out}")
+
+
+if __name__ == "__main__":
+    main()
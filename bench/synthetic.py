@@ -0,0 +1,37 @@
+"""Synthetic portfolio.db files of configurable size."""
+import os
+import random
+from datetime import datetime, timedelta
+from database import PortfolioDB
+
+
+def symbol_universe(n):
+    base = ["AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "NVDA", "META", "NFLX", "V", "JNJ"]
+    return (base + [f"S{i:04d}" for i in range(max(0, n - len(base)))])[:n]
+
+
+def make_portfolio_db(path, portfolios=10, positions=60, transactions=10_000, seed=7):
+    """Creates `path` with `portfolios` portfolios ("1".."N") of `positions` symbols each.
+
+    `transactions` BUY fills are spread over them (at least one per position),
+    loaded through PortfolioDB.import_fills.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = random.Random(seed)
+    symbols = symbol_universe(positions)
+    start = datetime(2020, 1, 1)
+    fills = []
+    pids = [str(p) for p in range(1, portfolios + 1)]
+    for pid in pids:
+        for sym in symbols:
+            fills.append((pid, sym, sym, rng.randint(1, 50), round(rng.uniform(20, 500), 2), start.strftime("%Y-%m-%d %H:%M:%S")))
+    for i in range(max(0, transactions - len(fills))):
+        ts = start + timedelta(minutes=i)
+        fills.append((rng.choice(pids), rng.choice(symbols), None, rng.randint(1, 20), round(rng.uniform(20, 500), 2), ts.strftime("%Y-%m-%d %H:%M:%S")))
+    fills = [(pid, sym, name or sym, qty, price, ts) for pid, sym, name, qty, price, ts in fills]
+
+    db = PortfolioDB(path)
+    db.import_fills(fills)
+    return db, pids, symbols
@@ -0,0 +1,89 @@
+from services.cache import TTLCache
+from instrumentation import timed
+
+# טווחי הגרף שהמשתמש יכול לבחור -> תקופה ב-PriceHistoryStore
+CHART_RANGES = {"1M": "1mo", "6M": "6mo", "1Y": "1y", "5Y": "5y", "MAX": "max"}
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of [(x, y)] to `threshold` points.
+
+    Keeps the first and last point and, per bucket, the point that spans the
+    largest triangle with its neighbours, so peaks and troughs survive.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    bucket = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket) + 1
+        end = int((i + 1) * bucket) + 1
+        next_end = min(int((i + 2) * bucket) + 1, n)
+        # ממוצע הדלי הבא משמש כקודקוד השלישי של המשולש
+        next_bucket = points[end:next_end] or [points[-1]]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+        ax, ay = points[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+    sampled.append(points[-1])
+    return sampled
+
+
+class ChartSeries:
+    __slots__ = ("symbol", "range", "points", "min_price", "max_price", "x_labels", "raw_count")
+
+    def __init__(self, symbol, chart_range, points, x_labels, raw_count):
+        self.symbol = symbol
+        self.range = chart_range
+        self.points = points
+        prices = [y for _, y in points]
+        self.min_price = min(prices) * 0.98
+        self.max_price = max(prices) * 1.02
+        self.x_labels = x_labels
+        self.raw_count = raw_count
+
+
+class ChartSeriesBuilder:
+    """Builds screen-sized, cached chart series from the local price history."""
+    def __init__(self, prices, max_points=300, label_count=6, ttl=15 * 60):
+        self.prices = prices
+        self.max_points = max_points
+        self.label_count = label_count
+        self.cache = TTLCache(ttl, max_size=64)
+
+    def get(self, symbol: str, chart_range: str = "1M"):
+        """ChartSeries for `symbol` over `chart_range` (a CHART_RANGES key), or None."""
+        symbol = symbol.upper()
+        return self.cache.get_or_load((symbol, chart_range), lambda: self._build(symbol, chart_range),
+                                      cache_if=lambda series: series is not None)
+
+    @timed("chart.build_series")
+    def _build(self, symbol, chart_range):
+        bars = self.prices.get_bars(symbol, CHART_RANGES[chart_range])
+        if not bars:
+            return None
+        dates = [bar[0] for bar in bars]
+        points = lttb([(i, bar[4]) for i, bar in enumerate(bars)], self.max_points)
+
+        last = len(bars) - 1
+        step = max(1, last // (self.label_count - 1)) if self.label_count > 1 else last or 1
+        positions = sorted(set(list(range(0, last, step)) + [last]))
+        if len(positions) > 1 and last - positions[-2] < step / 2:
+            positions.pop(-2)
+        date_fmt = "%d/%m" if chart_range in ("1M", "6M") else "%m/%y"
+        x_labels = [(x, "Today" if x == last else _format_date(dates[x], date_fmt)) for x in positions]
+        return ChartSeries(symbol, chart_range, points, x_labels, len(bars))
+
+
+def _format_date(date_str, fmt):
+    year, month, day = date_str.split("-")
+    return fmt.replace("%d", day).replace("%m", month).replace("%y", year[2:])
@@ -1,30 +1,99 @@
 import flet as ft
-import flet_charts as fch 
+from portfolio_state import PortfolioState
+from chart_series import CHART_RANGES
+from alerts import ALERT_KINDS, ALERT_DIRECTIONS
 
 class TradePanel:
+    DEFAULT_WATCHLIST = "Default"
+
     def __init__(self, controller):
         self.controller = controller
+        # עד שרשימת המעקב נטענת (או כשהיא ריקה) מציגים את הסימבולים המוכרים של השוק
+        self.default_symbols = list(getattr(controller.market, "company_names", {}))
+        self.watchlist = self.DEFAULT_WATCHLIST
         self.symbol_dd = ft.Dropdown(
             label="Select Stock", width=300,
-            options=[ft.dropdown.Option(s) for s in controller.market.company_names.keys()]
+            options=[ft.dropdown.Option(s) for s in self.default_symbols]
         )
         self.symbol_dd.on_change = self.controller.handle_selection
         self.qty_input = ft.TextField(label="Quantity", value="1", width=300)
         self.name_display = ft.TextField(label="Company Name", read_only=True, bgcolor="grey100", width=300)
         self.price_display = ft.TextField(label="Execution Price ($)", read_only=True, bgcolor="grey100", width=300)
-        
-        self.content = ft.Column([
-            ft.Text("Trade Center", size=28, weight="bold"),
-            ft.Text("Buy new stocks to add to your portfolio.", color="grey700"),
-            ft.Divider(),
-            self.symbol_dd, self.name_display, self.qty_input, self.price_display,
-            ft.ElevatedButton("Buy at Market Price", icon="store", 
-                              on_click=self.controller.handle_add, bgcolor="green", color="white", width=300)
-        ])
+
+        self.watchlist_dd = ft.Dropdown(label="Watchlist", width=145, value=self.watchlist,
+                                        options=[ft.dropdown.Option(self.watchlist)],
+                                        on_select=lambda e: self.controller.handle_watchlist_select(self.watchlist_dd.value))
+        self.new_list_input = ft.TextField(label="New list", width=145,
+                                           on_submit=lambda e: self.controller.handle_watchlist_select(self.new_list_input.value))
+        self.watch_input = ft.TextField(label="Add symbols", hint_text="AAPL, MSFT", width=300,
+                                        on_submit=self.controller.handle_watch_add)
+
+        self.alert_kind_dd = ft.Dropdown(label="Alert on", width=95, value=ALERT_KINDS[0],
+                                         options=[ft.dropdown.Option(k) for k in ALERT_KINDS])
+        self.alert_dir_dd = ft.Dropdown(label="When", width=95, value=ALERT_DIRECTIONS[0],
+                                        options=[ft.dropdown.Option(d) for d in ALERT_DIRECTIONS])
+        self.alert_threshold = ft.TextField(label="Threshold", hint_text="$ or %", width=100)
+        self.alerts_list = ft.Column([], scroll="auto", height=150)
+
+        self.content = ft.Row([
+            ft.Column([
+                ft.Text("Trade Center", size=28, weight="bold"),
+                ft.Text("Buy new stocks to add to your portfolio.", color="grey700"),
+                ft.Divider(),
+                self.symbol_dd, self.name_display, self.qty_input, self.price_display,
+                ft.ElevatedButton("Buy at Market Price", icon="store",
+                                  on_click=self.controller.handle_add, bgcolor="green", color="white", width=300)
+            ]),
+            ft.Column([
+                ft.Text("Watchlist & Alerts", size=28, weight="bold"),
+                ft.Text("Symbols to trade and price alerts on them.", color="grey700"),
+                ft.Divider(),
+                ft.Row([self.watchlist_dd, self.new_list_input], spacing=10),
+                self.watch_input,
+                ft.Row([ft.ElevatedButton("Add", icon="playlist_add", on_click=self.controller.handle_watch_add),
+                        ft.TextButton("Remove Selected", on_click=self.controller.handle_watch_remove)]),
+                ft.Divider(),
+                ft.Row([self.alert_kind_dd, self.alert_dir_dd], spacing=10),
+                ft.Row([self.alert_threshold,
+                        ft.ElevatedButton("Set Alert", icon="notifications", on_click=self.controller.handle_alert_add)], spacing=10),
+                self.alerts_list
+            ])
+        ], vertical_alignment="start", spacing=40)
+
+    def parse_symbols(self):
+        return [s.strip().upper() for s in (self.watch_input.value or "").replace(" ", ",").split(",") if s.strip()]
+
+    def set_watchlists(self, names, current, symbols, page=None):
+        self.watchlist = current
+        self.watchlist_dd.options = [ft.dropdown.Option(n) for n in dict.fromkeys(list(names) + [current])]
+        self.watchlist_dd.value = current
+        self.new_list_input.value = ""
+        options = symbols or self.default_symbols
+        self.symbol_dd.options = [ft.dropdown.Option(s) for s in options]
+        if self.symbol_dd.value not in options:
+            self.symbol_dd.value = None
+        if page: page.update()
+
+    def set_alerts(self, rules, page=None):
+        self.alerts_list.controls = [
+            ft.Row([ft.Text(rule.describe(), expand=True),
+                    ft.IconButton(icon="delete", on_click=lambda e, rule_id=rule.id: self.controller.handle_alert_delete(rule_id))])
+            for rule in rules
+        ] or [ft.Text("No active alerts.", color="grey700")]
+        if page: page.update()
 
 class PortfolioPanel:
+    COLORS = ["blue", "red", "green", "orange", "purple", "pink", "teal", "cyan"]
+
     def __init__(self, controller):
+        import flet_charts as fch
         self.controller = controller
+        self.state = PortfolioState()
+        self.pid = None
+        self._rows = {}
+        self._sections = {}
+        self.flags = {}  # symbol -> "stale" / "no quote"
+        self._color_index = 0
         self.table = ft.DataTable(
             show_checkbox_column=True,
             columns=[ft.DataColumn(ft.Text(h)) for h in ["Symbol", "Name", "Avg Cost", "Live Price", "Qty", "Total Value", "P/L %"]],
@@ -34,7 +103,17 @@ class PortfolioPanel:
         self.chart = fch.PieChart(sections=[], sections_space=2, center_space_radius=40, height=220)
         self.delete_qty_input = ft.TextField(label="Qty to Delete", value="All", width=120)
         self.benchmark_text = ft.Text("S&P 500 (SPY): Loading...", size=16, weight="bold", color="grey700")
+        self.live_switch = ft.Switch(label="Live prices", value=False, on_change=self.controller.handle_toggle_live)
         
+        self.breakdown_title = ft.Text("Per-Portfolio Breakdown", size=18, weight="bold", visible=False)
+        self.breakdown_table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(h)) for h in ["Portfolio", "Positions", "Cost Basis", "Market Value", "P/L %"]],
+            rows=[]
+        )
+        self.breakdown_container = ft.Container(content=ft.Column([self.breakdown_table], scroll="always"), height=150, visible=False)
+        self.analytics_text = ft.Text("Load a portfolio to see risk metrics.", color="grey700")
+        self.correlation_table = ft.DataTable(columns=[ft.DataColumn(ft.Text(""))], rows=[], visible=False)
+
         self.trend_chart_title = ft.Text("", size=18, weight="bold")
         # התיקון: הסרנו את tooltip_bgcolor שעשה את השגיאה
         self.trend_chart = fch.LineChart(
@@ -42,9 +121,15 @@ class PortfolioPanel:
             border=ft.border.all(1, "transparent"), 
             expand=True
         )
+        self.chart_range = "1M"
+        self.range_buttons = {
+            r: ft.TextButton(r, on_click=lambda e, r=r: self.controller.handle_chart_range(r))
+            for r in CHART_RANGES
+        }
+        self.set_chart_range(self.chart_range)
         self.trend_chart_container = ft.Container(
             content=ft.Column([
-                self.trend_chart_title,
+                ft.Row([self.trend_chart_title, ft.Row(list(self.range_buttons.values()), spacing=0)], alignment="spaceBetween"),
                 ft.Container(self.trend_chart, height=200)
             ]),
             visible=False,
@@ -52,44 +137,153 @@ class PortfolioPanel:
         )
         
         self.content = ft.Column([
-            ft.Row([ft.Text("My Portfolio & Analytics", size=28, weight="bold"), self.benchmark_text], alignment="spaceBetween"),
+            ft.Row([ft.Text("My Portfolio & Analytics", size=28, weight="bold"), ft.Row([self.live_switch, self.benchmark_text])], alignment="spaceBetween"),
             ft.Text("Manage your assets, track P/L, and view diversification.", color="grey700"),
             ft.Divider(),
             ft.Container(content=ft.Column([self.table], scroll="always"), height=150),
             ft.Row([self.delete_qty_input, ft.ElevatedButton("Delete Selected Stock", icon="delete", on_click=self.controller.handle_delete, bgcolor="red", color="white")]),
+            self.breakdown_title,
+            self.breakdown_container,
             ft.Divider(),
             
             self.trend_chart_container,
             ft.Divider(),
             
-            ft.Text("Portfolio Diversification", size=18, weight="bold"),
-            ft.Container(content=self.chart) 
+            ft.Row([
+                ft.Column([ft.Text("Portfolio Diversification", size=18, weight="bold"), ft.Container(content=self.chart)], expand=1),
+                ft.Column([ft.Text("Risk Analytics (1Y)", size=18, weight="bold"), self.analytics_text, self.correlation_table], expand=1),
+            ], vertical_alignment="start")
         ], visible=False, expand=True, scroll="auto")
         
-    def update_data(self, stocks, page, live_prices=None, spy_change=0.0):
-        if live_prices is None: live_prices = {}
+    def set_chart_range(self, chart_range):
+        self.chart_range = chart_range
+        for r, btn in self.range_buttons.items():
+            btn.style = ft.ButtonStyle(color="blue900" if r == chart_range else "grey600")
+
+    def set_benchmark(self, spy_change):
         spy_color = "green" if spy_change >= 0 else "red"
         spy_sign = "+" if spy_change > 0 else ""
         self.benchmark_text.value = f"S&P 500 (SPY): {spy_sign}{spy_change:.2f}%"
         self.benchmark_text.color = spy_color
-        self.table.rows = []
-        self.selected_sym = None 
-        
-        self.trend_chart_container.visible = False
-        
-        chart_sections = []
-        colors = ["blue", "red", "green", "orange", "purple", "pink", "teal", "cyan"]
-        total_val = sum(live_prices.get(s.symbol, s.price) * s.quantity for s in stocks)
-        for i, s in enumerate(stocks):
-            live_price = live_prices.get(s.symbol, s.price)
-            current_val = live_price * s.quantity
-            pl_pct = ((live_price / s.price) - 1) * 100 if s.price > 0 else 0
-            pl_color = "green" if pl_pct >= 0 else "red"
-            self.table.rows.append(ft.DataRow(cells=[ft.DataCell(ft.Text(s.symbol)), ft.DataCell(ft.Text(s.name)), ft.DataCell(ft.Text(f"${s.price:.2f}")), ft.DataCell(ft.Text(f"${live_price:.2f}")), ft.DataCell(ft.Text(str(s.quantity))), ft.DataCell(ft.Text(f"${current_val:.2f}")), ft.DataCell(ft.Text(f"{pl_pct:+.2f}%", color=pl_color, weight="bold"))], on_select_change=lambda e, sym=s.symbol: self.set_selection(e, sym, page)))
-            if total_val > 0:
-                pct = (current_val / total_val) * 100
-                chart_sections.append(fch.PieChartSection(pct, color=colors[i % len(colors)], radius=50, title=f"{s.symbol}\n{pct:.1f}%", title_style=ft.TextStyle(size=12, color="white", weight="bold")))
-        self.chart.sections = chart_sections
+
+    def update_data(self, stocks, page, live_prices=None, spy_change=0.0, pid=None, flags=None):
+        self.set_benchmark(spy_change)
+        if pid != self.pid:
+            # תיק אחר - בונים מאפס
+            self.pid = pid
+            self.state.reset()
+            self._rows, self._sections = {}, {}
+            self.table.rows = []
+            self.chart.sections = []
+            self.selected_sym = None
+            self.trend_chart_container.visible = False
+        diff = self.state.sync(stocks, live_prices)
+        self._set_flags(flags or {}, diff)
+        self._apply_diff(diff, page)
+
+    def apply_prices(self, live_prices, page, stale=()):
+        """Patches only the rows whose live price (or staleness) changed."""
+        diff = self.state.apply_prices(live_prices)
+        flags = {sym: flag for sym, flag in self.flags.items() if sym not in live_prices}
+        flags.update((sym, "stale") for sym in stale if sym in live_prices)
+        self._set_flags(flags, diff)
+        if diff:
+            self._apply_diff(diff, page)
+        return diff
+
+    def _set_flags(self, flags, diff):
+        changed = {sym for sym in set(flags) | set(self.flags) if flags.get(sym) != self.flags.get(sym)}
+        self.flags = flags
+        diff.updated.extend(sym for sym in changed
+                            if sym in self.state.positions and sym not in diff.added and sym not in diff.updated)
+
+    def _apply_diff(self, diff, page):
+        import flet_charts as fch
+        for sym in diff.removed:
+            self.table.rows.remove(self._rows.pop(sym))
+            self.chart.sections.remove(self._sections.pop(sym))
+            if self.selected_sym == sym:
+                self.selected_sym = None
+                self.trend_chart_container.visible = False
+        for sym in diff.added:
+            pos = self.state.positions[sym]
+            row = ft.DataRow(cells=[ft.DataCell(ft.Text(sym))] + [ft.DataCell(ft.Text("")) for _ in range(6)],
+                             on_select_change=lambda e, sym=sym: self.set_selection(e, sym, page))
+            self._fill_row(row, pos)
+            self._rows[sym] = row
+            self.table.rows.append(row)
+            section = fch.PieChartSection(pos.value, color=self.COLORS[self._color_index % len(self.COLORS)], radius=50, title="", title_style=ft.TextStyle(size=12, color="white", weight="bold"))
+            self._color_index += 1
+            self._sections[sym] = section
+            self.chart.sections.append(section)
+        for sym in diff.updated:
+            pos = self.state.positions[sym]
+            self._fill_row(self._rows[sym], pos)
+            self._sections[sym].value = pos.value
+        # המשקלים תלויים בסך התיק; מעדכנים רק כותרות שהטקסט שלהן השתנה בפועל
+        for sym, section in self._sections.items():
+            title = f"{sym}\n{self.state.weight(sym):.1f}%"
+            if section.title != title:
+                section.title = title
+        if page: page.update()
+
+    def _fill_row(self, row, pos):
+        pl_pct = pos.pl_pct
+        flag = self.flags.get(pos.symbol)
+        price = f"${pos.live_price:.2f}" + (f" ({flag})" if flag else "")
+        texts = [pos.name, f"${pos.avg_cost:.2f}", price, str(pos.quantity), f"${pos.value:.2f}", f"{pl_pct:+.2f}%"]
+        for cell, text in zip(row.cells[1:], texts):
+            if cell.content.value != text:
+                cell.content.value = text
+        row.cells[3].content.color = "orange800" if flag else None
+        pl_text = row.cells[6].content
+        pl_text.color = "green" if pl_pct >= 0 else "red"
+        pl_text.weight = "bold"
+
+    BREAKDOWN_LIMIT = 200
+
+    def update_breakdown(self, valuations, page):
+        """valuations: [(portfolio_id, positions, cost, market_value)], or None to hide."""
+        visible = bool(valuations)
+        self.breakdown_title.visible = self.breakdown_container.visible = visible
+        if not visible:
+            self.breakdown_table.rows = []
+            if page: page.update()
+            return
+        top = sorted(valuations, key=lambda v: v[3] or 0, reverse=True)[:self.BREAKDOWN_LIMIT]
+        rows = []
+        for pid, count, cost, value in top:
+            pl_pct = ((value / cost) - 1) * 100 if cost else 0
+            rows.append(ft.DataRow(cells=[ft.DataCell(ft.Text(str(pid))), ft.DataCell(ft.Text(str(count))), ft.DataCell(ft.Text(f"${cost:,.2f}")), ft.DataCell(ft.Text(f"${value:,.2f}")), ft.DataCell(ft.Text(f"{pl_pct:+.2f}%", color="green" if pl_pct >= 0 else "red", weight="bold"))]))
+        self.breakdown_table.rows = rows
+        self.breakdown_title.value = f"Per-Portfolio Breakdown ({len(valuations)} portfolios" + (f", top {self.BREAKDOWN_LIMIT} by value)" if len(valuations) > self.BREAKDOWN_LIMIT else ")")
+        if page: page.update()
+
+    def update_analytics(self, symbols, metrics, excluded, page):
+        left_out = f"\nLeft out (short, missing or unavailable history): {', '.join(excluded)}" if excluded else ""
+        if metrics is None:
+            self.analytics_text.value = "Not enough price history for risk metrics." + left_out
+            self.correlation_table.visible = False
+            if page: page.update()
+            return
+        beta = f"{metrics['beta']:.2f}" if metrics["beta"] is not None else "n/a"
+        sharpe = f"{metrics['sharpe']:.2f}" if metrics["sharpe"] is not None else "n/a"
+        self.analytics_text.value = (
+            f"Volatility (ann.): {metrics['volatility'] * 100:.1f}%\n"
+            f"Beta vs SPY: {beta}\n"
+            f"Sharpe ratio: {sharpe}\n"
+            f"Max drawdown: {metrics['max_drawdown'] * 100:.1f}%\n"
+            f"1-day VaR ({metrics['var_level'] * 100:.0f}%): {metrics['var'] * 100:.2f}%\n"
+            f"Based on {metrics['observations']} daily returns"
+            + left_out
+        )
+        corr = metrics["correlation"]
+        self.correlation_table.columns = [ft.DataColumn(ft.Text(""))] + [ft.DataColumn(ft.Text(s)) for s in symbols]
+        self.correlation_table.rows = [
+            ft.DataRow(cells=[ft.DataCell(ft.Text(sym, weight="bold"))] + [ft.DataCell(ft.Text(f"{corr[i][j]:.2f}")) for j in range(len(symbols))])
+            for i, sym in enumerate(symbols)
+        ]
+        self.correlation_table.visible = len(symbols) > 1
         if page: page.update()
 
     def set_selection(self, e, sym, page):
@@ -128,6 +322,7 @@ class AIPanel:
             ft.Divider(),
             self.symbol_dd,
             ft.ElevatedButton("Fetch News & Analyze", icon="psychology", on_click=self.controller.handle_ai, bgcolor="purple", color="white", width=400),
+            ft.OutlinedButton("Analyze All Holdings", icon="playlist_play", on_click=self.controller.handle_ai_all, width=400),
             ft.Divider(), 
             self.ai_result_display
         ], visible=False)
@@ -137,24 +332,161 @@ class AIPanel:
         if page: page.update()
 
 class HistoryPanel:
+    PAGE_SIZE = 200
+
     def __init__(self, controller):
         self.controller = controller
+        self.pid = None
+        self.rows = []        # חלון השורות המוצג בלבד, לא כל ההיסטוריה
+        self.last_id = None   # העסקה החדשה ביותר שמוצגת
+        self.cursors = [None] # סמן (timestamp, id) שממנו מתחיל כל עמוד
+        self.page_index = 0
+        self.has_more = False
+        self.total_count = 0
         self.table = ft.DataTable(
             columns=[ft.DataColumn(ft.Text(h)) for h in ["Date", "Symbol", "Action", "Qty", "Price"]],
             rows=[]
         )
+        self.symbol_dd = ft.Dropdown(label="Symbol", width=140, options=[ft.dropdown.Option("All")], value="All")
+        self.kind_dd = ft.Dropdown(label="Action", width=120, options=[ft.dropdown.Option(k) for k in ["All", "BUY", "SELL"]], value="All")
+        self.start_input = ft.TextField(label="From", hint_text="YYYY-MM-DD", width=140)
+        self.end_input = ft.TextField(label="To", hint_text="YYYY-MM-DD", width=140)
+        self.totals_text = ft.Text("", color="grey700")
+        self.pnl_text = ft.Text("", weight="bold")
+        self.page_text = ft.Text("")
+        self.prev_btn = ft.IconButton(icon="chevron_left", on_click=lambda e: self.controller.handle_history_page(-1), disabled=True)
+        self.next_btn = ft.IconButton(icon="chevron_right", on_click=lambda e: self.controller.handle_history_page(1), disabled=True)
         self.content = ft.Column([
             ft.Text("Transaction History", size=28, weight="bold"),
             ft.Text("Full ledger of your buys and sells.", color="grey700"),
+            ft.Row([self.symbol_dd, self.kind_dd, self.start_input, self.end_input,
+                    ft.ElevatedButton("Filter", icon="filter_list", on_click=self.controller.handle_history_filter),
+                    ft.TextButton("Clear", on_click=self.clear_filters)]),
+            self.totals_text,
+            self.pnl_text,
             ft.Divider(),
-            ft.Container(content=ft.Column([self.table], scroll="always"), expand=True)
+            ft.Container(content=ft.Column([self.table], scroll="always"), expand=True),
+            ft.Row([self.prev_btn, self.page_text, self.next_btn], alignment="center")
         ], visible=False, expand=True)
 
-    def update_data(self, transactions, page):
-        self.table.rows = []
-        for t in transactions:
-            color = "green" if t[1] == "BUY" else "red"
-            self.table.rows.append(ft.DataRow(cells=[
-                ft.DataCell(ft.Text(t[4])), ft.DataCell(ft.Text(t[0])), ft.DataCell(ft.Text(t[1], color=color, weight="bold")), ft.DataCell(ft.Text(str(t[2]))), ft.DataCell(ft.Text(f"${t[3]:.2f}"))
-            ]))
-        if page: page.update()
\ No newline at end of file
+    def filters(self):
+        return {
+            "symbol": None if self.symbol_dd.value in (None, "All") else self.symbol_dd.value,
+            "kind": None if self.kind_dd.value in (None, "All") else self.kind_dd.value,
+            "start": (self.start_input.value or "").strip() or None,
+            "end": (self.end_input.value or "").strip() or None,
+        }
+
+    def clear_filters(self, e):
+        self.symbol_dd.value = self.kind_dd.value = "All"
+        self.start_input.value = self.end_input.value = ""
+        self.controller.handle_history_filter(e)
+
+    @property
+    def oldest(self):
+        return tuple(self.rows[-1][4:6]) if self.rows else None
+
+    @staticmethod
+    def _row(t):
+        color = "green" if t[1] == "BUY" else "red"
+        return ft.DataRow(cells=[
+            ft.DataCell(ft.Text(t[4])), ft.DataCell(ft.Text(t[0])), ft.DataCell(ft.Text(t[1], color=color, weight="bold")), ft.DataCell(ft.Text(str(t[2]))), ft.DataCell(ft.Text(f"${t[3]:.2f}"))
+        ])
+
+    def _track(self, transactions):
+        if not transactions: return
+        newest = max(t[5] for t in transactions)
+        self.last_id = newest if self.last_id is None else max(self.last_id, newest)
+
+    def set_totals(self, totals, page=None):
+        count, buy_qty, buy_value, sell_qty, sell_value = totals
+        self.total_count = count
+        self.totals_text.value = (f"{count:,} transactions · Bought {buy_qty:,} for ${buy_value:,.2f}"
+                                  f" · Sold {sell_qty:,} for ${sell_value:,.2f}")
+        self._update_pager()
+        if page: page.update()
+
+    def set_pnl(self, fifo, average, page=None):
+        """fifo/average are PortfolioDB.get_pnl_summary rows for the current symbol filter."""
+        realized_fifo, realized_avg = fifo[3], average[3]
+        self.pnl_text.value = (f"Realized P&L: FIFO {'+' if realized_fifo >= 0 else '-'}${abs(realized_fifo):,.2f}"
+                               f" · Average cost {'+' if realized_avg >= 0 else '-'}${abs(realized_avg):,.2f}"
+                               f" · Open: {fifo[4]:,} shares, cost ${fifo[5]:,.2f}")
+        self.pnl_text.color = "green700" if realized_fifo >= 0 else "red700"
+        if page: page.update()
+
+    def set_symbols(self, symbols):
+        self.symbol_dd.options = [ft.dropdown.Option("All")] + [ft.dropdown.Option(s) for s in symbols]
+
+    def _update_pager(self):
+        first = self.page_index * self.PAGE_SIZE
+        self.page_text.value = f"{first + 1 if self.rows else 0:,}–{first + len(self.rows):,} of {self.total_count:,}"
+        self.prev_btn.disabled = self.page_index == 0
+        self.next_btn.disabled = not self.has_more
+
+    def show_page(self, pid, transactions, has_more, page_index, page=None):
+        """Replaces the window with one page of (filtered) transactions."""
+        if pid != self.pid or page_index == 0:
+            self.cursors = [None]
+            self.last_id = None
+        self.pid = pid
+        self.page_index = page_index
+        del self.cursors[page_index + 1:]
+        self.rows = list(transactions)
+        self.has_more = has_more
+        self.table.rows = [self._row(t) for t in self.rows]
+        if page_index == 0:
+            self._track(self.rows)
+        self._update_pager()
+        if page: page.update()
+
+    def prepend(self, transactions, page=None):
+        """Adds newer transactions to the first page, keeping the window at PAGE_SIZE rows."""
+        if not transactions: return
+        self._track(transactions)
+        self.rows = list(transactions) + self.rows
+        new_rows = [self._row(t) for t in transactions]
+        self.table.rows[:0] = new_rows
+        if len(self.rows) > self.PAGE_SIZE:
+            del self.rows[self.PAGE_SIZE:]
+            del self.table.rows[self.PAGE_SIZE:]
+            self.has_more = True
+        self._update_pager()
+        if page: page.update()
+
+class DiagnosticsPanel:
+    def __init__(self, controller):
+        self.controller = controller
+        self.enabled_switch = ft.Switch(label="Instrumentation", value=True, on_change=self.controller.handle_toggle_metrics)
+        self.spans_table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(h)) for h in ["Span", "Calls", "Avg ms", "Max ms", "Total ms", "Errors"]],
+            rows=[]
+        )
+        self.counters_text = ft.Text("", font_family="monospace", size=13)
+        self.content = ft.Column([
+            ft.Text("Diagnostics", size=28, weight="bold"),
+            ft.Text("Where refreshes and AI calls spend their time.", color="grey700"),
+            ft.Row([
+                self.enabled_switch,
+                ft.ElevatedButton("Refresh", icon="refresh", on_click=self.controller.handle_diagnostics_refresh),
+                ft.ElevatedButton("Export JSON", icon="download", on_click=lambda e: self.controller.handle_metrics_export("metrics.json")),
+                ft.ElevatedButton("Export Prometheus", icon="download", on_click=lambda e: self.controller.handle_metrics_export("metrics.prom")),
+                ft.TextButton("Reset", on_click=self.controller.handle_metrics_reset),
+            ]),
+            ft.Divider(),
+            ft.Container(content=ft.Column([self.spans_table, self.counters_text], scroll="always"), expand=True)
+        ], visible=False, expand=True)
+
+    def update_data(self, snapshot, page):
+        self.enabled_switch.value = snapshot["enabled"]
+        spans = sorted(snapshot["spans"].items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        self.spans_table.rows = [
+            ft.DataRow(cells=[ft.DataCell(ft.Text(name)), ft.DataCell(ft.Text(str(s["count"]))), ft.DataCell(ft.Text(f"{s['avg_ms']:.1f}")), ft.DataCell(ft.Text(f"{s['max_ms']:.1f}")), ft.DataCell(ft.Text(f"{s['total_ms']:.0f}")), ft.DataCell(ft.Text(str(s["errors"]), color="red" if s["errors"] else None))])
+            for name, s in spans
+        ]
+        lines = [f"{name}: {value}" for name, value in sorted(snapshot["counters"].items())]
+        for source, values in sorted(snapshot["gauges"].items()):
+            for key, value in sorted(values.items()):
+                lines.append(f"{source}.{key}: {value}")
+        self.counters_text.value = "\n".join(lines) or "No events recorded yet."
+        if page: page.update()
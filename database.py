@@ -1,18 +1,97 @@
+import json
+import logging
 import sqlite3
+import threading
 from datetime import datetime
 from models import Stock 
+from instrumentation import metrics, timed
+
+log = logging.getLogger(__name__)
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # קוראים לא נחסמים על ידי כותב
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",       # ~16MB
+    "PRAGMA mmap_size=268435456",     # 256MB
+    "PRAGMA temp_store=MEMORY",
+)
+
+# מיגרציות סכמה לפי PRAGMA user_version; גרסה N = MIGRATIONS[:N] הורצו
+MIGRATIONS = (
+    "CREATE INDEX IF NOT EXISTS idx_transactions_portfolio_ts ON transactions (portfolio_id, timestamp, id)",
+    "CREATE INDEX IF NOT EXISTS idx_stocks_portfolio ON stocks (portfolio_id)",
+    # כותרות חדשות שכבר נראו, לפי hash של הכותרת המנורמלת
+    """CREATE TABLE IF NOT EXISTS news_headlines (
+        symbol TEXT, title_hash TEXT, title TEXT, publisher TEXT, first_seen TEXT,
+        PRIMARY KEY (symbol, title_hash)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_transactions_portfolio_symbol_ts ON transactions (portfolio_id, symbol, timestamp, id)",
+    # ספר מנות (lots): כל קנייה היא מנה, מכירות צורכות מהוותיקה (FIFO)
+    """CREATE TABLE IF NOT EXISTS lots (
+        id INTEGER PRIMARY KEY, portfolio_id TEXT, symbol TEXT, transaction_id INTEGER,
+        timestamp TEXT, quantity INTEGER, remaining INTEGER, price REAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_lots_open ON lots (portfolio_id, symbol, timestamp, id) WHERE remaining > 0",
+    # סיכום רווח/הפסד ממומש ופתוח לכל סימבול, מתעדכן בכל עסקה
+    """CREATE TABLE IF NOT EXISTS pnl_summary (
+        portfolio_id TEXT, symbol TEXT,
+        sold_qty INTEGER DEFAULT 0, proceeds REAL DEFAULT 0,
+        fifo_cost REAL DEFAULT 0, avg_cost REAL DEFAULT 0,
+        open_qty INTEGER DEFAULT 0, open_cost REAL DEFAULT 0,
+        PRIMARY KEY (portfolio_id, symbol)
+    ) WITHOUT ROWID""",
+    lambda cursor: PortfolioDB._replay_ledger(cursor),
+    # (portfolio_id, rowid) - העסקה האחרונה של תיק בחיפוש אחד, עבור ETag
+    "CREATE INDEX IF NOT EXISTS idx_transactions_portfolio ON transactions (portfolio_id)",
+    # רשימות מעקב של המשתמש
+    """CREATE TABLE IF NOT EXISTS watchlists (
+        name TEXT, symbol TEXT, added TEXT,
+        PRIMARY KEY (name, symbol)
+    ) WITHOUT ROWID""",
+    # חוקי התראה: kind = price/change, direction = above/below; triggered_at מסמן התראה שכבר נורתה
+    """CREATE TABLE IF NOT EXISTS alert_rules (
+        id INTEGER PRIMARY KEY, symbol TEXT, kind TEXT, direction TEXT, threshold REAL,
+        created TEXT, triggered_at TEXT, triggered_value REAL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_alert_rules_active ON alert_rules (symbol) WHERE triggered_at IS NULL",
+)
+
+PNL_METHODS = ("fifo", "average")
+
 
 class PortfolioDB:
     def __init__(self, db_name="portfolio.db"):
         self.db_name = db_name
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
         self._create_tables()
 
     def _get_connection(self):
-        return sqlite3.connect(self.db_name)
+        """Long-lived connection per thread; `with` on it commits/rolls back without closing."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_name, timeout=10, cached_statements=256, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
 
     def _create_tables(self):
         with self._get_connection() as conn:
             cursor = conn.cursor()
+            # סכמה עדכנית - אין מה ליצור, חוסכים את זה בעליית האפליקציה
+            if cursor.execute('PRAGMA user_version').fetchone()[0] >= len(MIGRATIONS):
+                return
             # טבלת המניות הנוכחיות
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS stocks (
@@ -33,8 +112,119 @@ class PortfolioDB:
                     timestamp TEXT
                 )
             ''')
+            # נרות יומיים שמורים מקומית (OHLCV)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_history (
+                    symbol TEXT, date TEXT,
+                    open REAL, high REAL, low REAL, close REAL, volume INTEGER,
+                    PRIMARY KEY (symbol, date)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_history_meta (
+                    symbol TEXT PRIMARY KEY,
+                    covered_from TEXT,
+                    last_sync TEXT
+                )
+            ''')
+            self._migrate(cursor)
             conn.commit()
 
+    def _migrate(self, cursor):
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        for statement in MIGRATIONS[version:]:
+            if callable(statement):
+                statement(cursor)
+            else:
+                cursor.execute(statement)
+        if version < len(MIGRATIONS):
+            cursor.execute(f'PRAGMA user_version={len(MIGRATIONS)}')
+
+    # --- ספר המנות וסיכום הרווח ---
+    @staticmethod
+    def _add_lot(cursor, portfolio_id, symbol, transaction_id, quantity, price, timestamp):
+        cursor.execute('INSERT INTO lots (portfolio_id, symbol, transaction_id, timestamp, quantity, remaining, price) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (portfolio_id, symbol, transaction_id, timestamp, quantity, quantity, price))
+        PortfolioDB._bump_pnl(cursor, portfolio_id, symbol, open_qty=quantity, open_cost=quantity * price)
+
+    @staticmethod
+    def _consume_lots(cursor, portfolio_id, symbol, quantity):
+        """Takes `quantity` from the oldest open lots; returns (cost, shares no lot covered)."""
+        cursor.execute('SELECT id, remaining, price FROM lots WHERE portfolio_id=? AND symbol=? AND remaining>0 ORDER BY timestamp, id',
+                       (portfolio_id, symbol))
+        cost, left = 0.0, quantity
+        for lot_id, remaining, price in cursor.fetchall():
+            take = min(left, remaining)
+            cursor.execute('UPDATE lots SET remaining=? WHERE id=?', (remaining - take, lot_id))
+            cost += take * price
+            left -= take
+            if left == 0: break
+        return cost, left
+
+    @staticmethod
+    def _bump_pnl(cursor, portfolio_id, symbol, sold_qty=0, proceeds=0.0, fifo_cost=0.0, avg_cost=0.0, open_qty=0, open_cost=0.0):
+        cursor.execute('''
+            INSERT INTO pnl_summary VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (portfolio_id, symbol) DO UPDATE SET
+                sold_qty = sold_qty + excluded.sold_qty,
+                proceeds = proceeds + excluded.proceeds,
+                fifo_cost = fifo_cost + excluded.fifo_cost,
+                avg_cost = avg_cost + excluded.avg_cost,
+                open_qty = open_qty + excluded.open_qty,
+                open_cost = CASE WHEN open_qty + excluded.open_qty = 0 THEN 0 ELSE open_cost + excluded.open_cost END
+        ''', (portfolio_id, symbol, sold_qty, proceeds, fifo_cost, avg_cost, open_qty, open_cost))
+
+    @staticmethod
+    def _record_sell(cursor, portfolio_id, symbol, quantity, price, avg_price):
+        """Books a sale against the lots; returns realized P&L as (fifo, average).
+
+        Selling more than the open lots hold means the ledger and the positions
+        disagree: the gap is logged and its cost taken at `avg_price`.
+        """
+        lots_cost, short = PortfolioDB._consume_lots(cursor, portfolio_id, symbol, quantity)
+        if short:
+            metrics.count("db.lots.shortfall", short)
+            log.warning("Ledger gap: selling %d %s in portfolio %s but open lots hold only %d",
+                        quantity, symbol, portfolio_id, quantity - short)
+        fifo_cost = lots_cost + short * avg_price
+        avg_cost = quantity * avg_price
+        PortfolioDB._bump_pnl(cursor, portfolio_id, symbol, sold_qty=quantity, proceeds=quantity * price,
+                              fifo_cost=fifo_cost, avg_cost=avg_cost, open_qty=-(quantity - short), open_cost=-lots_cost)
+        return quantity * price - fifo_cost, quantity * price - avg_cost
+
+    @staticmethod
+    def _replay_ledger(cursor):
+        """Rebuilds lots and pnl_summary from the transactions table (one pass, in id order).
+
+        Shares held in `stocks` that the ledger does not account for (positions
+        older than the transaction history) get one opening lot first, at the
+        stored average cost and with an empty timestamp, so FIFO sells them first.
+        """
+        cursor.execute('DELETE FROM lots')
+        cursor.execute('DELETE FROM pnl_summary')
+        held = {}  # (portfolio_id, symbol) -> [quantity, average price]
+        cursor.execute('''
+            SELECT s.portfolio_id, s.symbol, s.quantity - COALESCE(SUM(CASE t.type WHEN 'BUY' THEN t.quantity ELSE -t.quantity END), 0), s.price
+            FROM stocks s LEFT JOIN transactions t ON t.portfolio_id = s.portfolio_id AND t.symbol = s.symbol
+            GROUP BY s.portfolio_id, s.symbol
+        ''')
+        for pid, symbol, untracked, price in cursor.fetchall():
+            if untracked > 0:
+                PortfolioDB._add_lot(cursor, pid, symbol, None, untracked, price, "")
+                held[(pid, symbol)] = [untracked, price]
+        rows = cursor.execute('SELECT id, portfolio_id, symbol, type, quantity, price, timestamp FROM transactions ORDER BY id').fetchall()
+        for txn_id, pid, symbol, kind, qty, price, ts in rows:
+            pos = held.setdefault((pid, symbol), [0, 0.0])
+            if kind == "BUY":
+                PortfolioDB._add_lot(cursor, pid, symbol, txn_id, qty, price, ts)
+                if pos[0] + qty > 0:
+                    pos[1] = (pos[0] * pos[1] + qty * price) / (pos[0] + qty)
+                pos[0] += qty
+            else:
+                PortfolioDB._record_sell(cursor, pid, symbol, qty, price, pos[1])
+                pos[0] -= qty
+
+    @timed("db.add_or_update_stock")
     def add_or_update_stock(self, stock, portfolio_id):
         with self._get_connection() as conn:
             cursor = conn.cursor()
@@ -42,6 +232,7 @@ class PortfolioDB:
             now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             cursor.execute('INSERT INTO transactions (portfolio_id, symbol, type, quantity, price, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
                          (portfolio_id, stock.symbol, "BUY", stock.quantity, stock.price, now))
+            self._add_lot(cursor, portfolio_id, stock.symbol, cursor.lastrowid, stock.quantity, stock.price, now)
             
             # עדכון המצב הקיים
             cursor.execute('SELECT * FROM stocks WHERE symbol=? AND portfolio_id=?', (stock.symbol, portfolio_id))
@@ -56,6 +247,7 @@ class PortfolioDB:
                              (stock.symbol, portfolio_id, stock.name, stock.price, stock.quantity))
             conn.commit()
 
+    @timed("db.get_all_stocks")
     def get_all_stocks(self, portfolio_id):
         stocks = []
         with self._get_connection() as conn:
@@ -65,28 +257,119 @@ class PortfolioDB:
                 stocks.append(Stock(row[0], row[2], row[3], row[4]))
         return stocks
 
-    def get_transactions(self, portfolio_id):
-        """שליפת כל היסטוריית העסקאות של התיק"""
+    @timed("db.get_position_set")
+    def get_position_set(self, portfolio_id):
+        """Same positions as get_all_stocks, filled straight into a columnar PositionSet."""
+        from positions import PositionSet  # numpy נטען רק כשבאמת צריך את הייצוג העמודתי
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT symbol, price, quantity FROM stocks WHERE portfolio_id=?', (portfolio_id,))
+            return PositionSet.from_rows(cursor.fetchall())
+
+    @staticmethod
+    def _transaction_filter(portfolio_id, symbol=None, kind=None, start=None, end=None):
+        """WHERE clause for the ledger filters; `start`/`end` are inclusive YYYY-MM-DD dates."""
+        where, params = ['portfolio_id=?'], [portfolio_id]
+        if symbol:
+            where.append('symbol=?')
+            params.append(symbol.upper())
+        if kind:
+            where.append('type=?')
+            params.append(kind.upper())
+        if start:
+            where.append('timestamp>=?')
+            params.append(start)
+        if end:
+            where.append("timestamp<date(?, '+1 day')")
+            params.append(end)
+        return ' AND '.join(where), params
+
+    @timed("db.get_transactions")
+    def get_transactions(self, portfolio_id, after=None, limit=None, **filters):
+        """שליפת היסטוריית העסקאות של התיק, מהחדשה לישנה.
+
+        Rows are (symbol, type, quantity, price, timestamp, id). Pass the
+        (timestamp, id) of the last row seen as `after` to get the next page.
+        `filters` are symbol, kind ("BUY"/"SELL"), start and end dates.
+        """
+        where, params = self._transaction_filter(portfolio_id, **filters)
+        sql = f'SELECT symbol, type, quantity, price, timestamp, id FROM transactions WHERE {where}'
+        if after is not None:
+            sql += ' AND (timestamp, id) < (?, ?)'
+            params.extend(after)
+        sql += ' ORDER BY timestamp DESC, id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    @timed("db.get_transactions_since")
+    def get_transactions_since(self, portfolio_id, last_id, **filters):
+        """Only the transactions recorded after id `last_id`, newest first."""
+        where, params = self._transaction_filter(portfolio_id, **filters)
         with self._get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT symbol, type, quantity, price, timestamp FROM transactions WHERE portfolio_id=? ORDER BY timestamp DESC', (portfolio_id,))
+            cursor.execute(f'SELECT symbol, type, quantity, price, timestamp, id FROM transactions WHERE {where} AND id>? ORDER BY timestamp DESC, id DESC',
+                           (*params, last_id))
             return cursor.fetchall()
 
-    def delete_stock(self, symbol, portfolio_id, qty_to_remove=None):
+    @timed("db.get_transaction_totals")
+    def get_transaction_totals(self, portfolio_id, **filters):
+        """Aggregates for the filtered ledger: (count, buy_qty, buy_value, sell_qty, sell_value)."""
+        where, params = self._transaction_filter(portfolio_id, **filters)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT COUNT(*),
+                       COALESCE(SUM(CASE WHEN type='BUY' THEN quantity END), 0),
+                       COALESCE(SUM(CASE WHEN type='BUY' THEN quantity * price END), 0),
+                       COALESCE(SUM(CASE WHEN type='SELL' THEN quantity END), 0),
+                       COALESCE(SUM(CASE WHEN type='SELL' THEN quantity * price END), 0)
+                FROM transactions WHERE {where}
+            ''', params)
+            return cursor.fetchone()
+
+    @timed("db.get_portfolio_version")
+    def get_portfolio_version(self, portfolio_id):
+        """Id of the portfolio's latest transaction (0 if none); changes with every trade or import."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(id) FROM transactions WHERE portfolio_id=?', (portfolio_id,))
+            return cursor.fetchone()[0] or 0
+
+    @timed("db.get_transaction_symbols")
+    def get_transaction_symbols(self, portfolio_id):
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT DISTINCT symbol FROM transactions WHERE portfolio_id=? ORDER BY symbol', (portfolio_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    @timed("db.delete_stock")
+    def delete_stock(self, symbol, portfolio_id, qty_to_remove=None, price=None):
+        """Sells `qty_to_remove` shares (all if None) at `price`, the market price.
+
+        Without a price the sale is booked at the stored average cost. Returns
+        (quantity, price, realized_fifo, realized_average), or None if not held.
+        """
         with self._get_connection() as conn:
             cursor = conn.cursor()
             now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             
             cursor.execute('SELECT quantity, price FROM stocks WHERE symbol=? AND portfolio_id=?', (symbol, portfolio_id))
             row = cursor.fetchone()
-            if not row: return False
+            if not row: return None
             
             current_qty, current_price = row
             actual_remove = qty_to_remove if qty_to_remove and qty_to_remove < current_qty else current_qty
+            sell_price = current_price if price is None else price
             
             # רישום המכירה בהיסטוריה
             cursor.execute('INSERT INTO transactions (portfolio_id, symbol, type, quantity, price, timestamp) VALUES (?, ?, ?, ?, ?, ?)',
-                         (portfolio_id, symbol, "SELL", actual_remove, current_price, now))
+                         (portfolio_id, symbol, "SELL", actual_remove, sell_price, now))
+            realized = self._record_sell(cursor, portfolio_id, symbol, actual_remove, sell_price, current_price)
             
             if actual_remove >= current_qty:
                 cursor.execute('DELETE FROM stocks WHERE symbol=? AND portfolio_id=?', (symbol, portfolio_id))
@@ -94,4 +377,277 @@ class PortfolioDB:
                 cursor.execute('UPDATE stocks SET quantity=? WHERE symbol=? AND portfolio_id=?', (current_qty - actual_remove, symbol, portfolio_id))
             
             conn.commit()
-            return True
\ No newline at end of file
+            return (actual_remove, sell_price, *realized)
+
+    @timed("db.get_pnl_summary")
+    def get_pnl_summary(self, portfolio_id, symbol=None, method="fifo"):
+        """Realized P&L from the materialized summary: (sold_qty, proceeds, cost, realized, open_qty, open_cost).
+
+        `method` is "fifo" or "average"; open_cost is always the FIFO cost of the open lots.
+        """
+        if method not in PNL_METHODS:
+            raise ValueError(f"Unknown P&L method {method!r}")
+        cost = "fifo_cost" if method == "fifo" else "avg_cost"
+        where, params = 'portfolio_id=?', [portfolio_id]
+        if symbol:
+            where += ' AND symbol=?'
+            params.append(symbol.upper())
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT COALESCE(SUM(sold_qty), 0), COALESCE(SUM(proceeds), 0), COALESCE(SUM({cost}), 0),
+                       COALESCE(SUM(proceeds - {cost}), 0), COALESCE(SUM(open_qty), 0), COALESCE(SUM(open_cost), 0)
+                FROM pnl_summary WHERE {where}
+            ''', params)
+            return cursor.fetchone()
+
+    @timed("db.get_open_lots")
+    def get_open_lots(self, portfolio_id, symbol):
+        """Open lots oldest first: (timestamp, quantity, remaining, price)."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT timestamp, quantity, remaining, price FROM lots WHERE portfolio_id=? AND symbol=? AND remaining>0 ORDER BY timestamp, id',
+                           (portfolio_id, symbol.upper()))
+            return cursor.fetchall()
+
+    def rebuild_ledger(self):
+        """Recomputes lots and P&L from the full transaction history."""
+        with self._get_connection() as conn:
+            self._replay_ledger(conn.cursor())
+            conn.commit()
+
+    @timed("db.save_price_bars")
+    def save_price_bars(self, symbol, bars, covered_from=None):
+        """שמירת נרות יומיים (date, open, high, low, close, volume) ועדכון מצב הסנכרון"""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('INSERT OR REPLACE INTO price_history VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               [(symbol, *bar) for bar in bars])
+            if covered_from is None:
+                cursor.execute('UPDATE price_history_meta SET last_sync=? WHERE symbol=?', (now, symbol))
+            else:
+                cursor.execute('INSERT OR REPLACE INTO price_history_meta VALUES (?, ?, ?)', (symbol, covered_from, now))
+            conn.commit()
+
+    @timed("db.get_price_history_meta")
+    def get_price_history_meta(self, symbol):
+        """Returns (covered_from, last_sync, last_bar_date) or None if never synced."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT covered_from, last_sync FROM price_history_meta WHERE symbol=?', (symbol,))
+            row = cursor.fetchone()
+            if not row: return None
+            cursor.execute('SELECT MAX(date) FROM price_history WHERE symbol=?', (symbol,))
+            return row[0], row[1], cursor.fetchone()[0]
+
+    @timed("db.get_price_bars")
+    def get_price_bars(self, symbol, start_date=None, end_date=None):
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT date, open, high, low, close, volume FROM price_history WHERE symbol=? AND date>=? AND date<=? ORDER BY date',
+                           (symbol, start_date or "", end_date or "9999-12-31"))
+            return cursor.fetchall()
+
+    @timed("db.get_price_bars_many")
+    def get_price_bars_many(self, symbols, start_date=None, end_date=None):
+        """{symbol: bars} for many symbols in one query; symbols without bars map to []."""
+        bars = {s: [] for s in symbols}
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT symbol, date, open, high, low, close, volume FROM price_history '
+                           'WHERE symbol IN (SELECT value FROM json_each(?)) AND date>=? AND date<=? ORDER BY symbol, date',
+                           (json.dumps(list(bars)), start_date or "", end_date or "9999-12-31"))
+            for row in cursor.fetchall():
+                bars[row[0]].append(row[1:])
+        return bars
+
+    @timed("db.get_ledger")
+    def get_ledger(self, portfolio_ids=None):
+        """All transactions of the given portfolios (None = all), oldest first:
+        (portfolio_id, symbol, type, quantity, price, timestamp)."""
+        where, params = self._portfolio_filter(portfolio_ids)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT portfolio_id, symbol, type, quantity, price, timestamp FROM transactions WHERE {where} ORDER BY id', params)
+            return cursor.fetchall()
+
+    @timed("db.import_fills")
+    def import_fills(self, fills):
+        """ייבוא מרוכז של קניות: (portfolio_id, symbol, name, quantity, price, timestamp).
+
+        All fills go in one transaction. Positions are merged set-based with the
+        same weighted-average rule as Stock.__add__, and each fill opens a lot.
+        Returns the number of fills.
+        """
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('CREATE TEMP TABLE IF NOT EXISTS import_fills (portfolio_id TEXT, symbol TEXT, name TEXT, quantity INTEGER, price REAL, timestamp TEXT)')
+            cursor.execute('DELETE FROM import_fills')
+            cursor.executemany('INSERT INTO import_fills VALUES (?, ?, ?, ?, ?, ?)', fills)
+            count = cursor.execute('SELECT COUNT(*) FROM import_fills').fetchone()[0]
+            last_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM transactions').fetchone()[0]
+
+            cursor.execute('''
+                INSERT INTO transactions (portfolio_id, symbol, type, quantity, price, timestamp)
+                SELECT portfolio_id, symbol, 'BUY', quantity, price, timestamp FROM import_fills ORDER BY timestamp
+            ''')
+            cursor.execute('''
+                INSERT INTO lots (portfolio_id, symbol, transaction_id, timestamp, quantity, remaining, price)
+                SELECT portfolio_id, symbol, id, timestamp, quantity, quantity, price FROM transactions WHERE id > ?
+            ''', (last_id,))
+            cursor.execute('''
+                INSERT INTO pnl_summary (portfolio_id, symbol, open_qty, open_cost)
+                SELECT portfolio_id, symbol, SUM(quantity), SUM(quantity * price)
+                FROM import_fills WHERE true GROUP BY portfolio_id, symbol
+                ON CONFLICT (portfolio_id, symbol) DO UPDATE SET
+                    open_qty = pnl_summary.open_qty + excluded.open_qty,
+                    open_cost = pnl_summary.open_cost + excluded.open_cost
+            ''')
+            cursor.execute('''
+                INSERT INTO stocks (symbol, portfolio_id, name, price, quantity)
+                SELECT symbol, portfolio_id, MAX(name), SUM(price * quantity) / SUM(quantity), SUM(quantity)
+                FROM import_fills WHERE true GROUP BY symbol, portfolio_id
+                ON CONFLICT (symbol, portfolio_id) DO UPDATE SET
+                    price = (stocks.price * stocks.quantity + excluded.price * excluded.quantity) / (stocks.quantity + excluded.quantity),
+                    quantity = stocks.quantity + excluded.quantity
+            ''')
+            cursor.execute('DELETE FROM import_fills')
+            conn.commit()
+        return count
+
+    @timed("db.record_headlines")
+    def record_headlines(self, symbol, items):
+        """items: [(title_hash, title, publisher)]. Stores unseen ones and returns their hashes."""
+        if not items: return set()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            placeholders = ", ".join("?" for _ in items)
+            cursor.execute(f'SELECT title_hash FROM news_headlines WHERE symbol=? AND title_hash IN ({placeholders})',
+                           (symbol, *(item[0] for item in items)))
+            seen = {row[0] for row in cursor.fetchall()}
+            new_items = [item for item in items if item[0] not in seen]
+            cursor.executemany('INSERT OR IGNORE INTO news_headlines VALUES (?, ?, ?, ?, ?)',
+                               [(symbol, h, title, publisher, now) for h, title, publisher in new_items])
+            conn.commit()
+        return {item[0] for item in new_items}
+
+    # --- רשימות מעקב והתראות מחיר ---
+    @timed("db.get_watchlists")
+    def get_watchlists(self):
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT DISTINCT name FROM watchlists ORDER BY name')
+            return [row[0] for row in cursor.fetchall()]
+
+    @timed("db.get_watchlist")
+    def get_watchlist(self, name):
+        """Symbols of watchlist `name` in the order they were added (empty if it does not exist)."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT symbol FROM watchlists WHERE name=? ORDER BY added, symbol', (name,))
+            return [row[0] for row in cursor.fetchall()]
+
+    @timed("db.add_to_watchlist")
+    def add_to_watchlist(self, name, symbols):
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._get_connection() as conn:
+            conn.executemany('INSERT OR IGNORE INTO watchlists VALUES (?, ?, ?)',
+                             [(name, s.upper(), now) for s in symbols])
+            conn.commit()
+
+    @timed("db.remove_from_watchlist")
+    def remove_from_watchlist(self, name, symbol):
+        with self._get_connection() as conn:
+            conn.execute('DELETE FROM watchlists WHERE name=? AND symbol=?', (name, symbol.upper()))
+            conn.commit()
+
+    @timed("db.add_alert")
+    def add_alert(self, symbol, kind, direction, threshold):
+        """Stores an active alert rule and returns its id."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('INSERT INTO alert_rules (symbol, kind, direction, threshold, created) VALUES (?, ?, ?, ?, ?)',
+                           (symbol.upper(), kind, direction, float(threshold), now))
+            conn.commit()
+            return cursor.lastrowid
+
+    @timed("db.get_alerts")
+    def get_alerts(self):
+        """Active (not yet triggered) rules: (id, symbol, kind, direction, threshold)."""
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id, symbol, kind, direction, threshold FROM alert_rules WHERE triggered_at IS NULL ORDER BY id')
+            return cursor.fetchall()
+
+    @timed("db.mark_alerts_triggered")
+    def mark_alerts_triggered(self, fired):
+        """fired: [(rule_id, value)]. Triggered rules stay in the table but are no longer active."""
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._get_connection() as conn:
+            conn.executemany('UPDATE alert_rules SET triggered_at=?, triggered_value=? WHERE id=?',
+                             [(now, value, rule_id) for rule_id, value in fired])
+            conn.commit()
+
+    @timed("db.delete_alert")
+    def delete_alert(self, rule_id):
+        with self._get_connection() as conn:
+            conn.execute('DELETE FROM alert_rules WHERE id=?', (rule_id,))
+            conn.commit()
+
+    # --- תצוגה מאוחדת של כמה תיקים ---
+    @staticmethod
+    def _portfolio_filter(portfolio_ids, column="portfolio_id"):
+        """WHERE fragment for a set of portfolios as one JSON parameter (None = all)."""
+        if portfolio_ids is None:
+            return "1=1", ()
+        return f"{column} IN (SELECT value FROM json_each(?))", (json.dumps([str(p) for p in portfolio_ids]),)
+
+    @timed("db.get_portfolio_ids")
+    def get_portfolio_ids(self):
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT DISTINCT portfolio_id FROM stocks ORDER BY portfolio_id')
+            return [row[0] for row in cursor.fetchall()]
+
+    @timed("db.get_consolidated_positions")
+    def get_consolidated_positions(self, portfolio_ids=None):
+        """Positions summed per symbol across portfolios, with a weighted-average cost.
+
+        Rows are (Stock, portfolio_count).
+        """
+        where, params = self._portfolio_filter(portfolio_ids)
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT symbol, MAX(name), SUM(price * quantity) / SUM(quantity), SUM(quantity), COUNT(*)
+                FROM stocks WHERE {where} GROUP BY symbol HAVING SUM(quantity) > 0 ORDER BY symbol
+            ''', params)
+            return [(Stock(row[0], row[1], row[2], row[3]), row[4]) for row in cursor.fetchall()]
+
+    @timed("db.get_portfolio_valuations")
+    def get_portfolio_valuations(self, live_prices, portfolio_ids=None):
+        """Per-portfolio (portfolio_id, positions, cost, market_value) in one grouped query.
+
+        Live prices are joined in from a temp table; symbols without one are
+        valued at their stored average cost.
+        """
+        where, params = self._portfolio_filter(portfolio_ids, "s.portfolio_id")
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('CREATE TEMP TABLE IF NOT EXISTS live_quotes (symbol TEXT PRIMARY KEY, price REAL)')
+            cursor.execute('DELETE FROM live_quotes')
+            cursor.executemany('INSERT OR REPLACE INTO live_quotes VALUES (?, ?)',
+                               [(sym, price) for sym, price in live_prices.items() if price is not None])
+            cursor.execute(f'''
+                SELECT s.portfolio_id, COUNT(*), SUM(s.price * s.quantity),
+                       SUM(COALESCE(q.price, s.price) * s.quantity)
+                FROM stocks s LEFT JOIN live_quotes q ON q.symbol = s.symbol
+                WHERE {where} GROUP BY s.portfolio_id ORDER BY s.portfolio_id
+            ''', params)
+            rows = cursor.fetchall()
+            cursor.execute('DELETE FROM live_quotes')
+            conn.commit()
+            return rows
@@ -0,0 +1,70 @@
+"""Bulk import of broker fills into PortfolioDB, without the Flet UI.
+
+    python importer.py fills.csv [--db portfolio.db] [--portfolio ID]
+
+CSV needs a header row; JSONL needs one object per line. Fields: portfolio_id
+(or --portfolio), symbol, quantity, price, and optional timestamp, name, type.
+Only BUY fills are supported.
+"""
+import argparse
+import csv
+import json
+import time
+from datetime import datetime
+from database import PortfolioDB
+
+
+def _rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def read_fills(path, portfolio_id=None):
+    """Yields (portfolio_id, symbol, name, quantity, price, timestamp) tuples."""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for line_no, row in enumerate(_rows(path), start=1):
+        kind = str(row.get("type") or "BUY").upper()
+        if kind != "BUY":
+            raise ValueError(f"{path}:{line_no}: unsupported fill type {kind!r}")
+        pid = portfolio_id or row.get("portfolio_id")
+        if not pid:
+            raise ValueError(f"{path}:{line_no}: missing portfolio_id")
+        symbol = str(row["symbol"]).upper()
+        quantity = int(row["quantity"])
+        if quantity <= 0:
+            raise ValueError(f"{path}:{line_no}: quantity must be positive")
+        yield (str(pid), symbol, row.get("name") or symbol, quantity,
+               float(row["price"]), row.get("timestamp") or now)
+
+
+def import_file(db, path, portfolio_id=None):
+    """Imports one file; returns (fill_count, seconds)."""
+    start = time.perf_counter()
+    count = db.import_fills(read_fills(path, portfolio_id))
+    return count, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import BUY fills into the portfolio database.")
+    parser.add_argument("paths", nargs="+", help="CSV or JSONL files")
+    parser.add_argument("--db", default="portfolio.db")
+    parser.add_argument("--portfolio", help="portfolio ID for files without a portfolio_id column")
+    args = parser.parse_args(argv)
+
+    db = PortfolioDB(args.db)
+    try:
+        for path in args.paths:
+            count, elapsed = import_file(db, path, args.portfolio)
+            rate = count / elapsed if elapsed > 0 else float("inf")
+            print(f"{path}: {count} fills in {elapsed:.3f}s ({rate:,.0f} fills/s)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
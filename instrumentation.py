@@ -0,0 +1,136 @@
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Process-wide timing spans and counters.
+
+    When `enabled` is False, `timed` wrappers and `span` do a single flag check
+    and call straight through.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._spans = {}     # name -> [count, total_s, max_s, errors]
+        self._counters = {}
+        self._gauges = {}    # name -> callable returning {key: number}
+
+    def record(self, name, elapsed, error=False):
+        with self._lock:
+            stat = self._spans.get(name)
+            if stat is None:
+                stat = self._spans[name] = [0, 0.0, 0.0, 0]
+            stat[0] += 1
+            stat[1] += elapsed
+            if elapsed > stat[2]: stat[2] = elapsed
+            if error: stat[3] += 1
+
+    def count(self, name, n=1):
+        if not self.enabled: return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def register_gauges(self, name, fn):
+        """`fn()` is polled at export time, e.g. a cache's stats()."""
+        self._gauges[name] = fn
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, error)
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        with self._lock:
+            spans = {name: {"count": c, "total_ms": t * 1000, "avg_ms": (t / c) * 1000 if c else 0.0,
+                            "max_ms": m * 1000, "errors": e}
+                     for name, (c, t, m, e) in self._spans.items()}
+            counters = dict(self._counters)
+        gauges = {}
+        for name, fn in list(self._gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception:
+                continue
+        return {"enabled": self.enabled, "spans": spans, "counters": counters, "gauges": gauges}
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), indent=indent, sort_keys=True)
+
+    def to_prometheus(self, prefix="portfolio"):
+        snap = self.snapshot()
+        lines = [f"# TYPE {prefix}_span_seconds summary"]
+        for name, s in sorted(snap["spans"].items()):
+            label = f'{{span="{name}"}}'
+            lines.append(f"{prefix}_span_seconds_count{label} {s['count']}")
+            lines.append(f"{prefix}_span_seconds_sum{label} {s['total_ms'] / 1000:.6f}")
+            lines.append(f"{prefix}_span_seconds_max{label} {s['max_ms'] / 1000:.6f}")
+            lines.append(f"{prefix}_span_errors_total{label} {s['errors']}")
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+        lines.append(f"# TYPE {prefix}_gauge gauge")
+        for name, values in sorted(snap["gauges"].items()):
+            for key, value in sorted(_flatten(values).items()):
+                lines.append(f'{prefix}_gauge{{source="{name}",key="{key}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes a Prometheus text file for *.prom/*.txt paths, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+
+def _flatten(values, prefix=""):
+    flat = {}
+    for key, value in values.items():
+        full = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, full + "."))
+        elif isinstance(value, (int, float)):
+            flat[re.sub(r'["\\]', "_", full)] = value
+    return flat
+
+
+metrics = Metrics(enabled=os.environ.get("PORTFOLIO_METRICS", "1") != "0")
+
+
+def timed(name):
+    """Decorator: records a `metrics` span named `name` around each call."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            error = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                metrics.record(name, time.perf_counter() - start, error)
+        return wrapper
+    return decorate
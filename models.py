@@ -1,5 +1,6 @@
 class Asset:
     """Base class for financial assets."""
+    __slots__ = ("_symbol", "name")
     def __init__(self, symbol: str, name: str):
         self._symbol = symbol.upper()
         self.name = name
@@ -9,10 +10,12 @@ class Asset:
 
 class Tradable:
     """Mixin for exchange trading."""
+    __slots__ = ()
     def get_trading_market(self): return "US Stock Exchange"
 
 class Stock(Asset, Tradable):
     """Stock entity with support for quantity and price averaging."""
+    __slots__ = ("price", "quantity")
     def __init__(self, symbol: str, name: str, price: float, quantity: int):
         super().__init__(symbol, name)
         self.price = float(price)
@@ -0,0 +1,86 @@
+class Position:
+    """One holding with its latest live price; value and P/L are derived on demand."""
+    __slots__ = ("symbol", "name", "avg_cost", "quantity", "live_price")
+
+    def __init__(self, symbol, name, avg_cost, quantity, live_price):
+        self.symbol = symbol
+        self.name = name
+        self.avg_cost = avg_cost
+        self.quantity = quantity
+        self.live_price = live_price
+
+    @property
+    def value(self): return self.live_price * self.quantity
+
+    @property
+    def pl_pct(self): return ((self.live_price / self.avg_cost) - 1) * 100 if self.avg_cost > 0 else 0
+
+    def key(self): return (self.name, self.avg_cost, self.quantity, self.live_price)
+
+
+class PortfolioDiff:
+    def __init__(self):
+        self.added = []
+        self.updated = []
+        self.removed = []
+
+    def __bool__(self): return bool(self.added or self.updated or self.removed)
+
+
+class PortfolioState:
+    """Running aggregates over the loaded portfolio.
+
+    `sync` and `apply_prices` adjust the total value by deltas and report
+    only the positions that actually changed.
+    """
+    def __init__(self):
+        self.positions = {}
+        self.total_value = 0.0
+
+    def reset(self):
+        self.positions = {}
+        self.total_value = 0.0
+
+    def weight(self, symbol):
+        pos = self.positions[symbol]
+        return (pos.value / self.total_value) * 100 if self.total_value > 0 else 0.0
+
+    def _upsert(self, symbol, name, avg_cost, quantity, live_price, diff):
+        pos = self.positions.get(symbol)
+        if pos is None:
+            pos = self.positions[symbol] = Position(symbol, name, avg_cost, quantity, live_price)
+            self.total_value += pos.value
+            diff.added.append(symbol)
+            return
+        before = pos.key()
+        old_value = pos.value
+        pos.name, pos.avg_cost, pos.quantity, pos.live_price = name, avg_cost, quantity, live_price
+        if pos.key() != before:
+            self.total_value += pos.value - old_value
+            diff.updated.append(symbol)
+
+    def sync(self, stocks, live_prices=None):
+        """Brings the state in line with the stored positions (full list of Stock)."""
+        if live_prices is None: live_prices = {}
+        diff = PortfolioDiff()
+        seen = set()
+        for s in stocks:
+            seen.add(s.symbol)
+            self._upsert(s.symbol, s.name, s.price, s.quantity, live_prices.get(s.symbol, s.price), diff)
+        for symbol in [sym for sym in self.positions if sym not in seen]:
+            self.total_value -= self.positions.pop(symbol).value
+            diff.removed.append(symbol)
+        # סנכרון מלא מחשב את הסכום מחדש כדי שלא יצטברו שגיאות עיגול
+        self.total_value = sum(pos.value for pos in self.positions.values())
+        return diff
+
+    def apply_prices(self, live_prices):
+        """Applies price ticks only; symbols not held are ignored."""
+        diff = PortfolioDiff()
+        for symbol, price in live_prices.items():
+            pos = self.positions.get(symbol)
+            if pos is not None and price is not None and price != pos.live_price:
+                self.total_value += (price - pos.live_price) * pos.quantity
+                pos.live_price = price
+                diff.updated.append(symbol)
+        return diff
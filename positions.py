@@ -0,0 +1,67 @@
+import numpy as np
+from models import Stock
+
+
+def position_dtype(symbol_width=1):
+    """(symbol, price, quantity); the symbol field is as wide as the longest symbol stored."""
+    return np.dtype([("symbol", f"U{max(symbol_width, 1)}"), ("price", "f8"), ("quantity", "i8")])
+
+
+class PositionSet:
+    """Columnar set of positions (structured array of symbol, price, quantity).
+
+    Valuation and merging run vectorized instead of per Stock object.
+    """
+    __slots__ = ("data",)
+    def __init__(self, data=None):
+        self.data = np.empty(0, dtype=position_dtype()) if data is None else data
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds the set straight from (symbol, price, quantity) cursor rows."""
+        rows = rows if isinstance(rows, list) else list(rows)
+        width = max((len(row[0]) for row in rows), default=1)
+        return cls(np.array(rows, dtype=position_dtype(width)))
+
+    @classmethod
+    def from_stocks(cls, stocks):
+        return cls.from_rows([(s.symbol, s.price, s.quantity) for s in stocks])
+
+    def __len__(self): return len(self.data)
+
+    @property
+    def symbols(self): return self.data["symbol"]
+
+    def values(self, live_prices=None):
+        """Value per position, using live prices where given (dict or array)."""
+        prices = self.data["price"]
+        if isinstance(live_prices, dict):
+            prices = np.array([live_prices.get(sym, p) for sym, p in zip(self.data["symbol"].tolist(), prices.tolist())])
+        elif live_prices is not None:
+            prices = np.asarray(live_prices, dtype=float)
+        return prices * self.data["quantity"]
+
+    def calculate_value(self, live_prices=None): return float(self.values(live_prices).sum())
+
+    def merge(self, other=None):
+        """Collapses duplicate symbols (of self + other) with the Stock.__add__ weighted average."""
+        parts = [self.data] if other is None else [self.data, other.data]
+        # עמודה-עמודה: רוחב הסימבול של שני הצדדים יכול להיות שונה
+        symbols, inverse = np.unique(np.concatenate([p["symbol"] for p in parts]), return_inverse=True)
+        price = np.concatenate([p["price"] for p in parts])
+        held = np.concatenate([p["quantity"] for p in parts])
+        quantity = np.bincount(inverse, weights=held, minlength=len(symbols))
+        cost = np.bincount(inverse, weights=price * held, minlength=len(symbols))
+        merged = np.empty(len(symbols), dtype=position_dtype(symbols.dtype.itemsize // 4))
+        merged["symbol"] = symbols
+        merged["quantity"] = quantity
+        merged["price"] = np.divide(cost, quantity, out=np.zeros_like(cost), where=quantity != 0)
+        return PositionSet(merged)
+
+    def __add__(self, other):
+        return self.merge(other) if isinstance(other, PositionSet) else self
+
+    def to_stocks(self, names=None):
+        names = names or {}
+        return [Stock(sym, names.get(sym, sym), price, qty)
+                for sym, price, qty in zip(self.data["symbol"].tolist(), self.data["price"].tolist(), self.data["quantity"].tolist())]
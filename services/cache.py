@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Concurrent `get_or_load` calls for the same key share a single loader call.
+    """
+    def __init__(self, ttl: float, max_size: int = 256):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _lookup(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def get_or_load(self, key, loader, cache_if=lambda value: True):
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            waiter = self._inflight.get(key)
+            if waiter is None:
+                self.misses += 1
+                waiter = self._inflight[key] = [threading.Event(), None, None]
+                owner = True
+            else:
+                self.coalesced += 1
+                owner = False
+
+        event = waiter[0]
+        if not owner:
+            event.wait()
+            if waiter[2] is not None:
+                raise waiter[2]
+            return waiter[1]
+
+        try:
+            value = loader()
+            waiter[1] = value
+            if cache_if(value):
+                self.set(key, value)
+            return value
+        except Exception as e:
+            waiter[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def get_or_load_many(self, keys, loader, cache_if=lambda value: True):
+        """Batch get_or_load: `loader(keys)` gets only the keys no other call is already loading.
+
+        It returns {key: value}; keys it leaves out load as None. Keys in flight
+        elsewhere (single or batch) wait for that load instead of loading again.
+        """
+        results, owned, waiting = {}, {}, {}
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    results[key] = value
+                elif key in self._inflight:
+                    self.coalesced += 1
+                    waiting[key] = self._inflight[key]
+                else:
+                    self.misses += 1
+                    owned[key] = self._inflight[key] = [threading.Event(), None, None]
+
+        if owned:
+            try:
+                loaded = loader(list(owned))
+                for key, waiter in owned.items():
+                    waiter[1] = results[key] = loaded.get(key)
+                    if cache_if(waiter[1]):
+                        self.set(key, waiter[1])
+            except Exception as e:
+                for waiter in owned.values():
+                    waiter[2] = e
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        self._inflight.pop(key, None)
+                for waiter in owned.values():
+                    waiter[0].set()
+
+        # רק אחרי שהטעינה שלנו הסתיימה מחכים לאחרות, כך ששתי קריאות לא ממתינות זו לזו
+        for key, waiter in waiting.items():
+            waiter[0].wait()
+            if waiter[2] is not None:
+                raise waiter[2]
+            results[key] = waiter[1]
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits,
+                    "misses": self.misses, "coalesced": self.coalesced}
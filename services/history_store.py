@@ -0,0 +1,87 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from instrumentation import metrics, timed
+
+# מספר הימים שכל טווח מכסה; None = כל ההיסטוריה
+PERIOD_DAYS = {"1mo": 31, "6mo": 183, "1y": 366, "5y": 5 * 366, "max": None}
+FULL_HISTORY = "0000-00-00"
+
+
+class PriceHistoryStore:
+    """Daily bars kept in PortfolioDB, topped up incrementally from MarketService.
+
+    `now` returns the current datetime; a replay passes its simulated clock so
+    periods end at the replay date instead of today.
+    """
+    def __init__(self, db, market, resync_after=timedelta(minutes=15), now=None):
+        self.db = db
+        self.market = market
+        self.resync_after = resync_after
+        self.now = now
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._pool = None
+
+    def _symbol_lock(self, symbol):
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _start_date(self, period):
+        days = PERIOD_DAYS[period]
+        if days is None:
+            return FULL_HISTORY
+        return ((self.now or datetime.now)() - timedelta(days=days)).strftime("%Y-%m-%d")
+
+    @timed("history.sync")
+    def sync(self, symbol: str, period: str = "1mo"):
+        """Downloads only the bars missing locally for `period`."""
+        symbol = symbol.upper()
+        start = self._start_date(period)
+        with self._symbol_lock(symbol):
+            meta = self.db.get_price_history_meta(symbol)
+            if meta is None or start < meta[0]:
+                # הטווח המבוקש ארוך ממה ששמור - מורידים אותו פעם אחת במלואו
+                bars = self.market.fetch_daily_bars(symbol, None if start == FULL_HISTORY else start)
+                self.db.save_price_bars(symbol, bars, covered_from=start)
+                return
+            covered_from, last_sync, last_bar = meta
+            if datetime.now() - datetime.strptime(last_sync, "%Y-%m-%d %H:%M:%S") < self.resync_after:
+                return
+            # הנר האחרון עשוי להיות חלקי (מסחר תוך-יומי), לכן מורידים אותו מחדש
+            bars = self.market.fetch_daily_bars(symbol, last_bar) if last_bar else []
+            self.db.save_price_bars(symbol, bars)
+
+    def get_bars(self, symbol: str, period: str = "1mo"):
+        self.sync(symbol, period)
+        start = self._start_date(period)
+        end = self.now().strftime("%Y-%m-%d") if self.now else None
+        return self.db.get_price_bars(symbol.upper(), None if start == FULL_HISTORY else start, end)
+
+    def get_bars_many(self, symbols, period: str = "1mo"):
+        """Bars for many symbols: syncs run in parallel on the store's pool, then one read.
+
+        Returns ({symbol: bars}, {symbol: error}); a symbol whose sync failed is
+        only in the second dict, so one bad download does not sink the rest.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        with self._locks_guard:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="history-sync")
+        futures = {s: self._pool.submit(self.sync, s, period) for s in symbols}
+        failed = {}
+        for s, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failed[s] = e
+        if failed:
+            metrics.count("history.sync_error", len(failed))
+        start = self._start_date(period)
+        end = self.now().strftime("%Y-%m-%d") if self.now else None
+        ok = [s for s in symbols if s not in failed]
+        return self.db.get_price_bars_many(ok, None if start == FULL_HISTORY else start, end), failed
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,9 +1,33 @@
-import yfinance as yf
+import logging
 import urllib.request
 import xml.etree.ElementTree as ET
+from services.cache import TTLCache
+from services.providers import FileQuotes, ProviderChain, ProviderError, RssNews, YahooNews, YFinanceQuotes
+from instrumentation import metrics, timed
+
+log = logging.getLogger(__name__)
+yf = None
+
+def _yf():
+    """yfinance (and pandas under it) is imported on first market access, not at startup."""
+    global yf
+    if yf is None:
+        import yfinance
+        yf = yfinance
+    return yf
 
 class MarketService:
-    def __init__(self):
+    """Market data behind provider chains: yfinance first, then the last good quotes on disk.
+
+    Quotes are `Quote` tuples flagged `stale` when not fetched live just now;
+    a symbol no provider could price maps to None, never to 0.0.
+    """
+    def __init__(self, snapshot_path="quotes_snapshot.json"):
+        self.snapshot = FileQuotes(snapshot_path)
+        self.quote_providers = ProviderChain("quotes", [YFinanceQuotes(self), self.snapshot], late=self._late_quotes)
+        self.news_providers = ProviderChain("news", [YahooNews(self), RssNews(self)])
+        metrics.register_gauges("providers", lambda: {"quotes": self.quote_providers.stats(),
+                                                      "news": self.news_providers.stats()})
         self.company_names = {
             "AAPL": "Apple Inc.", "MSFT": "Microsoft Corp.", "GOOGL": "Alphabet Inc.",
             "AMZN": "Amazon.com Inc.", "TSLA": "Tesla Inc.", "NVDA": "NVIDIA Corp.",
@@ -13,15 +37,68 @@ class MarketService:
     def get_company_name(self, symbol: str) -> str:
         return self.company_names.get(symbol.upper(), symbol.upper())
 
-    def fetch_live_price(self, symbol: str) -> float:
-        ticker = yf.Ticker(symbol)
-        hist = ticker.history(period="1d")
-        if not hist.empty:
-            return float(hist['Close'].iloc[-1])
-        return 0.0
-        
+    def get_quote(self, symbol: str):
+        return self.fetch_live_prices([symbol])[symbol.upper()]
+
+    @timed("market.fetch_live_price")
+    def fetch_live_price(self, symbol: str, allow_stale=False) -> float:
+        """Live price for trading; raises ProviderError rather than return a stale or made-up one."""
+        quote = self.get_quote(symbol)
+        if quote is None or (quote.stale and not allow_stale):
+            raise ProviderError(f"No live quote for {symbol.upper()}" + (f" (last: {quote[0]:.2f} from {quote.source})" if quote else ""))
+        return quote[0]
+
+    def _late_quotes(self, provider, quotes):
+        """Live quotes that arrived after the chain moved on still refresh the snapshot."""
+        if provider.live:
+            self.snapshot.record(quotes)
+
+    @timed("market.fetch_live_prices")
+    def fetch_live_prices(self, symbols):
+        """Batched quotes for many symbols, one request per provider.
+
+        Returns {symbol: Quote}; symbols that no provider could price map to None.
+        Symbols the answering provider missed are asked of the ones after it.
+        """
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        quotes = {s: None for s in symbols}
+        missing, tried, order = symbols, (), self.quote_providers.providers
+        while missing:
+            try:
+                provider, found = self.quote_providers.call("fetch_quotes", missing, exclude=tried)
+            except ProviderError as e:
+                metrics.count("market.quotes.batch_error")
+                log.warning("Error fetching prices for %s: %s", missing, e)
+                break
+            quotes.update(found)
+            if provider.live:
+                self.snapshot.record(found)
+            # לסימבולים שחסרו פונים רק לספקים שאחרי זה שענה
+            tried = tuple(p.name for p in order[:order.index(provider) + 1])
+            missing = [s for s in missing if quotes[s] is None] if len(tried) < len(order) else []
+        metrics.count("market.quotes.missing", sum(1 for q in quotes.values() if q is None))
+        metrics.count("market.quotes.stale", sum(1 for q in quotes.values() if q is not None and q.stale))
+        return quotes
+
+    def download_quotes(self, symbols):
+        """{symbol: (price, daily_change_pct)} from one yfinance download; raises on failure."""
+        data = _yf().download(symbols, period="5d", group_by="ticker", progress=False, threads=True)
+        quotes = {}
+        for s in symbols:
+            try:
+                closes = data[s]['Close'].dropna()
+            except KeyError:
+                continue
+            if len(closes) >= 2:
+                current, prev = float(closes.iloc[-1]), float(closes.iloc[-2])
+                quotes[s] = (current, ((current - prev) / prev) * 100)
+            elif len(closes) == 1:
+                quotes[s] = (float(closes.iloc[-1]), 0.0)
+        return quotes
+
+    @timed("market.get_daily_change")
     def get_daily_change(self, symbol: str):
-        ticker = yf.Ticker(symbol)
+        ticker = _yf().Ticker(symbol)
         hist = ticker.history(period="2d")
         if len(hist) >= 2:
             current = float(hist['Close'].iloc[-1])
@@ -31,51 +108,93 @@ class MarketService:
             return float(hist['Close'].iloc[-1]), 0.0
         return 0.0, 0.0
 
-    def fetch_stock_news(self, symbol: str):
-        headlines = []
-        publishers = set()
-        try:
-            ticker = yf.Ticker(symbol)
-            news = ticker.news
-            if news:
-                for n in news[:5]:
-                    if n.get('title'):
-                        headlines.append(n['title'])
-                        publishers.add(n.get('publisher', 'Yahoo Finance'))
-        except Exception as e:
-            pass 
-
-        if not headlines:
-            try:
-                url = f"https://feeds.finance.yahoo.com/rss/2.0/headline?s={symbol}"
-                req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    xml_data = response.read()
-                root = ET.fromstring(xml_data)
-                for item in root.findall('./channel/item')[:5]:
-                    title = item.find('title')
-                    if title is not None and title.text:
-                        headlines.append(title.text)
-                if headlines:
-                    publishers.add("Yahoo Finance RSS")
-            except Exception as e:
-                pass
-                
-        return headlines, list(publishers)
-
-    # --- הפונקציה החדשה לגרף ההיסטורי ---
-    def fetch_history_chart_data(self, symbol: str):
-        """מושך נתוני סגירה של 30 הימים האחרונים בשביל הגרף"""
+    @timed("market.fetch_yahoo_news")
+    def fetch_yahoo_news(self, symbol: str, limit: int = 5):
+        """[(title, publisher)] from yfinance's news feed."""
+        news = _yf().Ticker(symbol).news or []
+        return [(n['title'], n.get('publisher', 'Yahoo Finance')) for n in news[:limit] if n.get('title')]
+
+    @timed("market.fetch_rss_news")
+    def fetch_rss_news(self, symbol: str, limit: int = 5, timeout: float = 10):
+        """[(title, publisher)] from the Yahoo Finance RSS headline feed."""
+        url = f"https://feeds.finance.yahoo.com/rss/2.0/headline?s={symbol}"
+        req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            xml_data = response.read()
+        root = ET.fromstring(xml_data)
+        items = []
+        for item in root.findall('./channel/item')[:limit]:
+            title = item.find('title')
+            if title is not None and title.text:
+                items.append((title.text, "Yahoo Finance RSS"))
+        return items
+
+    @timed("market.fetch_news_items")
+    def fetch_news_items(self, symbol: str):
+        """[(title, publisher)] from the news chain (yfinance, then RSS); [] if no provider answers."""
         try:
-            ticker = yf.Ticker(symbol)
-            # מושכים היסטוריה של חודש אחד (1mo)
-            hist = ticker.history(period="1mo")
-            if hist.empty:
-                return []
-            
-            prices = hist['Close'].tolist()
-            # מחזיר רשימה של נקודות: (מספר היום, מחיר המניה)
-            return [(i, float(price)) for i, price in enumerate(prices)]
-        except Exception as e:
-            print(f"Error fetching history chart for {symbol}: {e}")
-            return []
\ No newline at end of file
+            _, items = self.news_providers.call("fetch_news", symbol)
+        except ProviderError:
+            metrics.count("market.news.unavailable")
+            return []
+        return items
+
+    def fetch_stock_news(self, symbol: str):
+        items = self.fetch_news_items(symbol)
+        return [title for title, _ in items], list({publisher for _, publisher in items})
+
+    def close(self):
+        self.snapshot.flush()
+        self.quote_providers.shutdown()
+        self.news_providers.shutdown()
+
+    @timed("market.fetch_daily_bars")
+    def fetch_daily_bars(self, symbol: str, start: str = None):
+        """Daily OHLCV bars from `start` (YYYY-MM-DD) onward, or the full history if None."""
+        ticker = _yf().Ticker(symbol)
+        hist = ticker.history(start=start) if start else ticker.history(period="max")
+        return [
+            (idx.strftime("%Y-%m-%d"), float(row['Open']), float(row['High']), float(row['Low']),
+             float(row['Close']), int(row['Volume']))
+            for idx, row in hist.iterrows()
+        ]
+
+class CachedMarketService(MarketService):
+    """MarketService with per-kind TTL caches in front of the network calls."""
+    def __init__(self, quote_ttl=15, news_ttl=300, snapshot_path="quotes_snapshot.json"):
+        super().__init__(snapshot_path)
+        self.quote_cache = TTLCache(quote_ttl, max_size=1024)
+        self.news_cache = TTLCache(news_ttl, max_size=128)
+        metrics.register_gauges("market_cache", self.cache_stats)
+
+    def fetch_live_prices(self, symbols):
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        # סימבול שרענון חופף (או ה-streamer) כבר מושך לא נשלף שוב; ציטוט ישן לא נשמר במטמון,
+        # כדי שהרענון הבא ינסה שוב את המקור החי
+        quotes = self.quote_cache.get_or_load_many(symbols, super().fetch_live_prices,
+                                                   cache_if=lambda q: q is not None and not q.stale)
+        return {s: quotes[s] for s in symbols}
+
+    def _late_quotes(self, provider, quotes):
+        super()._late_quotes(provider, quotes)
+        if provider.live:
+            for s, q in quotes.items():
+                if q is not None:
+                    self.quote_cache.set(s, q)
+
+    def get_quote(self, symbol: str):
+        symbol = symbol.upper()
+        return self.quote_cache.get_or_load(
+            symbol, lambda: MarketService.fetch_live_prices(self, [symbol])[symbol],
+            cache_if=lambda q: q is not None and not q.stale)
+
+    def get_daily_change(self, symbol: str):
+        return self.get_quote(symbol) or (0.0, 0.0)
+
+    def fetch_news_items(self, symbol: str):
+        return self.news_cache.get_or_load(
+            symbol.upper(), lambda: super(CachedMarketService, self).fetch_news_items(symbol),
+            cache_if=bool)
+
+    def cache_stats(self):
+        return {"quotes": self.quote_cache.stats(), "news": self.news_cache.stats()}
@@ -0,0 +1,61 @@
+import hashlib
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import metrics, timed
+
+log = logging.getLogger(__name__)
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def headline_hash(title: str) -> str:
+    """Hash of the title with case, punctuation and spacing normalized away."""
+    normalized = _NON_WORD.sub(" ", title.lower()).strip()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class NewsPipeline:
+    """Fetches news for many symbols at once and de-duplicates the headlines.
+
+    Symbols are fetched in parallel through `market.fetch_news_items`, so the
+    market's news cache and its provider chain (timeouts, circuit breakers,
+    RSS fallback) apply to every call. With a PortfolioDB every headline is
+    recorded with the time it was first seen, and `only_new=True` skips the
+    ones an earlier call (or run) already returned.
+    """
+    def __init__(self, market, db=None, max_workers=16):
+        self.market = market
+        self.db = db
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="news")
+
+    def _safe(self, fetch, symbol):
+        try:
+            return fetch(symbol)
+        except Exception as e:
+            metrics.count("news.source_error")
+            log.warning("News source error for %s: %s", symbol, e)
+            return []
+
+    @timed("news.fetch")
+    def fetch(self, symbols, only_new=False):
+        """Returns {symbol: (headlines, sources)}, like MarketService.fetch_stock_news."""
+        if only_new and self.db is None:
+            raise ValueError("only_new needs a headline store (db)")
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        jobs = {s: self._pool.submit(self._safe, self.market.fetch_news_items, s) for s in symbols}
+
+        results = {}
+        for s, future in jobs.items():
+            unique = {}
+            for title, publisher in future.result():
+                unique.setdefault(headline_hash(title), (title, publisher))
+            items = [(h, title, publisher) for h, (title, publisher) in unique.items()]
+            if self.db is not None:
+                new_hashes = self.db.record_headlines(s, items)
+                if only_new:
+                    items = [item for item in items if item[0] in new_hashes]
+            results[s] = ([title for _, title, _ in items], sorted({publisher for _, _, publisher in items}))
+        return results
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,87 @@
+import logging
+import threading
+from instrumentation import metrics
+
+log = logging.getLogger(__name__)
+
+
+def _same(last, quote):
+    """Same price, change and staleness (a quote going stale is news for the panel)."""
+    return last == quote and getattr(last, "stale", False) == getattr(quote, "stale", False)
+
+
+class PriceStreamer:
+    """Polls MarketService for the watched symbols on a background thread.
+
+    Every `interval` seconds the symbols are fetched in batches of `batch_size`
+    through `fetch_live_prices`. `on_quotes` receives only the quotes that
+    changed since the last push. When a whole batch fails (e.g. rate limiting),
+    the wait doubles up to `max_backoff`; a batch that only got stale snapshot
+    quotes counts as failed too, though its quotes are still pushed.
+    """
+    def __init__(self, market, on_quotes, interval=30, batch_size=50, max_backoff=600):
+        self.market = market
+        self.on_quotes = on_quotes
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self._symbols = []
+        self._last = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.delay = interval
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def watch(self, symbols):
+        with self._lock:
+            self._symbols = list(dict.fromkeys(s.upper() for s in symbols))
+            self._last = {s: q for s, q in self._last.items() if s in self._symbols}
+
+    def start(self):
+        if self.running: return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="price-streamer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        self.delay = self.interval
+        while not self._stop.wait(self.delay):
+            rate_limited = self.poll_once()
+            if rate_limited:
+                self.delay = min(self.delay * 2, self.max_backoff)
+            else:
+                self.delay = self.interval
+
+    def poll_once(self):
+        """Fetches every batch once and pushes changes; returns True if a batch got no live quote."""
+        with self._lock:
+            symbols = list(self._symbols)
+        failed_batch = False
+        for i in range(0, len(symbols), self.batch_size):
+            if self._stop.is_set(): break
+            batch = symbols[i:i + self.batch_size]
+            try:
+                quotes = self.market.fetch_live_prices(batch)
+            except Exception as e:
+                metrics.count("streamer.error")
+                log.warning("Price streamer error: %s", e)
+                quotes = {s: None for s in batch}
+            # ספק חי שנפל מחזיר ציטוטים ישנים מה-snapshot, לא None - גם זה כישלון לעניין ה-backoff
+            if all(q is None or getattr(q, "stale", False) for q in quotes.values()):
+                failed_batch = True
+            with self._lock:
+                changed = {s: q for s, q in quotes.items() if q is not None and not _same(self._last.get(s), q)}
+                self._last.update(changed)
+            if changed:
+                self.on_quotes(changed)
+        return failed_batch
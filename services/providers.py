@@ -0,0 +1,324 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from instrumentation import metrics
+
+log = logging.getLogger(__name__)
+
+
+class ProviderError(Exception):
+    """No provider could answer (all failed, timed out or were short-circuited)."""
+
+
+class Quote(tuple):
+    """(price, change_pct), plus where it came from and whether it is stale.
+
+    Indexes, unpacks and compares like the plain tuples quotes used to be.
+    """
+    def __new__(cls, price, change_pct, source, as_of=None, stale=False):
+        quote = super().__new__(cls, (price, change_pct))
+        quote.source = source
+        quote.as_of = time.time() if as_of is None else as_of
+        quote.stale = stale
+        return quote
+
+    @property
+    def price(self): return self[0]
+
+    @property
+    def change_pct(self): return self[1]
+
+    @property
+    def age(self): return time.time() - self.as_of
+
+    def __reduce__(self):
+        return Quote, (self[0], self[1], self.source, self.as_of, self.stale)
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after `threshold` consecutive failures.
+
+    While open, calls are refused for `cooldown` seconds; then a single trial
+    call is let through (half-open) and its outcome closes or re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, threshold=3, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        return self.HALF_OPEN if time.monotonic() - self._opened_at >= self.cooldown else self.OPEN
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+class Provider:
+    """One upstream source. Subclasses implement fetch_quotes(symbols) and/or fetch_news(symbol).
+
+    `timeout` bounds each call; after `hedge_after` seconds without an answer
+    the chain also starts the next provider. `live` is False for sources that
+    serve recorded data, whose quotes are always flagged stale.
+    """
+    name = "provider"
+    live = True
+
+    def __init__(self, timeout=10.0, hedge_after=None, breaker=None):
+        self.timeout = timeout
+        self.hedge_after = timeout if hedge_after is None else hedge_after
+        self.breaker = breaker or CircuitBreaker()
+
+
+class YFinanceQuotes(Provider):
+    name = "yfinance"
+
+    def __init__(self, market, timeout=15.0, hedge_after=5.0):
+        super().__init__(timeout, hedge_after)
+        self.market = market
+
+    def fetch_quotes(self, symbols):
+        now = time.time()
+        return {s: Quote(price, change, self.name, now)
+                for s, (price, change) in self.market.download_quotes(symbols).items()}
+
+
+class YahooNews(Provider):
+    name = "yahoo-news"
+
+    def __init__(self, market, timeout=10.0, hedge_after=3.0):
+        super().__init__(timeout, hedge_after)
+        self.market = market
+
+    def fetch_news(self, symbol):
+        return self.market.fetch_yahoo_news(symbol)
+
+
+class RssNews(Provider):
+    name = "yahoo-rss"
+
+    def __init__(self, market, timeout=10.0, hedge_after=None):
+        super().__init__(timeout, hedge_after)
+        self.market = market
+
+    def fetch_news(self, symbol):
+        return self.market.fetch_rss_news(symbol, timeout=self.timeout)
+
+
+class FileQuotes(Provider):
+    """Last good quote per symbol, kept in memory and flushed to a JSON file.
+
+    Serves as the last resort of the quote chain, also across restarts; every
+    quote it returns is stale and keeps the time it was originally fetched.
+    With `path=None` the quotes are kept in memory only.
+    """
+    name = "snapshot"
+    live = False
+
+    def __init__(self, path="quotes_snapshot.json", flush_interval=60.0, timeout=2.0):
+        super().__init__(timeout)
+        self.path = path
+        self.flush_interval = flush_interval
+        self._quotes = None
+        self._dirty = False
+        self._flushed_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._quotes is None and self.path is None:
+            self._quotes = {}
+        elif self._quotes is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self._quotes = {s: tuple(v) for s, v in json.load(f).items()}
+            except (OSError, ValueError):
+                self._quotes = {}
+        return self._quotes
+
+    def fetch_quotes(self, symbols):
+        with self._lock:
+            quotes = self._load()
+            return {s: Quote(quotes[s][0], quotes[s][1], self.name, quotes[s][2], stale=True)
+                    for s in symbols if s in quotes}
+
+    def record(self, quotes):
+        """Remembers fresh quotes; writes the file at most every `flush_interval` seconds."""
+        with self._lock:
+            stored = self._load()
+            for s, q in quotes.items():
+                if q is not None and not getattr(q, "stale", False):
+                    stored[s] = (q[0], q[1], getattr(q, "as_of", time.time()))
+                    self._dirty = True
+            if self._dirty and time.monotonic() - self._flushed_at >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._flush()
+
+    def _flush(self):
+        if self.path is None:
+            self._dirty = False
+            return
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._quotes, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            metrics.count("provider.snapshot.write_error")
+            log.warning("Could not write quote snapshot %s: %s", self.path, e)
+            return
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+
+
+class ProviderChain:
+    """Calls providers in order, with per-provider timeouts, circuit breakers and hedging.
+
+    A provider whose breaker is open is skipped. When the running provider
+    fails, times out or passes its `hedge_after`, the next one is started and
+    the first acceptable answer wins. Every call settles its provider's
+    breaker when it finishes, also after the chain stopped waiting for it;
+    such late answers are handed to `late(provider, result)`, if given.
+    """
+    def __init__(self, name, providers, max_workers=8, late=None):
+        self.name = name
+        self.providers = list(providers)
+        self.late = late
+        self._timed_out = set()  # קריאות שנספרו ככישלון כשעבר ה-timeout שלהן
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"provider-{name}")
+
+    def _run(self, provider, method, args):
+        with metrics.span(f"provider.{provider.name}.{method}"):
+            return getattr(provider, method)(*args)
+
+    def _settle(self, provider, future):
+        """Done callback of every call: feeds its outcome to the provider's breaker."""
+        if future.cancelled():
+            return
+        with self._lock:
+            timed_out = future in self._timed_out
+            self._timed_out.discard(future)
+        if future.exception() is None:
+            provider.breaker.success()
+        elif not timed_out:
+            provider.breaker.failure()
+            metrics.count(f"provider.{provider.name}.error")
+
+    def _abandon(self, provider, future):
+        """Stops waiting for a call; its answer, whenever it comes, goes to `late`."""
+        def deliver(f):
+            if self.late is None or f.cancelled() or f.exception() is not None:
+                return
+            metrics.count(f"provider.{provider.name}.late")
+            try:
+                self.late(provider, f.result())
+            except Exception as e:
+                metrics.count(f"provider.{provider.name}.late_error")
+                log.warning("Late %s answer from %s dropped: %s", self.name, provider.name, e)
+        future.add_done_callback(deliver)
+
+    def call(self, method, *args, accept=bool, exclude=()):
+        """Returns (provider, result) from the first provider whose result passes `accept`.
+
+        An unacceptable result (e.g. no data) moves on without counting as a failure.
+        Raises ProviderError when every provider is exhausted.
+        """
+        candidates = iter([p for p in self.providers if p.name not in exclude and hasattr(p, method)])
+        pending = {}  # future -> (provider, deadline)
+        errors = []
+        hedge_at = [None]
+
+        def start_next():
+            for provider in candidates:
+                if not provider.breaker.allow():
+                    metrics.count(f"provider.{provider.name}.short_circuit")
+                    errors.append(f"{provider.name}: circuit open")
+                    continue
+                now = time.monotonic()
+                future = self._pool.submit(self._run, provider, method, args)
+                future.add_done_callback(lambda f, provider=provider: self._settle(provider, f))
+                pending[future] = (provider, now + provider.timeout)
+                hedge_at[0] = now + provider.hedge_after
+                return True
+            hedge_at[0] = None
+            return False
+
+        start_next()
+        try:
+            while pending:
+                wake = min([deadline for _, deadline in pending.values()] + ([hedge_at[0]] if hedge_at[0] else []))
+                done, _ = wait(list(pending), timeout=max(0.0, wake - time.monotonic()), return_when=FIRST_COMPLETED)
+                for future in done:
+                    provider, _ = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(f"{provider.name}: {e}")
+                        continue
+                    if accept(result):
+                        return provider, result
+                    metrics.count(f"provider.{provider.name}.empty")
+                now = time.monotonic()
+                for future, (provider, deadline) in list(pending.items()):
+                    if deadline > now:
+                        continue
+                    with self._lock:
+                        if future.done():
+                            continue  # סיימה זה עתה; ה-wait הבא יחזיר אותה
+                        self._timed_out.add(future)
+                    # הקריאה ממשיכה ברקע; הכישלון נספר עכשיו, ותשובה מאוחרת תסגור את המפסק
+                    del pending[future]
+                    provider.breaker.failure()
+                    metrics.count(f"provider.{provider.name}.timeout")
+                    errors.append(f"{provider.name}: timed out after {provider.timeout:g}s")
+                    self._abandon(provider, future)
+                if not pending:
+                    start_next()
+                elif hedge_at[0] is not None and now >= hedge_at[0] and start_next():
+                    metrics.count(f"provider.{self.name}.hedged")
+        finally:
+            # תשובות של ספקים שהשיחה כבר לא מחכה להם (למשל הספק הראשון כשה-hedge ענה קודם)
+            for future, (provider, _) in pending.items():
+                self._abandon(provider, future)
+        raise ProviderError(f"No {self.name} provider answered: " + ("; ".join(errors) or "none available"))
+
+    def stats(self):
+        states = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+        return {p.name: {"breaker_state": states[p.breaker.state], "failures": p.breaker.failures}
+                for p in self.providers}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
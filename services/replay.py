@@ -0,0 +1,288 @@
+import bisect
+import gzip
+import json
+import threading
+import time
+from datetime import datetime
+from services.price_streamer import PriceStreamer
+from services.providers import ProviderError, Quote
+
+RECORDED_METHODS = ("get_company_name", "fetch_live_prices", "fetch_daily_bars",
+                    "fetch_yahoo_news", "fetch_rss_news", "fetch_news_items", "fetch_stock_news")
+
+
+def _encode(value):
+    if isinstance(value, Quote):
+        return {"q": [value[0], value[1], value.source, value.as_of, value.stale]}
+    if isinstance(value, dict):
+        return {"d": {k: _encode(v) for k, v in value.items()}}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if "q" in value:
+            return Quote(*value["q"])
+        return {k: _decode(v) for k, v in value["d"].items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class ReplayClock:
+    """Simulated time in epoch seconds.
+
+    With `speed` it runs that many times faster than real time; without, it
+    only moves through `advance`/`set` (e.g. one trading day per streamer tick).
+    """
+    def __init__(self, start, speed=None):
+        self.speed = speed
+        self._start = start
+        self._base = time.monotonic()
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            if self.speed is None:
+                return self._start
+            return self._start + (time.monotonic() - self._base) * self.speed
+
+    def set(self, t):
+        with self._lock:
+            self._start = t
+            self._base = time.monotonic()
+
+    def advance(self, seconds):
+        self.set(self.now() + seconds)
+
+    def datetime(self):
+        return datetime.fromtimestamp(self.now())
+
+    def date(self):
+        return self.datetime().strftime("%Y-%m-%d")
+
+
+class MarketRecorder:
+    """Wraps a market service and appends every response to a gzip JSON-lines log.
+
+    A session starts with ["start", epoch]; each call is then one line of
+    [seconds since start, method, args, result].
+    """
+    def __init__(self, market, path, flush_every=50):
+        self.market = market
+        self.path = path
+        self.flush_every = flush_every
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._start = time.time()
+        self._write(["start", self._start])
+
+    def _write(self, record):
+        line = json.dumps(record, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._unflushed += 1
+            if self._unflushed >= self.flush_every:
+                self._file.flush()
+                self._unflushed = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.market, name)
+        if name not in RECORDED_METHODS:
+            return attr
+
+        def recorded(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            self._write([round(time.time() - self._start, 3), name, list(args), _encode(result)])
+            return result
+        return recorded
+
+    # בלי אלה הקריאות הפנימיות של MarketService לא היו נרשמות
+    def get_quote(self, symbol):
+        return self.fetch_live_prices([symbol])[symbol.upper()]
+
+    def fetch_live_price(self, symbol, allow_stale=False):
+        quote = self.get_quote(symbol)
+        if quote is None or (getattr(quote, "stale", False) and not allow_stale):
+            raise ProviderError(f"No live quote for {symbol.upper()}")
+        return quote[0]
+
+    def get_daily_change(self, symbol):
+        return self.get_quote(symbol) or (0.0, 0.0)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+        if hasattr(self.market, "close"):
+            self.market.close()
+
+
+class _ReplayMarket:
+    """Shared MarketService surface of the replay sources; subclasses provide _quote and bars.
+
+    The streamer it makes advances the clock `stream_step` seconds every
+    `stream_interval` real seconds (no stepping when the clock runs by itself).
+    """
+    def __init__(self, clock, stream_step=None, stream_interval=0.2):
+        self.clock = clock
+        self.stream_step = stream_step
+        self.stream_interval = stream_interval
+
+    def get_company_name(self, symbol):
+        return symbol.upper()
+
+    def fetch_live_prices(self, symbols):
+        return {s: self._quote(s) for s in dict.fromkeys(x.upper() for x in symbols)}
+
+    def get_quote(self, symbol):
+        return self._quote(symbol.upper())
+
+    def fetch_live_price(self, symbol, allow_stale=False):
+        quote = self.get_quote(symbol)
+        if quote is None or (quote.stale and not allow_stale):
+            raise ProviderError(f"No replayed quote for {symbol.upper()} on {self.clock.date()}")
+        return quote[0]
+
+    def get_daily_change(self, symbol):
+        return self.get_quote(symbol) or (0.0, 0.0)
+
+    def fetch_yahoo_news(self, symbol, limit=5):
+        return []
+
+    def fetch_rss_news(self, symbol, limit=5, timeout=10):
+        return []
+
+    def fetch_news_items(self, symbol):
+        return self.fetch_yahoo_news(symbol) or self.fetch_rss_news(symbol)
+
+    def fetch_stock_news(self, symbol):
+        items = self.fetch_news_items(symbol)
+        return [title for title, _ in items], list({publisher for _, publisher in items})
+
+    def make_streamer(self, on_quotes):
+        return ReplayStreamer(self, on_quotes, self.stream_step, self.stream_interval)
+
+
+class RecordedMarket(_ReplayMarket):
+    """Serves a MarketRecorder log as of `clock.now()`, with no network.
+
+    Quotes are looked up per symbol (latest recorded at or before the replay
+    time); other calls return the latest response recorded for the same arguments.
+    """
+    def __init__(self, path, clock=None, speed=1.0):
+        self.quotes = {}     # symbol -> ([t], [Quote])
+        self.responses = {}  # (method, args) -> ([t], [result])
+        start = None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record[0] == "start":
+                    start = record[1]
+                    continue
+                t, method, args, result = start + record[0], record[1], record[2], _decode(record[3])
+                if method == "fetch_live_prices":
+                    for symbol, quote in result.items():
+                        if quote is not None:
+                            times, values = self.quotes.setdefault(symbol, ([], []))
+                            times.append(t)
+                            values.append(quote if isinstance(quote, Quote) else Quote(quote[0], quote[1], "replay", t))
+                else:
+                    times, values = self.responses.setdefault((method, json.dumps(args)), ([], []))
+                    times.append(t)
+                    values.append(result)
+        all_times = [ts[0] for ts, _ in list(self.quotes.values()) + list(self.responses.values())]
+        self.start = min(all_times, default=time.time())
+        super().__init__(clock or ReplayClock(self.start, speed))
+
+    @staticmethod
+    def _at(series, now):
+        times, values = series
+        return values[max(bisect.bisect_right(times, now) - 1, 0)]
+
+    def _quote(self, symbol):
+        series = self.quotes.get(symbol)
+        return self._at(series, self.clock.now()) if series else None
+
+    def _response(self, method, args, default):
+        series = self.responses.get((method, json.dumps(list(args))))
+        return self._at(series, self.clock.now()) if series else default
+
+    def get_company_name(self, symbol):
+        return self._response("get_company_name", [symbol], symbol.upper())
+
+    def fetch_daily_bars(self, symbol, start=None):
+        # ההקלטה האחרונה של הסימבול, בכל טווח שהוא, חתוכה לטווח המבוקש
+        candidates = [series for (method, args), series in self.responses.items()
+                      if method == "fetch_daily_bars" and json.loads(args)[0].upper() == symbol.upper()]
+        now = self.clock.now()
+        best = max(candidates, key=lambda series: series[0][0], default=None)
+        bars = [tuple(bar) for bar in self._at(best, now)] if best else []
+        return [bar for bar in bars if not start or bar[0] >= start]
+
+    def fetch_news_items(self, symbol):
+        recorded = self._response("fetch_news_items", [symbol], None)
+        return [tuple(item) for item in recorded] if recorded is not None else super().fetch_news_items(symbol)
+
+    def fetch_stock_news(self, symbol):
+        recorded = self._response("fetch_stock_news", [symbol], None)
+        return tuple(recorded) if recorded is not None else super().fetch_stock_news(symbol)
+
+    def fetch_yahoo_news(self, symbol, limit=5):
+        return [tuple(item) for item in self._response("fetch_yahoo_news", [symbol], [])]
+
+    def fetch_rss_news(self, symbol, limit=5, timeout=10):
+        return [tuple(item) for item in self._response("fetch_rss_news", [symbol], [])]
+
+
+class HistoricalMarket(_ReplayMarket):
+    """Quotes from the daily bars stored in PortfolioDB, as of the replay date; no network.
+
+    Live streaming moves the replay forward `days_per_second` days per second.
+    """
+    def __init__(self, db, start, clock=None, days_per_second=5.0):
+        super().__init__(clock or ReplayClock(datetime.strptime(start, "%Y-%m-%d").timestamp()),
+                         stream_step=24 * 3600, stream_interval=1.0 / days_per_second)
+        self.db = db
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _bars(self, symbol):
+        with self._lock:
+            bars = self._series.get(symbol)
+        if bars is None:
+            bars = self.db.get_price_bars(symbol)
+            with self._lock:
+                self._series[symbol] = bars
+        return bars
+
+    def _quote(self, symbol):
+        bars = self._bars(symbol)
+        i = bisect.bisect_right(bars, (self.clock.date(), float("inf"))) - 1
+        if i < 0:
+            return None
+        close = bars[i][4]
+        prev = bars[i - 1][4] if i > 0 else close
+        as_of = datetime.strptime(bars[i][0], "%Y-%m-%d").timestamp()
+        return Quote(close, ((close - prev) / prev) * 100 if prev else 0.0, "history", as_of)
+
+    def fetch_daily_bars(self, symbol, start=None):
+        day = self.clock.date()
+        return [bar for bar in self._bars(symbol.upper()) if bar[0] <= day and (not start or bar[0] >= start)]
+
+
+class ReplayStreamer(PriceStreamer):
+    """PriceStreamer over a replay market that moves its clock `step` seconds before each poll.
+
+    With `step=None` the clock runs by itself (RecordedMarket at a speed factor).
+    """
+    def __init__(self, market, on_quotes, step=None, interval=0.2):
+        super().__init__(market, on_quotes, interval=interval, max_backoff=interval)
+        self.step = step
+
+    def poll_once(self):
+        if self.step:
+            self.market.clock.advance(self.step)
+        return super().poll_once()
@@ -0,0 +1,253 @@
+"""Sharded quote sweep across processes, for symbol universes too big for one interpreter.
+
+    python -m services.sweep [--db portfolio.db] [--portfolio 1,2 | "*"] [--symbols A,B,...]
+                             [--workers N] [--shard-size 500] [--batch-size 100]
+
+yfinance parses every download with pandas under the GIL, so one process
+tops out at one core however the requests are batched. The sweep splits the
+universe into shards of `shard_size` symbols; each worker process owns one
+MarketService and prices its shards in `fetch_live_prices` batches of
+`batch_size`. Results travel back as QuoteColumns (a few flat arrays) rather
+than a dict of Quote objects.
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from services.providers import Quote
+from instrumentation import metrics
+
+_market = None  # ה-MarketService של תהליך העבודה, נבנה פעם אחת ב-initializer
+
+
+def worker_market():
+    """Default market of a worker process: a MarketService whose snapshot stays in memory.
+
+    Only the parent writes the snapshot file (see QuoteSweeper's `snapshot`).
+    """
+    from services.market_service import MarketService
+    return MarketService(snapshot_path=None)
+
+
+def _init_worker(factory):
+    global _market
+    _market = factory()
+
+
+def _sweep_shard(index, symbols, batch_size):
+    started = time.perf_counter()
+    quotes = {}
+    for i in range(0, len(symbols), batch_size):
+        quotes.update(_market.fetch_live_prices(symbols[i:i + batch_size]))
+    return index, QuoteColumns.from_quotes(symbols, quotes), time.perf_counter() - started, os.getpid()
+
+
+class QuoteColumns:
+    """Quotes for an ordered list of symbols as parallel arrays (no symbols inside).
+
+    A symbol without a quote has a NaN price. Provider names are interned in
+    `sources` and referenced by index, so a shard pickles as a handful of buffers.
+    """
+    __slots__ = ("prices", "changes", "as_of", "stale", "source_ids", "sources")
+
+    def __init__(self):
+        self.prices = array("d")
+        self.changes = array("d")
+        self.as_of = array("d")
+        self.stale = bytearray()
+        self.source_ids = array("H")
+        self.sources = [""]
+
+    def __len__(self):
+        return len(self.prices)
+
+    @classmethod
+    def from_quotes(cls, symbols, quotes):
+        columns = cls()
+        ids = {"": 0}
+        now = time.time()
+        for s in symbols:
+            q = quotes.get(s)
+            if q is None:
+                columns.prices.append(math.nan)
+                columns.changes.append(0.0)
+                columns.as_of.append(0.0)
+                columns.stale.append(0)
+                columns.source_ids.append(0)
+                continue
+            # גם tuple פשוט (למשל מ-FakeMarketService) נתמך
+            source = getattr(q, "source", "")
+            if source not in ids:
+                ids[source] = len(columns.sources)
+                columns.sources.append(source)
+            columns.prices.append(q[0])
+            columns.changes.append(q[1])
+            columns.as_of.append(getattr(q, "as_of", now))
+            columns.stale.append(1 if getattr(q, "stale", False) else 0)
+            columns.source_ids.append(ids[source])
+        return columns
+
+    def extend(self, other):
+        ids = {}
+        for i, source in enumerate(other.sources):
+            if source not in self.sources:
+                self.sources.append(source)
+            ids[i] = self.sources.index(source)
+        self.prices.extend(other.prices)
+        self.changes.extend(other.changes)
+        self.as_of.extend(other.as_of)
+        self.stale.extend(other.stale)
+        self.source_ids.extend(array("H", (ids[i] for i in other.source_ids)))
+
+    def quote(self, i):
+        if math.isnan(self.prices[i]):
+            return None
+        return Quote(self.prices[i], self.changes[i], self.sources[self.source_ids[i]], self.as_of[i],
+                     bool(self.stale[i]))
+
+
+class SweepResult:
+    """Quotes of one sweep, aligned with `symbols`, plus per-shard timings.
+
+    `shards` rows are (index, symbol_count, seconds, worker_pid, missing).
+    """
+    __slots__ = ("symbols", "columns", "shards", "elapsed")
+
+    def __init__(self, symbols, columns, shards, elapsed):
+        self.symbols = symbols
+        self.columns = columns
+        self.shards = shards
+        self.elapsed = elapsed
+
+    def quotes(self):
+        """{symbol: Quote or None}, like MarketService.fetch_live_prices."""
+        return {s: self.columns.quote(i) for i, s in enumerate(self.symbols)}
+
+    def prices(self):
+        """{symbol: price} for the symbols that got a quote."""
+        return {s: p for s, p in zip(self.symbols, self.columns.prices) if not math.isnan(p)}
+
+    @property
+    def missing(self):
+        return [s for s, p in zip(self.symbols, self.columns.prices) if math.isnan(p)]
+
+
+class QuoteSweeper:
+    """Prices a symbol universe on a pool of worker processes, one MarketService each.
+
+    `market_factory` must be picklable (a module-level callable or a partial of
+    one); it runs once per worker. The pool uses "spawn" by default, since the
+    parent usually holds threads and SQLite connections a fork would copy.
+    With a FileQuotes `snapshot`, fresh quotes are recorded into it and symbols
+    no worker could price fall back to it (as stale quotes).
+    """
+    def __init__(self, workers=None, shard_size=500, batch_size=100, market_factory=worker_market,
+                 snapshot=None, start_method="spawn"):
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self.batch_size = batch_size
+        self.market_factory = market_factory
+        self.snapshot = snapshot
+        self.start_method = start_method
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context(self.start_method),
+                                             initializer=_init_worker, initargs=(self.market_factory,))
+        return self._pool
+
+    def sweep(self, symbols):
+        started = time.perf_counter()
+        symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        shards = [symbols[i:i + self.shard_size] for i in range(0, len(symbols), self.shard_size)]
+        done = {}
+        with metrics.span("sweep.total"):
+            pool = self._get_pool()
+            futures = [pool.submit(_sweep_shard, i, shard, self.batch_size) for i, shard in enumerate(shards)]
+            for future in as_completed(futures):
+                index, columns, seconds, pid = future.result()
+                metrics.record("sweep.shard", seconds)
+                done[index] = (columns, seconds, pid)
+
+        merged = QuoteColumns()
+        timings = []
+        for i, shard in enumerate(shards):
+            columns, seconds, pid = done[i]
+            merged.extend(columns)
+            timings.append((i, len(shard), seconds, pid, sum(1 for p in columns.prices if math.isnan(p))))
+        result = SweepResult(symbols, merged, timings, 0.0)
+        if self.snapshot is not None:
+            self._apply_snapshot(result)
+        metrics.count("sweep.quotes.missing", len(result.missing))
+        result.elapsed = time.perf_counter() - started
+        return result
+
+    def _apply_snapshot(self, result):
+        quotes = result.quotes()
+        self.snapshot.record(quotes)
+        fallback = self.snapshot.fetch_quotes(result.missing)
+        if not fallback:
+            return
+        position = {s: i for i, s in enumerate(result.symbols)}
+        columns = result.columns
+        for s, q in fallback.items():
+            i = position[s]
+            if q.source not in columns.sources:
+                columns.sources.append(q.source)
+            columns.prices[i], columns.changes[i], columns.as_of[i] = q[0], q[1], q.as_of
+            columns.stale[i] = 1
+            columns.source_ids[i] = columns.sources.index(q.source)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self.snapshot is not None:
+            self.snapshot.flush()
+
+
+def main(argv=None):
+    from database import PortfolioDB
+    from services.providers import FileQuotes
+
+    parser = argparse.ArgumentParser(description="Revalue portfolios with a multi-process quote sweep.")
+    parser.add_argument("--db", default="portfolio.db")
+    parser.add_argument("--portfolio", default="*", help='comma-separated IDs, or "*" for all')
+    parser.add_argument("--symbols", help="comma-separated universe to price instead of the portfolios' holdings")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--snapshot", default="quotes_snapshot.json")
+    args = parser.parse_args(argv)
+
+    db = PortfolioDB(args.db)
+    sweeper = QuoteSweeper(args.workers, args.shard_size, args.batch_size, snapshot=FileQuotes(args.snapshot))
+    ids = None if args.portfolio == "*" else [p.strip() for p in args.portfolio.split(",") if p.strip()]
+    try:
+        if args.symbols:
+            symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+        else:
+            symbols = [stock.symbol for stock, _ in db.get_consolidated_positions(ids)]
+        result = sweeper.sweep(symbols)
+        valuations = db.get_portfolio_valuations(result.prices(), ids) if not args.symbols else []
+    finally:
+        sweeper.close()
+        db.close()
+
+    print(f"{len(result.symbols)} symbols in {len(result.shards)} shards on {sweeper.workers} workers: {result.elapsed:.2f}s")
+    print(f"{'Shard':>6} {'Symbols':>8} {'Seconds':>9} {'Worker':>8} {'Missing':>8}")
+    for index, count, seconds, pid, missing in result.shards:
+        print(f"{index:>6} {count:>8} {seconds:>9.2f} {pid:>8} {missing:>8}")
+    if result.missing:
+        print(f"No quote for: {', '.join(result.missing)}")
+    for pid, positions, cost, value in valuations:
+        print(f"Portfolio {pid}: {positions} positions, value {value:,.2f} (cost {cost:,.2f})")
+
+
+if __name__ == "__main__":
+    main()
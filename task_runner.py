@@ -0,0 +1,77 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PanelTaskRunner:
+    """Runs blocking handler work on a worker pool, one generation per panel.
+
+    Submitting a new task for a panel supersedes the previous one: a queued task
+    is cancelled, and a running task's result is dropped when it finishes.
+    """
+    def __init__(self, max_workers=4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ui-task")
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._futures = {}
+
+    def is_current(self, panel, token):
+        with self._lock:
+            return self._generations.get(panel) == token
+
+    def submit(self, panel, work, on_done, on_error=None):
+        """Run `work()` in the background, then `on_done(result)` if still current.
+
+        `work` may take a single `is_current` callable to poll for cancellation.
+        """
+        with self._lock:
+            token = self._generations.get(panel, 0) + 1
+            self._generations[panel] = token
+            previous = self._futures.get(panel)
+            if previous is not None:
+                previous.cancel()
+
+        def still_current():
+            return self.is_current(panel, token)
+
+        def job():
+            if not still_current():
+                return
+            try:
+                result = work(still_current)
+            except Exception as err:
+                if still_current() and on_error:
+                    on_error(err)
+                return
+            if still_current():
+                on_done(result)
+
+        future = self._executor.submit(job)
+        with self._lock:
+            if self._generations.get(panel) == token:
+                self._futures[panel] = future
+        return token
+
+    def run(self, work, on_done, on_error=None):
+        """Run `work()` in the background without superseding anything (e.g. trades)."""
+        def job():
+            try:
+                result = work()
+            except Exception as err:
+                if on_error:
+                    on_error(err)
+                return
+            on_done(result)
+        return self._executor.submit(job)
+
+    def cancel(self, panel):
+        with self._lock:
+            self._generations[panel] = self._generations.get(panel, 0) + 1
+            future = self._futures.pop(panel, None)
+        if future is not None:
+            future.cancel()
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            for panel in self._generations:
+                self._generations[panel] += 1
+        self._executor.shutdown(wait=wait, cancel_futures=True)
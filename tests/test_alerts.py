@@ -0,0 +1,115 @@
+import threading
+
+import pytest
+
+from alerts import AlertIndex, AlertRule
+from services.providers import Quote
+
+
+def _index(*rules):
+    index = AlertIndex()
+    index.load(AlertRule(i, *rule) for i, rule in enumerate(rules, 1))
+    return index
+
+
+def _fired(index, quotes):
+    return sorted((rule.id, value) for rule, value in index.check(quotes))
+
+
+def test_above_and_below_fire_only_crossed_thresholds():
+    index = _index(("AAPL", "price", "above", 110.0), ("AAPL", "price", "above", 120.0),
+                   ("AAPL", "price", "below", 90.0), ("AAPL", "price", "below", 80.0),
+                   ("AAPL", "change", "below", -3.0))
+    assert _fired(index, {"AAPL": Quote(105.0, -1.0, "test")}) == []
+    assert _fired(index, {"AAPL": Quote(110.0, -1.0, "test")}) == [(1, 110.0)]
+    assert _fired(index, {"AAPL": Quote(85.0, -4.5, "test")}) == [(3, 85.0), (5, -4.5)]
+    assert [rule.id for rule in index.rules()] == [2, 4]
+
+
+def test_rules_are_one_shot():
+    index = _index(("MSFT", "price", "above", 300.0))
+    assert _fired(index, {"MSFT": (310.0, 0.0)}) == [(1, 310.0)]
+    assert _fired(index, {"MSFT": (320.0, 0.0)}) == []
+    assert len(index) == 0 and index.symbols() == []
+
+
+def test_stale_and_missing_quotes_never_fire():
+    index = _index(("MSFT", "price", "above", 300.0))
+    assert _fired(index, {"MSFT": Quote(310.0, 0.0, "snapshot", stale=True), "AAPL": None}) == []
+    assert len(index) == 1
+
+
+def test_remove_keeps_equal_thresholds_apart():
+    index = _index(("V", "price", "below", 200.0), ("V", "price", "below", 200.0))
+    assert index.remove(1).id == 1
+    assert index.remove(1) is None
+    assert _fired(index, {"V": (199.0, 0.0)}) == [(2, 199.0)]
+
+
+class _Page:
+    def update(self):
+        pass
+
+
+class _View:
+    """Just enough of PortfolioView for the refresh path."""
+    def __init__(self):
+        self.page = _Page()
+        self.calls = []
+
+    def built(self, name):
+        return None
+
+    def apply(self, name, method, *args):
+        self.calls.append((name, method))
+
+    def update_table(self, *args):
+        self.calls.append(("portfolio_panel", "update_data"))
+
+
+class _Market:
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def fetch_live_prices(self, symbols):
+        self.started.set()
+        self.release.wait(2)
+        return {s: Quote(120.0, 0.0, "test") for s in symbols}
+
+
+def test_superseded_refresh_does_not_consume_alerts(tmp_path):
+    pytest.importorskip("flet")
+    from MainController import MainController
+    from database import PortfolioDB
+    from models import Stock
+
+    db = PortfolioDB(str(tmp_path / "portfolio.db"))
+    db.add_or_update_stock(Stock("AAPL", "Apple", 100.0, 5), "1")
+    market = _Market()
+    controller = MainController(db=db, market=market, ai=object())
+    controller.view = _View()
+    messages = []
+    controller.msg = messages.append
+    controller._alerts_loaded([(db.add_alert("AAPL", "price", "above", 110.0), "AAPL", "price", "above", 110.0)])
+    try:
+        loaded = threading.Event()
+        controller.tasks.submit("portfolio", lambda is_current: (controller._load_portfolio("1"), loaded.set())[0],
+                                controller._show_portfolio, None)
+        assert market.started.wait(2)
+        # מעבר לתיק אחר בזמן שהמחירים עוד נטענים
+        controller.tasks.cancel("portfolio")
+        market.release.set()
+        assert loaded.wait(2)
+
+        assert len(controller.alerts) == 1
+        assert len(db.get_alerts()) == 1
+        assert not any("Alert:" in m for m in messages)
+
+        controller._show_portfolio(controller._load_portfolio("1"))
+        assert len(controller.alerts) == 0
+        assert db.get_alerts() == []
+        assert "Alert: AAPL price above 110.00 (now 120.00)." in messages[-1]
+    finally:
+        controller.tasks.shutdown(wait=True)
+        db.close()
@@ -0,0 +1,84 @@
+import math
+import pytest
+
+np = pytest.importorskip("numpy")
+from analytics import TRADING_DAYS, align_closes, risk_metrics
+
+
+def test_risk_metrics_match_hand_computed_values():
+    # A: -10%, +10%, -10%; B: 0%, +10%, 0%  ->  equal-weight portfolio: -5%, +10%, -5%
+    closes = [[100.0, 50.0], [90.0, 50.0], [99.0, 55.0], [89.1, 55.0]]
+    bench = [200.0, 204.0, 204.0, 208.08]  # +2%, 0%, +2%
+    m = risk_metrics(closes, [1.0, 1.0], bench)
+    assert m["observations"] == 3
+    # std (ddof=1) of [-.05, .1, -.05] = sqrt(.015 / 2)
+    assert m["volatility"] == pytest.approx(math.sqrt(0.0075) * math.sqrt(TRADING_DAYS))
+    # cov(port, bench) = -.002 / 2, var(bench) = .0008 / 3 / 2
+    assert m["beta"] == pytest.approx(-0.001 / (0.0008 / 3 / 2))
+    # 5th percentile of [-.05, -.05, .1] is -.05
+    assert m["var"] == pytest.approx(0.05)
+    assert m["max_drawdown"] == pytest.approx(0.99275 / 1.045 - 1)
+    assert m["sharpe"] == pytest.approx(0.0, abs=1e-12)
+    assert m["correlation"].shape == (2, 2)
+
+
+def test_risk_metrics_needs_three_rows():
+    assert risk_metrics([[1.0], [2.0]], [1.0]) is None
+
+
+def test_align_closes_forward_fills_and_keeps_the_benchmark_window():
+    bench = [("2024-01-0%d" % d, 100.0 + d) for d in range(1, 10)]
+    series = {
+        "OLD": [(d, 10.0 + i) for i, (d, _) in enumerate(bench) if d != "2024-01-05"],  # one missing bar
+        "NEW": [("2024-01-09", 5.0)],                                                  # listed on the last day
+        "NONE": [],
+    }
+    symbols, dates, closes, bench_closes, excluded = align_closes(series, bench)
+    assert symbols == ["OLD"]
+    assert sorted(excluded) == ["NEW", "NONE"]
+    assert len(dates) == 9 and len(bench_closes) == 9
+    assert closes[4, 0] == closes[3, 0] == 13.0  # 2024-01-05 filled from the day before
+
+
+def test_align_closes_starts_where_every_kept_series_has_data():
+    bench = [("2024-01-%02d" % d, 1.0) for d in range(1, 11)]
+    series = {"A": bench, "B": bench[1:]}
+    symbols, dates, closes, _, excluded = align_closes(series, bench)
+    assert symbols == ["A", "B"] and excluded == []
+    assert dates[0] == "2024-01-02" and not np.isnan(closes).any()
+
+
+class _BarsMarket:
+    """Daily bars for the last 40 days; `broken` symbols fail to download."""
+    def __init__(self, broken=()):
+        self.broken = set(broken)
+
+    def fetch_daily_bars(self, symbol, start=None):
+        if symbol in self.broken:
+            raise OSError(f"{symbol}: download failed")
+        from datetime import date, timedelta
+        today = date.today()
+        step = {"SPY": 1.0, "AAPL": 2.0}.get(symbol, 0.5)
+        return [((today - timedelta(days=40 - i)).isoformat(), 0, 0, 0, 100.0 + step * i + (i % 3), 0)
+                for i in range(41)]
+
+
+def test_analytics_keeps_held_spy_and_reports_failed_downloads(tmp_path):
+    pytest.importorskip("flet")
+    from MainController import MainController
+    from database import PortfolioDB
+    from models import Stock
+
+    db = PortfolioDB(str(tmp_path / "portfolio.db"))
+    controller = MainController(db=db, market=_BarsMarket(broken={"BAD"}), ai=object())
+    stocks = [Stock("SPY", "SPDR S&P 500", 400.0, 2), Stock("AAPL", "Apple", 150.0, 4), Stock("BAD", "Broken", 10.0, 1)]
+    try:
+        symbols, metrics, excluded = controller._compute_analytics(stocks, {})
+        assert sorted(symbols) == ["AAPL", "SPY"]
+        assert excluded == ["BAD"]
+        assert metrics["observations"] == 40
+        assert metrics["beta"] is not None
+    finally:
+        controller.prices.close()
+        controller.tasks.shutdown()
+        db.close()
@@ -0,0 +1,57 @@
+import threading
+import time
+from services.cache import TTLCache
+from services.market_service import CachedMarketService
+
+
+def test_get_or_load_many_loads_each_key_once_across_overlapping_calls():
+    cache = TTLCache(60)
+    loaded = []
+
+    def loader(keys):
+        loaded.extend(keys)
+        time.sleep(0.05)
+        return {k: k.lower() for k in keys}
+
+    results = []
+    threads = [threading.Thread(target=lambda keys=keys: results.append(cache.get_or_load_many(keys, loader)))
+               for keys in (["A", "B"], ["B", "C"], ["A", "C"])]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(loaded) == ["A", "B", "C"]
+    assert all(r == {k: k.lower() for k in r} for r in results)
+    assert cache.get_or_load_many(["A", "B", "C"], loader) == {"A": "a", "B": "b", "C": "c"}
+    assert len(loaded) == 3
+
+
+def test_get_or_load_many_does_not_cache_rejected_values():
+    cache = TTLCache(60)
+    assert cache.get_or_load_many(["A"], lambda keys: {}, cache_if=lambda v: v is not None) == {"A": None}
+    assert cache.get_or_load_many(["A"], lambda keys: {"A": 1}) == {"A": 1}
+
+
+class _SlowMarket(CachedMarketService):
+    def __init__(self):
+        super().__init__(snapshot_path=None)
+        self.downloads = []
+
+    def download_quotes(self, symbols):
+        self.downloads.append(list(symbols))
+        time.sleep(0.05)
+        return {s: (100.0, 1.0) for s in symbols}
+
+
+def test_overlapping_refreshes_share_one_upstream_request():
+    market = _SlowMarket()
+    try:
+        threads = [threading.Thread(target=market.fetch_live_prices, args=(["AAPL", "MSFT"],)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sorted(s for batch in market.downloads for s in batch) == ["AAPL", "MSFT"]
+        assert market.fetch_live_prices(["msft", "AAPL"])["MSFT"].price == 100.0
+    finally:
+        market.close()
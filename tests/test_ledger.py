@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+
+from database import PortfolioDB
+from models import Stock
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = PortfolioDB(str(tmp_path / "portfolio.db"))
+    yield db
+    db.close()
+
+
+def _legacy_db(path):
+    """A database from before the transactions ledger: positions, some history, user_version 0."""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE stocks (symbol TEXT, portfolio_id TEXT, name TEXT, price REAL, quantity INTEGER,
+                             PRIMARY KEY (symbol, portfolio_id));
+        CREATE TABLE transactions (id INTEGER PRIMARY KEY AUTOINCREMENT, portfolio_id TEXT, symbol TEXT,
+                                   type TEXT, quantity INTEGER, price REAL, timestamp TEXT);
+        INSERT INTO stocks VALUES ('AMZN', '1', 'Amazon', 150.0, 10);
+        INSERT INTO stocks VALUES ('MSFT', '1', 'Microsoft', 300.0, 6);
+        INSERT INTO transactions (portfolio_id, symbol, type, quantity, price, timestamp)
+            VALUES ('1', 'MSFT', 'BUY', 0, 310.0, '2024-01-02 10:00:00'),
+                   ('1', 'MSFT', 'BUY', 4, 310.0, '2024-01-03 10:00:00');
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def test_migration_seeds_opening_lots_for_positions_without_ledger(tmp_path):
+    path = str(tmp_path / "legacy.db")
+    _legacy_db(path)
+    db = PortfolioDB(path)
+    try:
+        # AMZN has no ledger at all; 2 of the 6 MSFT shares predate it
+        assert db.get_open_lots("1", "AMZN") == [("", 10, 10, 150.0)]
+        assert db.get_open_lots("1", "MSFT")[0] == ("", 2, 2, 300.0)
+        assert db.get_pnl_summary("1", "AMZN")[4:] == (10, 1500.0)
+        assert db.get_pnl_summary("1", "MSFT")[4:] == (6, 2 * 300.0 + 4 * 310.0)
+
+        sold = db.delete_stock("AMZN", "1", 4, price=160.0)
+        assert sold == (4, 160.0, 40.0, 40.0)
+        assert db.get_pnl_summary("1", "AMZN") == (4, 640.0, 600.0, 40.0, 6, 900.0)
+    finally:
+        db.close()
+
+
+def test_partial_sell_realizes_fifo_and_average(db):
+    db.add_or_update_stock(Stock("AAPL", "Apple", 100.0, 10), "1")
+    db.add_or_update_stock(Stock("AAPL", "Apple", 120.0, 10), "1")
+
+    sold = db.delete_stock("AAPL", "1", 15, price=130.0)
+    # FIFO: 10 @ 100 + 5 @ 120; average: 15 @ 110
+    assert sold == (15, 130.0, 1950.0 - 1600.0, 1950.0 - 1650.0)
+    assert db.get_pnl_summary("1", "AAPL") == (15, 1950.0, 1600.0, 350.0, 5, 600.0)
+    assert db.get_pnl_summary("1", "AAPL", method="average")[2:4] == (1650.0, 300.0)
+    assert db.get_open_lots("1", "AAPL")[0][1:] == (10, 5, 120.0)
+
+    db.rebuild_ledger()
+    assert db.get_pnl_summary("1", "AAPL") == (15, 1950.0, 1600.0, 350.0, 5, 600.0)
+
+
+def test_sell_beyond_open_lots_is_logged(db, caplog):
+    db.add_or_update_stock(Stock("NVDA", "NVIDIA", 100.0, 10), "1")
+    with db._get_connection() as conn:
+        conn.execute("UPDATE lots SET remaining=4 WHERE symbol='NVDA'")
+    with caplog.at_level("WARNING", logger="database"):
+        sold = db.delete_stock("NVDA", "1", 10, price=110.0)
+    assert "Ledger gap: selling 10 NVDA in portfolio 1 but open lots hold only 4" in caplog.text
+    # 4 מהמנה, 6 במחיר הממוצע
+    assert sold == (10, 110.0, 100.0, 100.0)
+    assert db.get_open_lots("1", "NVDA") == []
@@ -0,0 +1,67 @@
+from database import PortfolioDB
+from services.market_service import CachedMarketService
+from services.news_pipeline import NewsPipeline
+
+
+class _NewsMarket(CachedMarketService):
+    def __init__(self, yahoo_fails=False, extra=()):
+        super().__init__(snapshot_path=None)
+        self.yahoo_fails = yahoo_fails
+        self.extra = list(extra)
+        self.calls = []
+
+    def fetch_yahoo_news(self, symbol, limit=5):
+        self.calls.append(("yahoo", symbol))
+        if self.yahoo_fails:
+            raise OSError("rate limited")
+        return [(f"{symbol} beats estimates", "Reuters"), (f"{symbol} Beats Estimates!", "Reuters")] + self.extra
+
+    def fetch_rss_news(self, symbol, limit=5, timeout=10):
+        self.calls.append(("rss", symbol))
+        return [(f"{symbol} rss headline", "Yahoo Finance RSS")]
+
+
+def test_pipeline_dedups_and_uses_the_market_news_cache():
+    market = _NewsMarket()
+    news = NewsPipeline(market)
+    try:
+        first = news.fetch(["aapl", "MSFT"])
+        assert first["AAPL"] == (["AAPL beats estimates"], ["Reuters"])
+        assert news.fetch(["AAPL"])["AAPL"] == first["AAPL"]
+        assert sorted(market.calls) == [("yahoo", "AAPL"), ("yahoo", "MSFT")]
+    finally:
+        news.shutdown()
+        market.close()
+
+
+def test_pipeline_falls_back_through_the_provider_chain():
+    market = _NewsMarket(yahoo_fails=True)
+    news = NewsPipeline(market)
+    try:
+        assert news.fetch(["TSLA"])["TSLA"] == (["TSLA rss headline"], ["Yahoo Finance RSS"])
+        assert market.news_providers.providers[0].breaker.failures == 1
+    finally:
+        news.shutdown()
+        market.close()
+
+
+def test_only_new_skips_headlines_seen_in_earlier_runs(tmp_path):
+    path = str(tmp_path / "portfolio.db")
+    for extra, expected in (((), ["AAPL beats estimates"]), ((), []), ([("Apple opens a new campus", "AP")], ["Apple opens a new campus"])):
+        db, market = PortfolioDB(path), _NewsMarket(extra=extra)
+        news = NewsPipeline(market, db)
+        try:
+            assert news.fetch(["AAPL"], only_new=True)["AAPL"][0] == expected
+        finally:
+            news.shutdown()
+            market.close()
+            db.close()
+
+    db = PortfolioDB(path)
+    news = NewsPipeline(_NewsMarket(), db)
+    try:
+        # בלי only_new חוזרות גם כותרות שכבר נראו
+        assert news.fetch(["AAPL"])["AAPL"] == (["AAPL beats estimates"], ["Reuters"])
+    finally:
+        news.shutdown()
+        db.close()
@@ -0,0 +1,39 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from database import PortfolioDB
+from models import Stock
+from positions import PositionSet
+
+
+def test_merge_matches_stock_add_and_values_use_live_prices():
+    a = PositionSet.from_stocks([Stock("AAPL", "Apple", 100.0, 10), Stock("MSFT", "Microsoft", 300.0, 2)])
+    b = PositionSet.from_stocks([Stock("AAPL", "Apple", 130.0, 5)])
+
+    merged = a + b
+    expected = Stock("AAPL", "Apple", 100.0, 10) + Stock("AAPL", "Apple", 130.0, 5)
+    assert merged.symbols.tolist() == ["AAPL", "MSFT"]
+    assert merged.data["quantity"].tolist() == [15, 2]
+    assert merged.data["price"][0] == pytest.approx(expected.price)
+    assert merged.calculate_value() == pytest.approx(15 * 110.0 + 2 * 300.0)
+    assert merged.calculate_value({"MSFT": 310.0}) == pytest.approx(15 * 110.0 + 2 * 310.0)
+    assert a.merge().values(np.array([1.0, 2.0])).tolist() == [10.0, 4.0]
+    assert [(s.symbol, s.quantity) for s in merged.to_stocks()] == [("AAPL", 15), ("MSFT", 2)]
+
+
+def test_long_symbols_are_not_truncated(tmp_path):
+    long = "BRK.B-WHEN-ISSUED-2026"
+    db = PortfolioDB(str(tmp_path / "portfolio.db"))
+    try:
+        db.add_or_update_stock(Stock(long, "Berkshire", 400.0, 3), "1")
+        db.add_or_update_stock(Stock("V", "Visa", 250.0, 4), "1")
+        positions = db.get_position_set("1")
+    finally:
+        db.close()
+    assert sorted(positions.symbols.tolist()) == [long, "V"]
+
+    merged = PositionSet.from_stocks([Stock("V", "Visa", 270.0, 4)]) + positions
+    assert merged.symbols.tolist() == [long, "V"]
+    assert merged.data["price"].tolist() == [400.0, 260.0]
+    assert len(PositionSet.from_rows([])) == 0
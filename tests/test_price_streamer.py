@@ -0,0 +1,33 @@
+from services.price_streamer import PriceStreamer
+from services.providers import Quote
+
+
+class _Market:
+    def __init__(self):
+        self.answer = {}
+
+    def fetch_live_prices(self, symbols):
+        return {s: self.answer.get(s) for s in symbols}
+
+
+def test_stale_only_batches_back_off_but_still_reach_the_panel():
+    market, pushed = _Market(), []
+    streamer = PriceStreamer(market, pushed.append, batch_size=2)
+    streamer.watch(["AAPL", "MSFT"])
+
+    market.answer = {"AAPL": Quote(100.0, 1.0, "yfinance"), "MSFT": Quote(300.0, 0.5, "yfinance")}
+    assert streamer.poll_once() is False
+    assert len(pushed[-1]) == 2
+
+    # הספק החי נפל: אותם מחירים, אבל מה-snapshot
+    market.answer = {s: Quote(q[0], q[1], "snapshot", stale=True) for s, q in market.answer.items()}
+    assert streamer.poll_once() is True
+    assert sorted(s for s, q in pushed[-1].items() if q.stale) == ["AAPL", "MSFT"]
+
+    pushes = len(pushed)
+    market.answer = {}
+    assert streamer.poll_once() is True
+    assert len(pushed) == pushes
+
+    market.answer = {"AAPL": Quote(101.0, 2.0, "yfinance")}
+    assert streamer.poll_once() is False
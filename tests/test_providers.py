@@ -0,0 +1,73 @@
+import time
+
+from services.providers import CircuitBreaker, Provider, ProviderChain
+
+
+class _Scripted(Provider):
+    """Answers fetch_quotes from a script of (delay, result or exception) steps."""
+    def __init__(self, name, script, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.script = list(script)
+
+    def fetch_quotes(self, symbols):
+        delay, outcome = self.script.pop(0)
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def _eventually(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def test_breaker_closes_on_a_trial_call_the_hedge_outran():
+    primary = _Scripted("primary", [(0, OSError("down")), (0.2, {"AAPL": 101.0})],
+                        timeout=5.0, hedge_after=0.02, breaker=CircuitBreaker(threshold=1, cooldown=0.05))
+    backup = _Scripted("backup", [(0, {"AAPL": 100.0})] * 3, timeout=5.0)
+    late = []
+    chain = ProviderChain("quotes", [primary, backup], late=lambda p, result: late.append((p.name, result)))
+    try:
+        assert chain.call("fetch_quotes", ["AAPL"])[0] is backup
+        assert _eventually(lambda: primary.breaker.state == CircuitBreaker.OPEN)
+
+        # פתוח: הספק הראשי לא נקרא בכלל
+        assert chain.call("fetch_quotes", ["AAPL"])[0] is backup
+        assert len(primary.script) == 1
+
+        time.sleep(0.06)
+        assert primary.breaker.state == CircuitBreaker.HALF_OPEN
+        # קריאת הניסיון איטית; ה-hedge עונה קודם והשיחה חוזרת בלי לחכות לה
+        assert chain.call("fetch_quotes", ["AAPL"]) == (backup, {"AAPL": 100.0})
+        assert primary.breaker.state == CircuitBreaker.HALF_OPEN
+
+        assert _eventually(lambda: primary.breaker.state == CircuitBreaker.CLOSED)
+        assert not primary.breaker._trial
+        assert _eventually(lambda: late == [("primary", {"AAPL": 101.0})])
+    finally:
+        chain.shutdown()
+
+
+def test_timed_out_call_counts_once_and_a_late_success_closes_the_breaker():
+    slow = _Scripted("slow", [(0.15, {"AAPL": 101.0}), (0.15, OSError("down"))],
+                     timeout=0.03, breaker=CircuitBreaker(threshold=1, cooldown=60))
+    backup = _Scripted("backup", [(0, {"AAPL": 100.0})] * 2, timeout=5.0)
+    chain = ProviderChain("quotes", [slow, backup])
+    try:
+        assert chain.call("fetch_quotes", ["AAPL"])[0] is backup
+        assert slow.breaker.state == CircuitBreaker.OPEN
+        assert _eventually(lambda: slow.breaker.state == CircuitBreaker.CLOSED)
+
+        assert chain.call("fetch_quotes", ["AAPL"])[0] is backup
+        assert slow.breaker.failures == 1
+        time.sleep(0.2)
+        # הכישלון המאוחר כבר נספר ב-timeout
+        assert slow.breaker.failures == 1
+    finally:
+        chain.shutdown()
@@ -0,0 +1,52 @@
+import pytest
+
+from database import PortfolioDB
+from models import Stock
+
+
+class _Page:
+    def update(self):
+        pass
+
+
+class _View:
+    page = _Page()
+
+    def built(self, name):
+        return None
+
+    def apply(self, name, method, *args):
+        pass
+
+
+def test_replay_tick_leaves_alerts_and_ledger_alone(tmp_path):
+    pytest.importorskip("flet")
+    from MainController import MainController
+    from services.replay import HistoricalMarket
+
+    db = PortfolioDB(str(tmp_path / "portfolio.db"))
+    db.add_or_update_stock(Stock("AAPL", "Apple", 100.0, 5), "1")
+    db.save_price_bars("AAPL", [("2024-01-02", 0, 0, 0, 100.0, 0), ("2024-01-03", 0, 0, 0, 150.0, 0)], "2024-01-02")
+    rule_id = db.add_alert("AAPL", "price", "above", 120.0)
+    before = (db.get_alerts(), db.get_transactions("1"))
+
+    controller = MainController(db=db, market=HistoricalMarket(db, "2024-01-02"), ai=object())
+    controller.view = _View()
+    messages = []
+    controller.msg = messages.append
+    try:
+        assert controller.replay
+        controller._alerts_loaded(db.get_alerts())
+        # צעד אחד של ה-streamer: יום מסחר קדימה, המחיר חוצה את הסף
+        controller.streamer.poll_once()
+        assert messages == ["Alert: AAPL price above 120.00 (now 150.00)."]
+        assert len(controller.alerts) == 0
+
+        controller.handle_add(None)
+        controller.handle_delete(None)
+        assert messages[-2:] == ["Trading is off while replaying market data."] * 2
+        assert (db.get_alerts(), db.get_transactions("1")) == before
+        assert before[0][0][0] == rule_id
+    finally:
+        controller.tasks.shutdown(wait=True)
+        db.close()
@@ -0,0 +1,69 @@
+import pytest
+
+ft = pytest.importorskip("flet")
+
+
+class _Page:
+    def update(self):
+        pass
+
+    def add(self, *controls):
+        self.controls = controls
+
+
+class _Market:
+    company_names = {"AAPL": "Apple Inc.", "MSFT": "Microsoft Corp."}
+
+
+class _Controller:
+    """Accepts every handler the panels wire up."""
+    market = _Market()
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def test_every_panel_builds():
+    from views import PANELS, PortfolioView
+
+    view = PortfolioView(_Page(), _Controller())
+    view.build()
+    for index in range(len(PANELS)):
+        view.switch_tab(index)
+    assert [view.built(name) is not None for name, _ in PANELS] == [True] * len(PANELS)
+    assert [o.key or o.text for o in view.trade_panel.symbol_dd.options] == ["AAPL", "MSFT"]
+
+
+def test_update_racing_a_lazy_build_is_not_lost(monkeypatch):
+    import threading
+    import views
+
+    applied = threading.Event()
+
+    class _SlowPanel:
+        """Lets a worker's apply() run while the view is between publishing the panel and draining."""
+        def __init__(self, controller):
+            self.values = []
+            self.reads = 0
+            self._content = ft.Container()
+
+        @property
+        def content(self):
+            # השנייה: הפאנל כבר פורסם, העדכונים הממתינים עוד לא רוקנו
+            self.reads += 1
+            if self.reads == 2:
+                worker.start()
+                applied.wait(0.3)
+            return self._content
+
+        def set_value(self, value):
+            self.values.append(value)
+
+    monkeypatch.setattr(views, "PANELS", views.PANELS + (("slow_panel", _SlowPanel),))
+    view = views.PortfolioView(_Page(), _Controller())
+    view.apply("slow_panel", "set_value", "queued")
+    worker = threading.Thread(target=lambda: (view.apply("slow_panel", "set_value", "fresh"), applied.set()))
+
+    panel = view._panel("slow_panel")
+    worker.join(2)
+    assert panel.values == ["queued", "fresh"]
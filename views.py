@@ -1,5 +1,15 @@
+import threading
 import flet as ft
-from components import TradePanel, PortfolioPanel, AIPanel, HistoryPanel
+from components import TradePanel, PortfolioPanel, AIPanel, HistoryPanel, DiagnosticsPanel
+
+PANELS = (
+    ("trade_panel", TradePanel),
+    ("portfolio_panel", PortfolioPanel),
+    ("ai_panel", AIPanel),
+    ("history_panel", HistoryPanel),
+    ("diagnostics_panel", DiagnosticsPanel),
+)
+PANEL_NAMES = {name for name, _ in PANELS}
 
 class PortfolioView:
     def __init__(self, page: ft.Page, controller):
@@ -7,38 +17,71 @@ class PortfolioView:
         self.controller = controller
         self.page.title = "Real-Time Stock Manager"
         self.page.bgcolor = "bluegrey50"
-        self.pid_input = ft.TextField(label="Portfolio ID", width=150, height=45)
-        
-        self.trade_panel = TradePanel(controller)
-        self.portfolio_panel = PortfolioPanel(controller)
-        self.ai_panel = AIPanel(controller)
-        self.history_panel = HistoryPanel(controller)
+        self.pid_input = ft.TextField(label="Portfolio ID", hint_text="1 / 1,2 / *", width=150, height=45)
         
-        self.trade_panel.content.visible = True
-        
-        self.content_area = ft.Container(
-            content=ft.Column([
-                self.trade_panel.content,
-                self.portfolio_panel.content,
-                self.ai_panel.content,
-                self.history_panel.content
-            ], expand=True),
-            expand=True, padding=20
-        )
+        # הפאנלים נבנים רק בפעם הראשונה שהלשונית שלהם נפתחת
+        self._panels = {}
+        self._pending = {}
+        # בנייה, פרסום הפאנל ומיצוי העדכונים הממתינים - יחד מול apply() מה-workers
+        self._panels_lock = threading.RLock()
+        self.current_tab = 0
+        self.content_column = ft.Column([], expand=True)
+        self.content_area = ft.Container(content=self.content_column, expand=True, padding=20)
+        self._panel(PANELS[0][0])
 
         self.nav_buttons = [
             ft.ElevatedButton("Trade", icon="store", on_click=lambda e: self.switch_tab(0), bgcolor="blue900", color="white"),
             ft.ElevatedButton("Portfolio", icon="pie_chart", on_click=lambda e: self.switch_tab(1), bgcolor="bluegrey200", color="black"),
             ft.ElevatedButton("AI Analysis", icon="computer", on_click=lambda e: self.switch_tab(2), bgcolor="bluegrey200", color="black"),
             ft.ElevatedButton("History", icon="list", on_click=lambda e: self.switch_tab(3), bgcolor="bluegrey200", color="black"),
+            ft.ElevatedButton("Diagnostics", icon="speed", on_click=lambda e: self.switch_tab(4), bgcolor="bluegrey200", color="black"),
         ]
         self.top_nav = ft.Row(self.nav_buttons, alignment="center", spacing=20)
 
+    def __getattr__(self, name):
+        # גישה ראשונה לפאנל (למשל self.view.ai_panel) בונה אותו
+        if name in PANEL_NAMES:
+            return self._panel(name)
+        raise AttributeError(name)
+
+    def _panel(self, name):
+        with self._panels_lock:
+            panel = self._panels.get(name)
+            if panel is None:
+                panel = dict(PANELS)[name](self.controller)
+                panel.content.visible = PANELS[self.current_tab][0] == name
+                self._panels[name] = panel
+                setattr(self, name, panel)
+                self.content_column.controls.append(panel.content)
+                for method, args in self._pending.pop(name, {}).items():
+                    getattr(panel, method)(*args)
+        return panel
+
+    def built(self, name):
+        """The panel if its tab was opened already, otherwise None."""
+        with self._panels_lock:
+            return self._panels.get(name)
+
+    def apply(self, name, method, *args):
+        """Calls panel.method(*args) now, or when the panel is first built (latest call wins)."""
+        with self._panels_lock:
+            panel = self._panels.get(name)
+            if panel is None:
+                self._pending.setdefault(name, {})[method] = args
+                return None
+        return getattr(panel, method)(*args)
+
     def switch_tab(self, index):
-        self.trade_panel.content.visible = (index == 0)
-        self.portfolio_panel.content.visible = (index == 1)
-        self.ai_panel.content.visible = (index == 2)
-        self.history_panel.content.visible = (index == 3)
+        self.current_tab = index
+        self._panel(PANELS[index][0])
+        for i, (name, _) in enumerate(PANELS):
+            panel = self._panels.get(name)
+            if panel is not None:
+                panel.content.visible = (i == index)
+        if index == 3:
+            self.controller.refresh_history()
+        if index == 4:
+            self.controller.handle_diagnostics_refresh(None)
         for i, btn in enumerate(self.nav_buttons):
             btn.bgcolor = "blue900" if i == index else "bluegrey200"
             btn.color = "white" if i == index else "black"
@@ -49,11 +92,8 @@ class PortfolioView:
         main_layout = ft.Column([header, ft.Container(content=self.top_nav, padding=10), ft.Divider(), self.content_area], expand=True)
         self.page.add(main_layout)
 
-    def update_table(self, stocks, live_prices=None, spy_change=0.0, transactions=None):
-        self.portfolio_panel.update_data(stocks, self.page, live_prices, spy_change)
+    def update_table(self, stocks, live_prices=None, spy_change=0.0, pid=None, flags=None):
+        self.apply("portfolio_panel", "update_data", stocks, self.page, live_prices, spy_change, pid, flags)
         
         # --- התיקון: מעדכנים עכשיו גם את תפריט ה-AI ---
-        self.ai_panel.update_options(stocks, self.page)
-        
-        if transactions:
-            self.history_panel.update_data(transactions, self.page)
\ No newline at end of file
+        self.apply("ai_panel", "update_options", stocks, self.page)
\ No newline at end of file